@@ -1,179 +1,352 @@
 import streamlit as st
-import urllib.parse
 import time
-import base64
-from groq import Groq
+from hexaloy_features import (
+    APP_CSS, CASCADE_MODELS, CHAT_TEMPERATURE, DEBUG_PANEL_ENABLED, PROFILER, RESPONSE_ACTION_LABELS,
+    AnalyticsAccumulator, CascadeRun, CompareRun, Message,
+    StoredSessions, build_context_window, build_enhanced_image_prompt, chat_system_prompt,
+    compare_message, describe_upstream_error, effective_persona, format_stream_metrics,
+    get_async_groq_client, get_cascade_stats, get_image_jobs, get_model_profile, get_owner_indexes, get_prefetcher,
+    get_request_scheduler, get_response_cache, get_semantic_cache, get_session_store,
+    get_single_flight, get_stream_engine, get_vision_uploads, groq_text_stream,
+    load_static_assets, prepare_chat, render_analytics_panel, render_cache_stats,
+    render_cascade_stats, render_chat_messages, render_compare_selector, render_compare_stream,
+    render_debug_panel, render_export_panel, render_generated_image, render_image_settings,
+    render_owner_link_notice, render_persona_selector, render_response_actions, render_search_panel,
+    render_session_list, render_upstream_health, replay_chunks, resolve_owner, response_cache_key,
+    route_prompt, score_prompt_complexity, script_session_id, semantic_scope, span, timed,
+)
+
+ANALYTICS_SAVE_EVERY = 20
 
 # ==========================================
 # 1. PAGE CONFIG & SECRETS VALIDATION
 # ==========================================
 st.set_page_config(page_title="HEXALOY AI", page_icon="logo.png", layout="wide", initial_sidebar_state="expanded")
+with PROFILER.rerun(script_session_id()):
+    # Closed in a finally, so st.rerun()/st.stop() can't leave the run (or a cProfile capture) open
+    if "GROQ_API_KEY" in st.secrets:
+        client = get_async_groq_client(st.secrets["GROQ_API_KEY"])
+    else:
+        st.error("🚨 System Error: GROQ_API_KEY is missing in Streamlit Secrets!")
+        st.stop()
 
-if "GROQ_API_KEY" in st.secrets:
-    client = Groq(api_key=st.secrets["GROQ_API_KEY"])
-else:
-    st.error("🚨 System Error: GROQ_API_KEY is missing in Streamlit Secrets!")
-    st.stop()
+    # ==========================================
+    # 2. PROFESSIONAL LIGHT MODE CSS
+    # ==========================================
+    with span("css"):
+        st.markdown(APP_CSS, unsafe_allow_html=True)
+    with span("assets"):
+        assets = load_static_assets()
 
-# ==========================================
-# 2. PROFESSIONAL LIGHT MODE CSS
-# ==========================================
-st.markdown("""
-    <style>
-    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700;800&display=swap');
-    html, body, [class*="css"] { font-family: 'Inter', sans-serif; background-color: #F8F9FA; color: #1E293B; }
-    #MainMenu {visibility: hidden;} footer {visibility: hidden;}
-    
-    .stChatInputContainer { border-radius: 12px !important; border: 1px solid #CBD5E1 !important; background-color: #FFFFFF !important; box-shadow: 0 4px 6px -1px rgba(0, 0, 0, 0.05); }
-    
-    div[data-testid="stChatMessage"] { border-radius: 12px; padding: 15px 20px; margin-bottom: 20px; }
-    div[data-testid="stChatMessage"]:nth-child(odd) { background-color: #F1F5F9 !important; border: 1px solid #E2E8F0 !important; color: #0F172A; }
-    div[data-testid="stChatMessage"]:nth-child(even) { background-color: #FFFFFF !important; border: 1px solid #E2E8F0 !important; box-shadow: 0 2px 4px rgba(0,0,0,0.02); color: #0F172A; }
+    # ==========================================
+    # 3. SIDEBAR WITH CUSTOM HEXALOY LOGO
+    # ==========================================
+    if "owner" not in st.session_state:
+        # The signed-in account, else a token in the URL so a bookmarked link survives restarts
+        st.session_state.owner, st.session_state.owner_is_link = resolve_owner()
+    if "sessions" not in st.session_state:
+        st.session_state.sessions = StoredSessions(get_session_store(), st.session_state.owner)
+    if "current_chat" not in st.session_state:
+        # The open chat's session id; every per-chat state below is keyed by it, titles are display-only
+        sessions = st.session_state.sessions
+        blank = sessions.find("New Session")
+        if blank is not None and len(sessions[blank]) == 0:
+            st.session_state.current_chat = blank
+        else:
+            st.session_state.current_chat = sessions.create("New Session")
+    if "analytics" not in st.session_state:
+        st.session_state.analytics = AnalyticsAccumulator.load(get_session_store(), st.session_state.owner)
 
-    section[data-testid="stSidebar"] { background-color: #FFFFFF; border-right: 1px solid #E2E8F0; }
-    .stButton>button { width: 100%; text-align: left; background-color: transparent; border: 1px solid transparent; padding: 10px 15px; border-radius: 8px; font-weight: 500; color: #475569; transition: 0.2s; }
-    .stButton>button:hover { background-color: #F1F5F9; color: #0F172A; border: 1px solid #CBD5E1; }
-    
-    .new-chat-btn>div>button { background-color: #1A56A8; color: white; justify-content: center; font-weight: 600; margin-bottom: 20px; border-radius: 8px; }
-    .new-chat-btn>div>button:hover { background-color: #134282; color: white; }
+    def save_analytics_if_due():
+        # The saved snapshot only needs to be roughly current: sync() catches up on load
+        if st.session_state.analytics.pending >= ANALYTICS_SAVE_EVERY:
+            st.session_state.analytics.save(get_session_store(), st.session_state.owner)
 
-    .signature-box { margin-top: 40px; margin-bottom: 20px; padding: 15px; border-radius: 8px; background: #F8F9FA; border: 1px solid #E2E8F0; text-align: center; }
-    .signature-box p { margin: 0; font-size: 0.75rem; color: #64748B; text-transform: uppercase; letter-spacing: 1px; }
-    .signature-box h3 { margin: 5px 0 0 0; font-size: 1.1rem; color: #0F172A; font-weight: 700; }
-    </style>
-    """, unsafe_allow_html=True)
+    def chat_instructions(prompt, route):
+        return chat_system_prompt(prompt, route, st.session_state.get("persona_selector"))
 
-def encode_image(uploaded_file):
-    return base64.b64encode(uploaded_file.getvalue()).decode('utf-8')
+    def recalled_context(prompt, route):
+        # Snippets from the user's other chats that match this prompt, within a small token budget;
+        # the memory is built once per owner from the store and shared with their other tabs
+        if route["intent"] == "vision":
+            return ""
+        with span("retrieval_memory.build"):
+            memory = get_owner_indexes().retrieval_memory(st.session_state.owner)
+        with span("retrieval"):
+            return memory.recall(prompt, exclude=st.session_state.current_chat)
 
-# ==========================================
-# 3. SIDEBAR WITH CUSTOM HEXALOY LOGO
-# ==========================================
-if "sessions" not in st.session_state:
-    st.session_state.sessions = {"New Session": []}
-if "current_chat" not in st.session_state:
-    st.session_state.current_chat = "New Session"
-
-with st.sidebar:
-    try:
-        with open("logo.png", "rb") as image_file:
-            logo_base64 = base64.b64encode(image_file.read()).decode()
-        
-        logo_html = f"""
-        <div style="display: flex; align-items: center; justify-content: center; margin-bottom: 25px; padding-top: 10px;">
-            <img src="data:image/png;base64,{logo_base64}" style="width: 50px; margin-right: 12px;">
-            <span style="font-family: 'Inter', sans-serif; font-size: 2.2rem; font-weight: 800; color: #2B5B9E; letter-spacing: 1.5px;">HEXALOY</span>
-        </div>
-        """
-        st.markdown(logo_html, unsafe_allow_html=True)
-    except FileNotFoundError:
-        st.warning("⚠️ logo.png not found. Upload it to GitHub!")
-        st.markdown("<h3 style='color: #1A56A8; font-weight: 800; text-align: center;'>logo.png HEXALOY</h3>", unsafe_allow_html=True)
-
-    st.markdown("<div class='new-chat-btn'>", unsafe_allow_html=True)
-    if st.button("➕ New Session"):
-        chat_id = f"Session {len(st.session_state.sessions) + 1}"
-        st.session_state.sessions[chat_id] = []
-        st.session_state.current_chat = chat_id
-        st.rerun()
-    st.markdown("</div>", unsafe_allow_html=True)
-
-    st.markdown("<p style='color: #64748B; font-size: 0.8rem; font-weight: 600; margin-top: 10px;'>Chat History</p>", unsafe_allow_html=True)
-    for chat_name in reversed(list(st.session_state.sessions.keys())):
-        if st.button(f"💬 {chat_name}", key=f"btn_{chat_name}"):
-            st.session_state.current_chat = chat_name
+    def schedule_prefetch():
+        # Same route, persona, recalled snippets and context window as the click would use, so the cache keys match
+        chat = st.session_state.current_chat
+        history = st.session_state.sessions[chat]
+        def prepare(action_prompt):
+            route = route_prompt(action_prompt)
+            request = prepare_chat(action_prompt, [*history, {"role": "user", "content": action_prompt}], route,
+                                   chat_instructions(action_prompt, route), st.session_state.get("persona_selector"),
+                                   recalled=recalled_context(action_prompt, route))
+            return request["models"], request["messages"], request["prompt_tokens"], request["key"]
+        get_prefetcher().schedule(
+            st.session_state.owner, chat, len(history), prepare,
+            lambda model, messages: groq_text_stream(client, messages=messages, model=model,
+                                                     temperature=CHAT_TEMPERATURE),
+        )
+
+    def append_message(message):
+        message = Message.from_dict(message)      # one compact record shared by history, search and analytics
+        history = st.session_state.sessions[st.session_state.current_chat]
+        history.append(message)
+        get_owner_indexes().add_message(st.session_state.owner, st.session_state.current_chat, len(history) - 1, message)
+        st.session_state.analytics.add_message(st.session_state.current_chat, len(history) - 1, message)
+        save_analytics_if_due()
+
+    with st.sidebar:
+        with span("sidebar.logo"):
+            if assets["logo_html"]:
+                st.markdown(assets["logo_html"], unsafe_allow_html=True)
+            else:
+                st.warning("⚠️ logo.png not found. Upload it to GitHub!")
+                st.markdown("<h3 style='color: #1A56A8; font-weight: 800; text-align: center;'>logo.png HEXALOY</h3>", unsafe_allow_html=True)
+
+        st.markdown("<div class='new-chat-btn'>", unsafe_allow_html=True)
+        if st.button("➕ New Session"):
+            chat_id = st.session_state.sessions.create(f"Session {len(st.session_state.sessions) + 1}")
+            st.session_state.current_chat = chat_id
+            st.session_state.session_page = 0
             st.rerun()
+        st.markdown("</div>", unsafe_allow_html=True)
+
+        st.markdown("<p style='color: #64748B; font-size: 0.8rem; font-weight: 600; margin-top: 10px;'>Chat History</p>", unsafe_allow_html=True)
+        with span("sidebar.history"):
+            render_session_list(st.session_state.sessions, st.session_state.current_chat)
             
-    st.markdown("---")
-    uploaded_image = st.file_uploader("📸 Image Analysis (Optional)", type=['png', 'jpg', 'jpeg'])
+        st.markdown("---")
+        with span("sidebar.search"):
+            index = None
+            if st.session_state.get("search_query"):
+                # Built once per owner from the store and shared with their other tabs
+                with span("search_index.build"):
+                    index = get_owner_indexes().search_index(st.session_state.owner)
+            render_search_panel(st.session_state.sessions, index=index)
 
-    st.markdown("""
-        <div class="signature-box">
-            <p>Architected by</p>
-            <h3>VINIT MAAN</h3>
-            <p style="font-size: 0.6rem; margin-top: 5px;">Enterprise AI v6.0</p>
-        </div>
-    """, unsafe_allow_html=True)
+        with st.expander("📥 Export"), span("sidebar.export"):
+            render_export_panel(
+                st.session_state.sessions[st.session_state.current_chat],
+                st.session_state.sessions.title(st.session_state.current_chat),
+                sessions=st.session_state.sessions,
+            )
 
-# ==========================================
-# 4. MAIN CHAT & STREAMING LOGIC
-# ==========================================
-st.markdown("<h1 style='color: #0F172A; font-weight: 800; text-align: center; font-size: 2.5rem;'>HEXALOY INTELLIGENCE</h1>", unsafe_allow_html=True)
-st.markdown("<div style='text-align: center; color: #64748B; font-weight: 500; margin-bottom: 30px; margin-top: -10px;'>Your Professional AI Assistant</div>", unsafe_allow_html=True)
+        st.markdown("---")
+        uploaded_image = st.file_uploader("📸 Image Analysis (Optional)", type=['png', 'jpg', 'jpeg'])
+        with st.expander("🎨 Image Settings"):
+            render_image_settings()
+        with st.expander("🎭 Persona"):
+            render_persona_selector()
+            st.caption("With the default persona, a specialist is picked from each prompt's topic.")
+        with st.expander("⚖️ Compare Models"):
+            compare_models = render_compare_selector()
+            st.caption("Every selected model answers at once; the first one's reply carries the chat forward.")
+        with st.expander("⚡ Quick Actions"):
+            st.toggle("Prepare likely quick actions in the background", key="prefetch_actions")
+            st.caption("The most-used actions for each answer are ready before you click; uses spare rate limit only.")
+        render_cache_stats(get_response_cache(), get_single_flight(), get_semantic_cache(), get_prefetcher())
+        if st.session_state.owner_is_link:
+            render_owner_link_notice(get_session_store(), st.session_state.owner)
+
+        st.markdown("""
+            <div class="signature-box">
+                <p>Architected by</p>
+                <h3>VINIT MAAN</h3>
+                <p style="font-size: 0.6rem; margin-top: 5px;">Enterprise AI v6.0</p>
+            </div>
+        """, unsafe_allow_html=True)
+        if DEBUG_PANEL_ENABLED and st.query_params.get("debug") == "1":
+            render_debug_panel()
+            render_cascade_stats()
+            render_upstream_health()
+
+    # ==========================================
+    # 4. MAIN CHAT & STREAMING LOGIC
+    # ==========================================
+    st.markdown("<h1 style='color: #0F172A; font-weight: 800; text-align: center; font-size: 2.5rem;'>HEXALOY INTELLIGENCE</h1>", unsafe_allow_html=True)
+    st.markdown("<div style='text-align: center; color: #64748B; font-weight: 500; margin-bottom: 30px; margin-top: -10px;'>Your Professional AI Assistant</div>", unsafe_allow_html=True)
 
-for message in st.session_state.sessions[st.session_state.current_chat]:
-    avatar_icon = "user.png" if message["role"] == "user" else "logo.png"
-    with st.chat_message(message["role"], avatar=avatar_icon):
-        st.markdown(message["content"])
+    with st.expander("📊 Analytics"), span("analytics_panel"):
+        render_analytics_panel(st.session_state.sessions, accumulator=st.session_state.analytics)
+        save_analytics_if_due()
 
-if prompt := st.chat_input("Ask Hexaloy anything..."):
+    with span("messages"):
+        render_chat_messages(st.session_state.sessions[st.session_state.current_chat],
+                             st.session_state.current_chat, assets)
+
+    action = st.session_state.pop("pending_action", None)     # a quick action clicked on the previous run
+    if prompt := st.chat_input("Ask Hexaloy anything...") or action:
     
-    curr_chat = st.session_state.current_chat
-    if curr_chat.startswith("New Session") and len(st.session_state.sessions[curr_chat]) == 0:
-        new_name = prompt[:20] + "..."
-        st.session_state.sessions[new_name] = st.session_state.sessions.pop(curr_chat)
-        st.session_state.current_chat = new_name
+        curr_chat = st.session_state.current_chat
+        if action:
+            get_prefetcher().record_click(RESPONSE_ACTION_LABELS[action])
+        prefetched = get_prefetcher().claim(st.session_state.owner, curr_chat,
+                                            len(st.session_state.sessions[curr_chat]), prompt)
+        sessions = st.session_state.sessions
+        if sessions.title(curr_chat).startswith("New Session") and len(sessions[curr_chat]) == 0:
+            sessions.rename(curr_chat, prompt[:20] + "...")
 
-    st.session_state.sessions[st.session_state.current_chat].append({"role": "user", "content": prompt})
+        append_message({"role": "user", "content": prompt})
     
-    with st.chat_message("user", avatar="user.png"): 
-        st.markdown(prompt)
-
-    with st.chat_message("assistant", avatar="logo.png"):
-        if any(word in prompt.lower() for word in ["draw", "pic", "image", "photo bana"]):
-            with st.spinner("Generating visualization..."):
-                time.sleep(1.5)
-                safe_prompt = urllib.parse.quote(prompt)
-                img_url = f"https://image.pollinations.ai/prompt/{safe_prompt}?width=800&height=400&nologo=true"
-                st.image(img_url)
-                st.session_state.sessions[st.session_state.current_chat].append({"role": "assistant", "content": f"![Generated Image]({img_url})"})
-        else:
-            instructions = """
-            You are 'HEXALOY', an exceptionally intelligent and professional AI assistant.
-            1. You possess universal knowledge. You can answer ANY question about coding, science, history, daily life, or business perfectly.
-            2. Keep your tone professional, highly accurate, and helpful. Use clear formatting.
-            3. YOU ARE AN AI. Do not claim to be human.
-            4. IF AND ONLY IF asked about your creator, owner, or who made you, reply exactly with: "I was architected and developed by VINIT MAAN."
-            """
-            
-            try:
-                def generate_response():
-                    if uploaded_image:
-                        base64_image = encode_image(uploaded_image)
-                        stream = client.chat.completions.create(
-                            messages=[
-                                {"role": "system", "content": instructions},
-                                {"role": "user", "content": [
-                                    {"type": "text", "text": prompt},
-                                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}
-                                ]}
-                            ],
-                            model="llama-3.2-11b-vision-preview",
-                            temperature=0.7,
-                            stream=True
-                        )
-                    else:
-                        stream = client.chat.completions.create(
-                            messages=[
-                                {"role": "system", "content": instructions},
-                                {"role": "user", "content": prompt}
-                            ],
-                            model="llama-3.3-70b-versatile",
-                            temperature=0.7,
-                            stream=True
-                        )
-                    
-                    for chunk in stream:
-                        if chunk.choices[0].delta.content is not None:
-                            yield chunk.choices[0].delta.content
-
-                response_text = st.write_stream(generate_response())
-                st.session_state.sessions[st.session_state.current_chat].append({"role": "assistant", "content": response_text})
-                
-            except Exception as e:
-                st.error(f"System Fault: {str(e)}")
+        with st.chat_message("user", avatar=assets["user_avatar"]):
+            st.markdown(prompt)
+        with span("route"):
+            route = route_prompt(prompt, has_image=uploaded_image is not None)
+        for warning in route["warnings"]:
+            st.warning(warning)
 
+        with st.chat_message("assistant", avatar=assets["assistant_avatar"]):
+            if route["intent"] == "image":
+                style, mood = st.session_state.get("img_style"), st.session_state.get("img_mood")
+                job = get_image_jobs().submit(build_enhanced_image_prompt(prompt, style, mood))
+                append_message({
+                    "role": "assistant", "content": f"![Generated Image]({job.url})",
+                    "image_key": job.key, "image_url": job.url,
+                })
+                render_generated_image(get_image_jobs(), job.key, job.url)
+            elif compare_models and route["intent"] == "chat":
+                # Same system prompt and history to every selected model, all streaming at once
+                scheduler = get_request_scheduler()
+                comparison = CompareRun(client, st.session_state.owner, compare_models,
+                                        st.session_state.sessions[st.session_state.current_chat],
+                                        chat_instructions(prompt, route), get_stream_engine(), scheduler,
+                                        get_single_flight(), recalled=recalled_context(prompt, route))
+                stop_slot = st.empty()
+                stop_slot.button("⏹ Stop", key="stop_stream", help="Stop generating and keep the partial answers")
+                try:
+                    render_compare_stream(comparison, scheduler)
+                    stop_slot.empty()
+                finally:
+                    # Also reached when Stop or a new prompt reruns the script: keep what each model wrote
+                    comparison.cancel()
+                    results = comparison.results()
+                    for result in results:
+                        PROFILER.record_stream(result["metrics"], prefix="compare")
+                    if any(r["content"] for r in results):
+                        append_message(compare_message(results, comparison.wall_seconds()))
+            else:
+                instructions = chat_instructions(prompt, route)
+                recalled = recalled_context(prompt, route)   # goes into the user turn, after the cache keys are taken
 
+                # Easy prompts go to the smaller model first (CASCADE_MODELS); images always to the vision model
+                complexity = score_prompt_complexity(prompt, route, st.session_state.get("persona_selector")) \
+                    if route["intent"] != "vision" else None
+                answer = {}   # the live ResponseStream and its CascadeRun, or the similarity of a reused answer
+                stop_slot = st.empty()
+                stop_slot.button("⏹ Stop", key="stop_stream", help="Stop generating and keep the partial answer")
+                waiting = st.empty()
+                try:
+                    @timed("generate")
+                    def generate_response():
+                        history = st.session_state.sessions[st.session_state.current_chat]
+                        if route["intent"] == "vision":
+                            model = "llama-3.2-11b-vision-preview"
+                            messages, prompt_tokens = build_context_window(
+                                history, instructions, model, extra_tokens=get_model_profile(model)["image_tokens"]
+                            )
+                            vision = get_vision_uploads().prepare(uploaded_image.getvalue())
+                            messages[-1]["content"] = [
+                                {"type": "text", "text": messages[-1]["content"]},
+                                {"type": "image_url", "image_url": {"url": vision["data_url"]}}
+                            ]
+                            key = response_cache_key(model, messages, CHAT_TEMPERATURE)
+                        else:
+                            request = prepare_chat(prompt, history, route, instructions,
+                                                   st.session_state.get("persona_selector"), complexity, recalled=recalled)
+                            model, messages, prompt_tokens = request["models"][0], request["messages"], request["prompt_tokens"]
+                            key = request["key"]
+                        if prefetched is not None and prefetched.done:
+                            # The exact answer is ready: replay it rather than a similar one
+                            text = get_prefetcher().use(prefetched, key)
+                            if text is not None:
+                                answer["prefetched"] = True
+                                yield from replay_chunks(text)
+                                return
+                        semantic = get_semantic_cache() if route["intent"] != "vision" else None
+                        if semantic is not None:
+                            scope = semantic_scope(model, messages[:-1], st.session_state.owner)
+                            similar = semantic.lookup(prompt, scope, effective_persona(
+                                route, st.session_state.get("persona_selector")))
+                            if similar is not None:
+                                answer["similarity"] = similar[1]
+                                yield from replay_chunks(similar[0])
+                                return
+                        if prefetched is not None and not prefetched.used:
+                            # Still streaming: promoted, and the request below joins it through SingleFlight
+                            text = get_prefetcher().use(prefetched, key)
+                            if text is not None:
+                                answer["prefetched"] = True
+                                yield from replay_chunks(text)
+                                return
+                        def upstream():
+                            # cache -> identical request already streaming -> rate-limit queue -> API
+                            flights, scheduler = get_single_flight(), get_request_scheduler()
+                            run = CascadeRun(
+                                scheduler, st.session_state.owner, CASCADE_MODELS[complexity["tier"]] if complexity else [model],
+                                prompt_tokens, lambda m: groq_text_stream(client, messages=messages, model=m, temperature=CHAT_TEMPERATURE),
+                            )
+                            handle = get_stream_engine().submit(lambda: flights.subscribe(key, run.stream))
+                            answer["handle"], answer["run"] = handle, run
+                            for batch in handle.batches():
+                                if batch:
+                                    if len(batch) == len(handle.text):
+                                        waiting.empty()
+                                    yield batch
+                                elif not handle.text:
+                                    # Also gives Streamlit a point to act on a Stop click before the first token
+                                    waiting.caption(scheduler.describe(run.request) or
+                                                    f"⏳ Waiting for the first token… {time.perf_counter() - handle.started:.1f}s")
 
+                        cache = get_response_cache()
+                        parts = []
+                        for piece in cache.stream(key, upstream):
+                            parts.append(piece)
+                            yield piece
+                        if semantic is not None:
+                            semantic.put(prompt, scope, "".join(parts))
 
+                    response_text = st.write_stream(generate_response())
+                    handle, run = answer.pop("handle", None), answer.pop("run", None)
+                    if prefetched is not None and run is None and not answer.get("prefetched"):
+                        # Answered by the semantic or response cache: nothing joins the prefetch
+                        get_prefetcher().abandon(prefetched)
+                    metrics = handle.metrics() if handle else {"cached": True, "similarity": answer.pop("similarity", None),
+                                                                "prefetched": answer.pop("prefetched", False)}
+                    if run is not None:
+                        metrics.update({"model": run.model, "escalated": run.escalated,
+                                        **({"hedged": True} if run.hedged else {})})
+                        if complexity is not None:
+                            get_cascade_stats().record(complexity, run, metrics)
+                    PROFILER.record_stream(metrics)
+                    stop_slot.empty()
+                    st.caption(format_stream_metrics(metrics))
+                    append_message({"role": "assistant", "content": response_text, "metrics": metrics,
+                                    **({"model": run.model} if run else {})})
+                    if st.session_state.get("prefetch_actions") and route["intent"] == "chat":
+                        with span("prefetch"):
+                            schedule_prefetch()
 
+                except Exception as e:
+                    st.error(describe_upstream_error(e))
+                finally:
+                    # Stop and a new prompt both rerun the script mid-stream; that, or an upstream
+                    # error, lands here: cancel the request and keep what was already shown
+                    handle, run = answer.pop("handle", None), answer.pop("run", None)
+                    if handle is not None:
+                        handle.cancel()
+                        PROFILER.record_stream(handle.metrics())
+                        if handle.text:
+                            append_message({"role": "assistant", "content": handle.text, "metrics": handle.metrics(),
+                                            "model": run.model})
+
+    last = st.session_state.sessions[st.session_state.current_chat][-1:]
+    if last and last[0]["role"] == "assistant" and not last[0].get("image_key"):
+        with span("actions"):
+            clicked = render_response_actions()
+        if clicked:
+            st.session_state.pending_action = clicked
+            st.rerun()
@@ -0,0 +1,99 @@
+"""
+Analytics: the original full recomputation (copied below as the baseline)
+vs. AnalyticsAccumulator's per-append update and snapshot.
+
+    python -m bench.bench_analytics
+"""
+
+import json
+import re
+import time
+from typing import Dict
+
+from hexaloy_features import AnalyticsAccumulator
+from bench.corpus import make_sessions
+
+
+# ── Baseline: compute_analytics as it was before the accumulator ───────────
+def legacy_compute_analytics(sessions: dict) -> dict:
+    """Compute comprehensive analytics from all sessions."""
+    total_sessions = len(sessions)
+    total_messages = 0
+    total_words    = 0
+    total_tokens   = 0
+    user_messages  = 0
+    ai_messages    = 0
+    longest_msg    = 0
+    session_lengths = []
+    word_freq: Dict[str, int] = {}
+
+    for sname, history in sessions.items():
+        session_lengths.append(len(history))
+        for msg in history:
+            content = msg.get("content", "")
+            if not isinstance(content, str):
+                continue
+            total_messages += 1
+            words = content.split()
+            total_words += len(words)
+            total_tokens += len(content) // 4
+            longest_msg = max(longest_msg, len(content))
+
+            if msg.get("role") == "user":
+                user_messages += 1
+                for w in words:
+                    w_clean = re.sub(r'[^\w]', '', w.lower())
+                    if len(w_clean) > 4:
+                        word_freq[w_clean] = word_freq.get(w_clean, 0) + 1
+            else:
+                ai_messages += 1
+
+    top_words = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)[:10]
+    avg_session_length = (sum(session_lengths) / len(session_lengths)) if session_lengths else 0
+
+    return {
+        "total_sessions":     total_sessions,
+        "total_messages":     total_messages,
+        "total_words":        total_words,
+        "total_tokens":       total_tokens,
+        "user_messages":      user_messages,
+        "ai_messages":        ai_messages,
+        "longest_msg_chars":  longest_msg,
+        "avg_session_length": round(avg_session_length, 1),
+        "top_words":          top_words,
+        "session_lengths":    session_lengths,
+    }
+
+
+def run(sizes=(1_000, 10_000, 100_000)) -> list:
+    rows = []
+    for n in sizes:
+        sessions = make_sessions(n)
+        t0 = time.perf_counter()
+        legacy_compute_analytics(sessions)
+        full_ms = (time.perf_counter() - t0) * 1000
+
+        acc = AnalyticsAccumulator.from_sessions(sessions)
+        msg = {"role": "user", "content": "Explain blockchain technology using only a pizza delivery analogy."}
+        session = next(iter(sessions))
+        t0 = time.perf_counter()
+        acc.add_message(session, len(sessions[session]), msg)
+        append_us = (time.perf_counter() - t0) * 1e6
+
+        t0 = time.perf_counter()
+        acc.sync(sessions)
+        acc.snapshot()
+        render_ms = (time.perf_counter() - t0) * 1000
+        rows.append({
+            "bench": "analytics",
+            "messages": n,
+            "full_recompute_ms": round(full_ms, 2),
+            "append_us": round(append_us, 1),
+            "sync_and_snapshot_ms": round(render_ms, 3),
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    for row in run():
+        print(json.dumps(row))
@@ -0,0 +1,65 @@
+"""
+Headless batch runner against the local Groq stub: the same prompt file
+answered with 1, 4 and 16 workers through hexaloy_batch.run_batch().
+Reports wall time, prompts per minute, latency percentiles and errors,
+and checks that a resumed run skips everything already written.
+
+    python -m bench.bench_batch
+"""
+
+import asyncio
+import io
+import json
+import os
+import tempfile
+import time
+
+import groq
+
+from hexaloy_batch import finished_ids, record_id, run_batch, summarize
+from bench.groq_stub import serve
+
+
+def _records(prompts):
+    return [{"prompt": f"Explain concept number {i} with an example"} for i in range(prompts)]
+
+
+async def _run(records, base_url, workers, out):
+    client = groq.AsyncGroq(api_key="bench", base_url=base_url, max_retries=0)
+    try:
+        return await run_batch(records, client, out, workers=workers, quota_scale=1000)
+    finally:
+        await client.close()
+
+
+def run(prompts: int = 60, workers: tuple = (1, 4, 16), reply_tokens: int = 60) -> list:
+    server = serve(rpm=60_000, tpm=60_000_000, reply_tokens=reply_tokens, ttft=0.15, delay=0.003)
+    records = _records(prompts)
+    rows = []
+    for n in workers:
+        t0 = time.perf_counter()
+        results = asyncio.run(_run(records, server.base_url, n, io.StringIO()))
+        summary = summarize(results, time.perf_counter() - t0)
+        rows.append({"bench": "batch", "mode": f"workers_{n}", **summary})
+
+    # Resume: write half, then a second run over the full file must only answer the rest
+    path = os.path.join(tempfile.mkdtemp(prefix="hexaloy-batch-"), "results.ndjson")
+    with open(path, "a", encoding="utf-8") as out:
+        asyncio.run(_run(records[:prompts // 2], server.base_url, max(workers), out))
+    done = finished_ids(path)
+    pending = [r for r in records if record_id(r) not in done]
+    t0 = time.perf_counter()
+    with open(path, "a", encoding="utf-8") as out:
+        results = asyncio.run(_run(pending, server.base_url, max(workers), out))
+    with open(path, encoding="utf-8") as f:
+        written = [json.loads(line)["id"] for line in f]
+    rows.append({"bench": "batch", "mode": "resume", "prompts": prompts, "skipped_on_resume": len(done),
+                 "answered_on_resume": len(results), "wall_s": round(time.perf_counter() - t0, 2),
+                 "duplicates": len(written) - len(set(written))})
+    server.shutdown()
+    return rows
+
+
+if __name__ == "__main__":
+    for row in run():
+        print(json.dumps(row))
@@ -0,0 +1,93 @@
+"""
+Model cascade: routing accuracy on the labeled complexity corpus and cost
+of scoring a prompt, then latency per route against the local Groq stub
+(a fast small model and a slower large one), sending everything to the
+large model vs. cascading, and with the small model failing every request
+so each light prompt has to escalate.
+
+    python -m bench.bench_cascade
+"""
+
+import asyncio
+import json
+import statistics
+import time
+
+import groq
+
+from hexaloy_features import (
+    CASCADE_MODELS, CascadeRun, RequestScheduler, count_tokens, groq_text_stream, route_prompt,
+    score_prompt_complexity,
+)
+from bench.complexity_corpus import CASES
+from bench.groq_stub import serve
+
+LIGHT, FULL = CASCADE_MODELS["light"][0], CASCADE_MODELS["full"][0]
+SPEEDS = {LIGHT: {"ttft": 0.08, "delay": 0.003}, FULL: {"ttft": 0.35, "delay": 0.008}}
+
+
+def routing_row(repeat: int = 200) -> dict:
+    decisions = [score_prompt_complexity(c["prompt"], route_prompt(c["prompt"]), c.get("persona")) for c in CASES]
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for c in CASES:
+            score_prompt_complexity(c["prompt"], route_prompt(c["prompt"]), c.get("persona"))
+    per_prompt = (time.perf_counter() - t0) / (repeat * len(CASES))
+    return {
+        "bench": "cascade", "case": "routing", "prompts": len(CASES),
+        "accuracy": round(sum(d["tier"] == c["tier"] for d, c in zip(decisions, CASES)) / len(CASES), 3),
+        "light_share": round(sum(d["tier"] == "light" for d in decisions) / len(CASES), 3),
+        "sent_light_but_labeled_full": sum(d["tier"] == "light" and c["tier"] == "full" for d, c in zip(decisions, CASES)),
+        "score_us": round(per_prompt * 1e6, 1),
+    }
+
+
+async def _answer(i, case, mode, client, scheduler, results):
+    await asyncio.sleep(0.05 * i)
+    tier = "full" if mode == "full_only" else score_prompt_complexity(
+        case["prompt"], route_prompt(case["prompt"]), case.get("persona"))["tier"]
+    messages = [{"role": "user", "content": case["prompt"]}]
+    run = CascadeRun(scheduler, f"user-{i}", CASCADE_MODELS[tier], count_tokens(case["prompt"]) + 8,
+                     lambda m: groq_text_stream(client, messages=messages, model=m))
+    t0 = time.perf_counter()
+    first = None
+    async for _ in run.stream():
+        if first is None:
+            first = time.perf_counter() - t0
+    results.append((tier, first, time.perf_counter() - t0, run.escalated))
+
+
+async def _latency(mode: str, light_fail_rate: float) -> dict:
+    speeds = {model: dict(speed) for model, speed in SPEEDS.items()}
+    speeds[LIGHT]["fail_rate"] = light_fail_rate
+    server = serve(rpm=6000, tpm=6_000_000, reply_tokens=120, models=speeds)
+    client = groq.AsyncGroq(api_key="bench", base_url=server.base_url, max_retries=0)
+    scheduler = RequestScheduler({m: {"rpm": 6000, "tpm": 6_000_000} for m in SPEEDS}, scale=1)
+    results = []
+    await asyncio.gather(*(_answer(i, c, mode, client, scheduler, results) for i, c in enumerate(CASES)))
+    server.shutdown()
+    await scheduler.close()
+    await client.close()
+    row = {"bench": "cascade", "mode": mode, "injected_503_rate": light_fail_rate,
+           "answers": len(results), "escalated": sum(r[3] for r in results)}
+    for tier in ("light", "full"):
+        routed = [r for r in results if r[0] == tier]
+        if routed:
+            row[f"{tier}_answers"] = len(routed)
+            row[f"{tier}_ttft_median_s"] = round(statistics.median(r[1] for r in routed), 3)
+            row[f"{tier}_total_median_s"] = round(statistics.median(r[2] for r in routed), 3)
+    row["ttft_mean_s"] = round(statistics.mean(r[1] for r in results), 3)
+    row["total_mean_s"] = round(statistics.mean(r[2] for r in results), 3)
+    return row
+
+
+def run() -> list:
+    rows = [routing_row()]
+    for mode, fail_rate in (("full_only", 0.0), ("cascade", 0.0), ("cascade", 1.0)):
+        rows.append(asyncio.run(_latency(mode, fail_rate)))
+    return rows
+
+
+if __name__ == "__main__":
+    for row in run():
+        print(json.dumps(row))
@@ -0,0 +1,74 @@
+"""
+Compare mode: one prompt to several models against the local Groq stub
+(each model with its own speed), asked one after another vs. all at once
+through CompareRun. Reports wall time, the sum of the per-model totals and
+each model's TTFT and tokens/sec as the UI would show them.
+
+    python -m bench.bench_compare
+"""
+
+import asyncio
+import json
+import time
+
+import groq
+
+from hexaloy_features import CompareRun, RequestScheduler, SingleFlight, StreamingEngine
+from bench.groq_stub import serve
+
+SPEEDS = {
+    "llama-3.1-8b-instant":    {"ttft": 0.08, "delay": 0.003},
+    "llama-3.3-70b-versatile": {"ttft": 0.35, "delay": 0.008},
+    "bench-slow-model":        {"ttft": 0.6, "delay": 0.012},
+}
+HISTORY = [{"role": "user", "content": "Explain how a hash map handles collisions."}]
+
+
+def _compare(engine, client, scheduler, models):
+    run = CompareRun(client, "bench", models, HISTORY, "You are a helpful assistant.", engine, scheduler,
+                     SingleFlight())
+    updates = sum(1 for _ in run.batches())
+    return run.results(), run.wall_seconds(), updates
+
+
+def _row(mode, results, wall, updates=None) -> dict:
+    row = {"bench": "compare", "mode": mode, "models": len(results), "wall_s": round(wall, 3),
+           "sum_of_totals_s": round(sum(r["metrics"]["total_seconds"] for r in results), 3),
+           "errors": sum(r["error"] is not None for r in results)}
+    if updates is not None:
+        row["ui_updates"] = updates
+    for r in results:
+        m = r["metrics"]
+        row[f"{r['model']}_ttft_s"] = m["ttft"]
+        row[f"{r['model']}_tokens_per_s"] = m["tokens_per_sec"]
+    return row
+
+
+def run(reply_tokens: int = 200) -> list:
+    server = serve(rpm=6000, tpm=6_000_000, reply_tokens=reply_tokens, models=SPEEDS)
+    engine = StreamingEngine()
+    client = groq.AsyncGroq(api_key="bench", base_url=server.base_url, max_retries=0)
+    scheduler = RequestScheduler({m: {"rpm": 6000, "tpm": 6_000_000} for m in SPEEDS}, scale=1)
+    models = list(SPEEDS)
+    rows = []
+    # Warm the connection pool so neither mode pays for the first connect
+    _compare(engine, client, scheduler, models[:1])
+
+    t0 = time.perf_counter()
+    results = []
+    for model in models:
+        results += _compare(engine, client, scheduler, [model])[0]
+    rows.append(_row("sequential", results, time.perf_counter() - t0))
+
+    results, wall, updates = _compare(engine, client, scheduler, models)
+    rows.append(_row("parallel", results, wall, updates))
+    rows[-1]["speedup"] = round(rows[0]["wall_s"] / wall, 2)
+    asyncio.run_coroutine_threadsafe(client.close(), engine.loop).result()
+    engine.close()
+    server.shutdown()
+    return rows
+
+
+if __name__ == "__main__":
+    for row in run():
+        print(json.dumps(row))
@@ -0,0 +1,101 @@
+"""
+Context building: the original compress_history (copied below as the
+baseline) vs. the bisect version, build_context_window latency, and a
+randomized check that the token budget is never exceeded.
+
+    python -m bench.bench_context
+"""
+
+import json
+import random
+import time
+
+from hexaloy_features import (
+    MODEL_PROFILES, REPLY_TOKEN_RESERVE, TOKEN_ESTIMATE_MARGIN, build_context_window, compress_history,
+    count_message_tokens, count_tokens, get_model_profile,
+)
+from bench.corpus import make_sessions
+
+
+# ── Baseline: compress_history as it was before prefix sums ────────────────
+def legacy_compress_history(history: list, max_messages: int = 20, max_chars: int = 12000) -> list:
+    """
+    Intelligently compress conversation history to fit token limits.
+    Keeps the most recent messages and summarizes older ones if needed.
+    """
+    if len(history) <= max_messages:
+        return history
+
+    # Keep the last N messages
+    recent = history[-max_messages:]
+
+    # Calculate total chars
+    total_chars = sum(len(str(m.get("content", ""))) for m in recent)
+
+    if total_chars <= max_chars:
+        return recent
+
+    # Further trim if still too long
+    while recent and total_chars > max_chars:
+        removed = recent.pop(0)
+        total_chars -= len(str(removed.get("content", "")))
+
+    return recent
+
+
+def check_budget(trials: int = 500, seed: int = 1) -> int:
+    """Random histories, budgets and models; raise if any window is over budget."""
+    rng = random.Random(seed)
+    checked = 0
+    for trial in range(trials):
+        n = rng.randint(1, 300)
+        history = make_sessions(n, per_session=n, seed=trial)["Session 1"]
+        model = rng.choice(list(MODEL_PROFILES))
+        budget = rng.randint(100, 9000)
+        extra = rng.choice([0, get_model_profile(model)["image_tokens"]])
+        try:
+            messages, used = build_context_window(history, "You are HEXALOY. " * rng.randint(1, 100),
+                                                  model, budget=budget, extra_tokens=extra)
+        except ValueError:
+            continue
+        window = int(get_model_profile(model)["context_window"] * (1 - TOKEN_ESTIMATE_MARGIN))
+        cap = min(budget, window - REPLY_TOKEN_RESERVE)
+        actual = count_message_tokens(messages, model) + extra
+        if actual != used or used > cap:
+            raise AssertionError(f"trial {trial}: {actual} tokens (reported {used}) over budget {cap}")
+        checked += 1
+    return checked
+
+
+def _time(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def run(sizes=(100, 1_000, 10_000)) -> list:
+    rows = []
+    for n in sizes:
+        history = make_sessions(n, per_session=n)["Session 1"]
+        count_tokens.cache_clear()
+        cold_ms = _time(lambda: build_context_window(history, "You are HEXALOY.", "llama-3.3-70b-versatile"), 1)
+        rows.append({
+            "bench": "context",
+            "messages": n,
+            # max_messages=n, small max_chars: the worst case for the pop(0) loop
+            "legacy_compress_ms": round(_time(lambda: legacy_compress_history(list(history), n - 1, 2000)), 3),
+            "compress_ms": round(_time(lambda: compress_history(history, n - 1, 2000)), 3),
+            "window_cold_ms": round(cold_ms, 3),
+            "window_warm_ms": round(_time(lambda: build_context_window(
+                history, "You are HEXALOY.", "llama-3.3-70b-versatile")), 3),
+        })
+    rows.append({"bench": "context_budget_check", "windows_checked": check_budget(), "violations": 0})
+    return rows
+
+
+if __name__ == "__main__":
+    for row in run():
+        print(json.dumps(row))
@@ -0,0 +1,180 @@
+"""
+Export time and peak memory on one long session: the original in-memory
+exporters (copied below as the baseline) vs. streaming into a file.
+
+    python -m bench.bench_export
+"""
+
+import datetime
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from hexaloy_features import write_chat_export
+from bench.corpus import make_sessions
+
+
+# ── Baseline: exporters as they were before streaming ──────────────────────
+def legacy_export_chat_as_markdown(history: list, session_name: str) -> str:
+    """
+    Convert chat history to beautifully formatted Markdown.
+    Returns the Markdown string.
+    """
+    lines = [
+        f"# 💠 HEXALOY AI — Chat Export",
+        f"",
+        f"**Session:** {session_name}",
+        f"**Exported:** {datetime.datetime.now().strftime('%B %d, %Y at %I:%M %p')}",
+        f"**Messages:** {len(history)}",
+        f"",
+        "---",
+        "",
+    ]
+    for msg in history:
+        role = msg.get("role", "user")
+        content = msg.get("content", "")
+        ts = msg.get("ts", "")
+        model = msg.get("model", "")
+
+        if role == "user":
+            lines.append(f"### 🧑‍💼 You{' · ' + ts if ts else ''}")
+        else:
+            lines.append(f"### 💠 HEXALOY{' · ' + ts if ts else ''}{' · ' + model if model else ''}")
+
+        lines.append("")
+        lines.append(content)
+        lines.append("")
+        lines.append("---")
+        lines.append("")
+
+    lines.append(f"*Generated by HEXALOY AI v7.0 — Architected by VINIT MAAN*")
+    return "\n".join(lines)
+
+
+def legacy_export_chat_as_json(history: list, session_name: str) -> str:
+    """Export chat history as formatted JSON."""
+    data = {
+        "hexaloy_version": "7.0",
+        "session_name": session_name,
+        "exported_at": datetime.datetime.now().isoformat(),
+        "message_count": len(history),
+        "messages": history,
+        "metadata": {
+            "architect": "VINIT MAAN",
+            "platform": "HEXALOY Enterprise AI",
+        }
+    }
+    return json.dumps(data, indent=2, ensure_ascii=False)
+
+
+def legacy_export_chat_as_html(history: list, session_name: str) -> str:
+    """Export chat history as a standalone beautiful HTML file."""
+    msgs_html = ""
+    for msg in history:
+        role = msg.get("role", "user")
+        content = msg.get("content", "")
+        ts = msg.get("ts", "")
+        is_user = role == "user"
+
+        # Escape HTML
+        content_escaped = content.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+        avatar  = "🧑‍💼" if is_user else "💠"
+        label   = "You" if is_user else "HEXALOY"
+        bg      = "#EEF2FF" if is_user else "#FFFFFF"
+        border  = "#C7D7FF" if is_user else "#E2E8F0"
+
+        msgs_html += f"""
+        <div style="
+            background:{bg}; border:1px solid {border};
+            border-radius:16px; padding:18px 22px; margin-bottom:14px;
+        ">
+            <div style="font-weight:700;margin-bottom:8px;color:#0D1B4B;">
+                {avatar} {label}
+                <span style="font-weight:400;font-size:0.75rem;color:#7A8BB0;margin-left:8px;">{ts}</span>
+            </div>
+            <div style="color:#1E293B;line-height:1.7;white-space:pre-wrap;font-size:0.95rem;">{content_escaped}</div>
+        </div>
+        """
+
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width,initial-scale=1.0">
+    <title>HEXALOY Chat Export — {session_name}</title>
+    <link href="https://fonts.googleapis.com/css2?family=Outfit:wght@400;500;600;700&display=swap" rel="stylesheet">
+    <style>
+        body {{ font-family:'Outfit',sans-serif; background:#F0F4FF; color:#0D1B4B; margin:0; padding:0; }}
+        .container {{ max-width:820px; margin:0 auto; padding:40px 20px; }}
+        .header {{ text-align:center; margin-bottom:36px; padding:32px; background:white; border-radius:20px; border:1px solid #E8EEFF; box-shadow:0 4px 24px rgba(43,92,230,0.10); }}
+        h1 {{ font-size:2rem; margin:0 0 8px; color:#2B5CE6; }}
+        .meta {{ color:#7A8BB0; font-size:0.85rem; }}
+        .footer {{ text-align:center; margin-top:40px; color:#AAB4CC; font-size:0.78rem; }}
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>💠 HEXALOY Chat Export</h1>
+            <div class="meta">
+                Session: <strong>{session_name}</strong> &nbsp;·&nbsp;
+                {len(history)} messages &nbsp;·&nbsp;
+                {datetime.datetime.now().strftime('%B %d, %Y')}
+            </div>
+        </div>
+        {msgs_html}
+        <div class="footer">HEXALOY AI v7.0 &nbsp;·&nbsp; Architected by VINIT MAAN</div>
+    </div>
+</body>
+</html>"""
+
+
+LEGACY = {
+    "md": legacy_export_chat_as_markdown,
+    "json": legacy_export_chat_as_json,
+    "html": legacy_export_chat_as_html,
+}
+
+
+def _measure(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return round(elapsed * 1000, 1), peak // 1024
+
+
+def run(n_messages: int = 10_000) -> list:
+    history = make_sessions(n_messages, per_session=n_messages)["Session 1"]
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt, legacy in LEGACY.items():
+            path = os.path.join(tmp, f"export.{fmt}")
+
+            def stream():
+                with open(path, "wb") as fp:
+                    write_chat_export(fmt, history, "Session 1", fp)
+
+            legacy_ms, legacy_kb = _measure(lambda: legacy(history, "Session 1"))
+            stream_ms, stream_kb = _measure(stream)
+            rows.append({
+                "bench": "export",
+                "format": fmt,
+                "messages": n_messages,
+                "legacy_ms": legacy_ms,
+                "legacy_peak_kb": legacy_kb,
+                "stream_ms": stream_ms,
+                "stream_peak_kb": stream_kb,
+                "output_kb": os.path.getsize(path) // 1024,
+            })
+    return rows
+
+
+if __name__ == "__main__":
+    for row in run():
+        print(json.dumps(row))
@@ -0,0 +1,63 @@
+"""
+Time and peak memory of the pure functions in hexaloy_features.py on
+synthetic corpora from 10 to 100k messages: search (scan and index),
+compute_analytics, compress_history and the three exporters.
+
+    python -m bench.bench_functions
+"""
+
+import json
+import time
+import tracemalloc
+
+from hexaloy_features import (
+    ConversationIndex, compress_history, compute_analytics, export_chat_as_html, export_chat_as_json,
+    export_chat_as_markdown, search_conversations,
+)
+from bench.corpus import VOCAB, make_sessions
+
+SIZES = (10, 100, 1_000, 10_000, 100_000)
+
+
+def _measure(fn, repeat: int) -> dict:
+    """Best wall time over `repeat` calls, then peak traced memory of one more call."""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"ms": round(best * 1000, 3), "peak_kb": peak // 1024}
+
+
+def _cases(sessions: dict, history: list) -> dict:
+    index = ConversationIndex.from_sessions(sessions)
+    return {
+        "search_scan": lambda: search_conversations(sessions, VOCAB[3000]),
+        "search_index": lambda: search_conversations(sessions, VOCAB[3000], index=index),
+        "index_build": lambda: ConversationIndex.from_sessions(sessions),
+        "compute_analytics": lambda: compute_analytics(sessions),
+        "compress_history": lambda: compress_history(history, max(len(history) - 1, 1), 2000),
+        "export_markdown": lambda: export_chat_as_markdown(history, "Session 1"),
+        "export_json": lambda: export_chat_as_json(history, "Session 1"),
+        "export_html": lambda: export_chat_as_html(history, "Session 1"),
+    }
+
+
+def run(sizes=SIZES) -> list:
+    rows = []
+    for n in sizes:
+        sessions = make_sessions(n)
+        history = make_sessions(n, per_session=n)["Session 1"]
+        repeat = 5 if n <= 10_000 else 2
+        for name, fn in _cases(sessions, history).items():
+            rows.append({"bench": "functions", "function": name, "messages": n, **_measure(fn, repeat)})
+    return rows
+
+
+if __name__ == "__main__":
+    for row in run():
+        print(json.dumps(row))
@@ -0,0 +1,63 @@
+"""
+ImageJobs against the local image stub: time the script thread spends
+handing off a job (it used to sleep 1.5 s), cold fetch, cache hit,
+de-duplication of a prompt already in flight, and parallel fetches.
+
+    python -m bench.bench_images
+"""
+
+import json
+import time
+
+from hexaloy_features import ImageJobs, build_enhanced_image_prompt
+from bench.image_stub import serve
+
+
+def _wait(jobs: ImageJobs, keys) -> None:
+    while any(jobs.pending(k) for k in keys):
+        time.sleep(0.001)
+
+
+def run(delay: float = 0.5, parallel: int = 8) -> list:
+    server = serve(delay=delay)
+    jobs = ImageJobs(base_url=server.base_url)
+    prompt = build_enhanced_image_prompt("a lighthouse at dawn", "🎨 Realistic", "🌟 Epic")
+
+    t0 = time.perf_counter()
+    job = jobs.submit(prompt)
+    submit_ms = (time.perf_counter() - t0) * 1000
+    joiners = [jobs.submit(prompt) for _ in range(parallel - 1)]
+    _wait(jobs, [job.key])
+    cold_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    hit = jobs.submit(prompt)
+    data = jobs.image(hit.key)
+    hit_ms = (time.perf_counter() - t0) * 1000
+
+    prompts = [build_enhanced_image_prompt(f"scene {i}", "✏️ Sketch", "☁️ Dreamy") for i in range(parallel)]
+    t0 = time.perf_counter()
+    keys = [jobs.submit(p).key for p in prompts]
+    _wait(jobs, keys)
+    parallel_s = time.perf_counter() - t0
+    server.shutdown()
+
+    return [{
+        "bench": "images",
+        "stub_delay_s": delay,
+        "old_fixed_sleep_s": 1.5,
+        "submit_ms": round(submit_ms, 3),
+        "cold_fetch_s": round(cold_s, 3),
+        "cache_hit_ms": round(hit_ms, 3),
+        "image_bytes": len(data or b""),
+        "same_prompt_submits": 1 + len(joiners),
+        "distinct_prompts": parallel,
+        "parallel_fetch_s": round(parallel_s, 3),
+        "upstream_requests": server.requests,
+        **jobs.stats(),
+    }]
+
+
+if __name__ == "__main__":
+    for row in run():
+        print(json.dumps(row))
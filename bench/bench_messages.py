@@ -0,0 +1,110 @@
+"""
+Memory of a loaded chat history: message dicts as the store used to build
+them versus the compact Message records it builds now, for a 50k-message
+corpus read back from a throwaway database. Reports tracemalloc totals,
+sys.getsizeof per message (shallow, and deep with shared strings counted
+once), load time, and the cost of reading through the compatibility view
+in an export and the analytics.
+
+    python -m bench.bench_messages
+"""
+
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from hexaloy_features import SessionStore, compute_analytics, export_chat_as_markdown
+from bench.corpus import make_sessions
+
+
+def _dict_from_row(row: tuple) -> dict:
+    """A stored message as SessionStore returned it before Message existed."""
+    role, content, ts, model, extra = row
+    msg = {"role": role, "content": content}
+    if ts is not None:
+        msg["ts"] = ts
+    if model is not None:
+        msg["model"] = model
+    if extra:
+        msg.update(json.loads(extra))
+    return msg
+
+
+def _load_dicts(store: SessionStore, ids: list) -> list:
+    return [
+        [_dict_from_row(r) for r in store._conn.execute(
+            "SELECT role, content, ts, model, extra FROM messages WHERE session_id = ? ORDER BY seq", (i,))]
+        for i in ids
+    ]
+
+
+def _load_messages(store: SessionStore, ids: list) -> list:
+    return [store.load_messages(i) for i in ids]
+
+
+def _deep_size(histories: list) -> int:
+    seen, total = set(), 0
+    for history in histories:
+        for msg in history:
+            for obj in (msg, *(msg.values() if isinstance(msg, dict) else
+                               (msg.role, msg.content, msg.ts, msg.model, msg._extra))):
+                if obj is not None and id(obj) not in seen:
+                    seen.add(id(obj))
+                    total += sys.getsizeof(obj)
+    return total
+
+
+def _measure(variant: str, load, store: SessionStore, ids: list, n_messages: int) -> dict:
+    t0 = time.perf_counter()
+    load(store, ids)
+    load_s = time.perf_counter() - t0
+    gc.collect()
+    tracemalloc.start()
+    histories = load(store, ids)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    t0 = time.perf_counter()
+    for i, history in enumerate(histories):
+        export_chat_as_markdown(history, f"Session {i}")
+    export_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    compute_analytics({f"Session {i}": h for i, h in enumerate(histories)})
+    analytics_s = time.perf_counter() - t0
+
+    return {
+        "bench": "messages",
+        "variant": variant,
+        "messages": n_messages,
+        "retained_kb": retained // 1024,
+        "peak_kb": peak // 1024,
+        "bytes_per_message": round(retained / n_messages, 1),
+        "getsizeof_shallow": round(sum(sys.getsizeof(m) for h in histories for m in h) / n_messages, 1),
+        "getsizeof_deep_kb": _deep_size(histories) // 1024,
+        "load_s": round(load_s, 3),
+        "export_md_s": round(export_s, 3),
+        "analytics_s": round(analytics_s, 3),
+    }
+
+
+def run(n_messages: int = 50_000, per_session: int = 500) -> list:
+    corpus = make_sessions(n_messages, per_session=per_session)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SessionStore(os.path.join(tmp, "bench.db"))
+        ids = [store.create_session("bench", title) for title in corpus]
+        for session_id, history in zip(ids, corpus.values()):
+            store.append_messages(session_id, history)
+        del corpus
+        rows = [_measure("dict", _load_dicts, store, ids, n_messages),
+                _measure("message", _load_messages, store, ids, n_messages)]
+        store.close()
+    return rows
+
+
+if __name__ == "__main__":
+    for row in run():
+        print(json.dumps(row))
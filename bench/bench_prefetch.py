@@ -0,0 +1,130 @@
+"""
+Speculative quick actions against the local Groq stub. Simulated users
+ask a question, read the answer for a while, then either click a quick
+action (drawn from CLICK_WEIGHTS) or type a new prompt. Compares click
+latency, prompt latency, hit rate and wasted tokens without prefetch and
+with it. A last run uses a tight per-model quota to check that
+background requests stay out of the way of interactive ones.
+
+    python -m bench.bench_prefetch
+"""
+
+import asyncio
+import json
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import groq
+
+from hexaloy_features import (
+    CASCADE_MODELS, RESPONSE_ACTIONS, CascadeRun, RequestScheduler, SingleFlight, SpeculativePrefetcher,
+    StreamingEngine, build_context_window, groq_text_stream, response_cache_key, route_prompt,
+    score_prompt_complexity,
+)
+from bench.groq_stub import serve
+
+CLICK_WEIGHTS = {"📋 Summarize": 35, "⚡ Shorter": 20, "🎯 Key Points": 15, "💡 Simplify": 10,
+                 "🌐 Translate": 8, "🔍 Expand": 6, "💻 Show Code": 3, "🔄 Alternative": 3}
+NEW_PROMPT_SHARE = 0.4          # turns where the user types something instead of clicking
+SYSTEM = "You are HEXALOY, a helpful assistant."
+ACTIONS = dict(RESPONSE_ACTIONS)
+
+
+def _request(prompt, history):
+    tier = score_prompt_complexity(prompt, route_prompt(prompt))["tier"]
+    messages, prompt_tokens = build_context_window([*history, {"role": "user", "content": prompt}], SYSTEM,
+                                                   CASCADE_MODELS[tier][0])
+    return CASCADE_MODELS[tier], messages, prompt_tokens, response_cache_key(CASCADE_MODELS[tier][0], messages, 0.7)
+
+
+def _answer(env, owner, prompt, history, entry=None):
+    """Answer `prompt` the way the app does. Returns (text, ttft, total seconds, served from prefetch)."""
+    models, messages, prompt_tokens, key = _request(prompt, history)
+    t0 = time.perf_counter()
+    if entry is not None:
+        text = env["prefetcher"].use(entry, key)
+        if text is not None:
+            return text, time.perf_counter() - t0, time.perf_counter() - t0, True
+    run = CascadeRun(env["scheduler"], owner, models, prompt_tokens,
+                     lambda m: groq_text_stream(env["client"], messages=messages, model=m, temperature=0.7))
+    handle = env["engine"].submit(lambda: env["flights"].subscribe(key, run.stream))
+    for _ in handle.batches():
+        pass
+    metrics = handle.metrics()
+    return handle.text, metrics["ttft"], metrics["total_seconds"], False
+
+
+def _user(env, owner, turns, read_seconds, prefetch, seed):
+    rng = random.Random(seed)
+    history, clicks, prompts = [], [], []
+    prompt = f"Explain topic number {seed} in a few paragraphs"
+    for turn in range(turns):
+        entry = env["prefetcher"].claim(owner, "chat", len(history), prompt)
+        text, ttft, total, prefetched = _answer(env, owner, prompt, history, entry)
+        (clicks if prompt in ACTIONS.values() else prompts).append((ttft, total, prefetched))
+        history += [{"role": "user", "content": prompt}, {"role": "assistant", "content": text}]
+        if prefetch:
+            env["prefetcher"].schedule(
+                owner, "chat", len(history), lambda p: _request(p, history),
+                lambda model, messages: groq_text_stream(env["client"], messages=messages, model=model,
+                                                         temperature=0.7))
+        time.sleep(read_seconds * rng.uniform(0.5, 1.5))
+        if rng.random() < NEW_PROMPT_SHARE:
+            prompt = f"Tell me more about sub-topic {turn} of topic {seed}"
+        else:
+            label = rng.choices(list(CLICK_WEIGHTS), weights=list(CLICK_WEIGHTS.values()))[0]
+            env["prefetcher"].record_click(label)
+            prompt = ACTIONS[label]
+    env["prefetcher"].drop(owner)
+    return clicks, prompts
+
+
+def _scenario(mode, prefetch, users, turns, read_seconds, quota, reply_tokens):
+    server = serve(rpm=6000, tpm=6_000_000, reply_tokens=reply_tokens, ttft=0.2, delay=0.004)
+    engine = StreamingEngine()
+    scheduler = RequestScheduler({m: quota for m in ("llama-3.1-8b-instant", "llama-3.3-70b-versatile")}, scale=1)
+    flights = SingleFlight()
+    env = {
+        "engine": engine, "scheduler": scheduler, "flights": flights,
+        "client": groq.AsyncGroq(api_key="bench", base_url=server.base_url, max_retries=0),
+        "prefetcher": SpeculativePrefetcher(engine, scheduler, flights, budget=10 ** 9),
+    }
+    with ThreadPoolExecutor(users) as pool:
+        results = list(pool.map(lambda i: _user(env, f"user-{i}", turns, read_seconds, prefetch, i),
+                                range(users)))
+    time.sleep(0.2)                     # let cancelled prefetches settle before reading the counters
+    asyncio.run_coroutine_threadsafe(env["client"].close(), engine.loop).result()
+    engine.close()
+    server.shutdown()
+    clicks = [c for r in results for c in r[0]]
+    prompts = [p for r in results for p in r[1]]
+    stats = env["prefetcher"].stats()
+    row = {"bench": "prefetch", "mode": mode, "users": users, "clicks": len(clicks), "prompts": len(prompts),
+           "click_ttft_median_s": round(statistics.median(c[0] for c in clicks), 3) if clicks else None,
+           "click_total_median_s": round(statistics.median(c[1] for c in clicks), 3) if clicks else None,
+           "prompt_ttft_median_s": round(statistics.median(p[0] for p in prompts), 3) if prompts else None,
+           "served_from_prefetch": sum(c[2] for c in clicks)}
+    if prefetch:
+        spent = sum(env["prefetcher"].spent(f"user-{i}") for i in range(users))
+        row.update({"hit_rate": stats["hit_rate"], "joined": stats["joined"], "wasted_tokens": stats["wasted_tokens"],
+                    "prefetch_tokens": spent,
+                    "wasted_share": round(stats["wasted_tokens"] / spent, 3) if spent else 0.0})
+    return row
+
+
+def run(users: int = 6, turns: int = 5, read_seconds: float = 1.5, reply_tokens: int = 80) -> list:
+    roomy = {"rpm": 6000, "tpm": 6_000_000}
+    tight = {"rpm": 240, "tpm": 240_000, "burst": 2.0}
+    return [
+        _scenario("off", False, users, turns, read_seconds, roomy, reply_tokens),
+        _scenario("prefetch", True, users, turns, read_seconds, roomy, reply_tokens),
+        _scenario("off_tight_quota", False, users, turns, read_seconds, tight, reply_tokens),
+        _scenario("prefetch_tight_quota", True, users, turns, read_seconds, tight, reply_tokens),
+    ]
+
+
+if __name__ == "__main__":
+    for row in run():
+        print(json.dumps(row))
@@ -0,0 +1,109 @@
+"""
+Per-rerun script time and memory of app.py under Streamlit's AppTest, with
+a fake Groq backend and a throwaway session database, plus one full chat
+turn replayed from a synthetic or recorded stream.
+
+    python -m bench.bench_rerun [RECORDING.json]
+"""
+
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+_TMP = tempfile.mkdtemp(prefix="hexaloy-bench-")
+os.environ["HEXALOY_DB_PATH"] = os.path.join(_TMP, "sessions.db")
+
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+from bench import fake_groq  # noqa: E402
+from bench.corpus import make_sessions  # noqa: E402
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+def _app(owner: str) -> AppTest:
+    at = AppTest.from_file(APP, default_timeout=60)
+    at.secrets["GROQ_API_KEY"] = "bench"
+    at.query_params["u"] = owner
+    return at
+
+
+def _seed(owner: str, n_messages: int) -> int:
+    from hexaloy_features import get_session_store
+    store = get_session_store()
+    history = make_sessions(n_messages, per_session=n_messages)["Session 1"]
+    session_id = store.create_session(owner, "Seeded chat")
+    store.append_messages(session_id, history)
+    return session_id
+
+
+def _peak_kb(at: AppTest) -> int:
+    tracemalloc.start()
+    at.run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak // 1024
+
+
+def run(message_counts=(0, 10, 100, 300), reruns: int = 10, recording: str = None,
+        time_scale: float = 1.0) -> list:
+    """
+    One row per history length. The chat turn streams `recording` (see
+    bench.fake_groq.record) or a synthetic 300-token answer at 250 tok/s.
+    """
+    schedule = fake_groq.load_recording(recording) if recording else fake_groq.synthetic_schedule(300)
+    uninstall = fake_groq.install(schedule=schedule, time_scale=time_scale)
+    cwd = os.getcwd()
+    os.chdir(os.path.dirname(APP))   # app.py loads logo.png relative to the working directory
+    rows = []
+    try:
+        for n in message_counts:
+            owner = f"bench-{n}"
+            seeded = _seed(owner, n) if n else None
+            at = _app(owner)
+            if seeded is not None:
+                at.session_state["current_chat"] = seeded
+            t0 = time.perf_counter()
+            at.run()
+            first_ms = (time.perf_counter() - t0) * 1000
+            if at.exception:
+                raise RuntimeError(at.exception[0].message)
+            times = []
+            for _ in range(reruns):
+                t0 = time.perf_counter()
+                at.run()
+                times.append((time.perf_counter() - t0) * 1000)
+            peak_kb = _peak_kb(at)
+
+            t0 = time.perf_counter()
+            at.chat_input[0].set_value("Explain how photosynthesis works").run()
+            turn_ms = (time.perf_counter() - t0) * 1000
+            if at.exception:
+                raise RuntimeError(at.exception[0].message)
+            rows.append({
+                "bench": "rerun",
+                "messages": n,
+                "first_run_ms": round(first_ms, 1),
+                "rerun_median_ms": round(statistics.median(times), 1),
+                "rerun_max_ms": round(max(times), 1),
+                "rerun_peak_kb": peak_kb,
+                "stream_chunks": len(schedule),
+                "stream_seconds": round(schedule[-1][0] * time_scale, 3),
+                "chat_turn_ms": round(turn_ms, 1),
+            })
+    finally:
+        os.chdir(cwd)
+        uninstall()
+        # The app's cached client is a fake; later benchmarks in this process must build a real one
+        from hexaloy_features import get_async_groq_client
+        get_async_groq_client.clear()
+    return rows
+
+
+if __name__ == "__main__":
+    for row in run(recording=sys.argv[1] if len(sys.argv) > 1 else None):
+        print(json.dumps(row))
@@ -0,0 +1,89 @@
+"""
+Upstream resilience against the fault-injecting Groq stub: TTFT and total
+time percentiles (p50/p95/p99) and error rate for plain requests vs.
+CascadeRun with hedging, circuit breakers and the fallback model, in
+three scenarios: occasional stalls before the first token, a flaky model
+(a share of requests fail with 503) and a full outage of the large model.
+
+    python -m bench.bench_resilience
+"""
+
+import asyncio
+import json
+import time
+
+import groq
+
+from hexaloy_features import FALLBACK_MODELS, CascadeRun, RequestScheduler, UpstreamHealth, groq_text_stream
+from bench.groq_stub import serve
+
+MODEL = "llama-3.3-70b-versatile"
+FAULTS = {
+    "stalls":  {MODEL: {"stall_rate": 0.05, "stall": 2.5}},
+    "flaky":   {MODEL: {"fail_rate": 0.2}},
+    "outage":  {MODEL: {"fail_rate": 1.0}},
+}
+
+
+def _percentile(values, p):
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(p * len(values)))], 3) if values else None
+
+
+async def _one(i, client, scheduler, health, resilient, results, spacing):
+    await asyncio.sleep(spacing * i)
+    messages = [{"role": "user", "content": f"Question {i}"}]
+    run = CascadeRun(scheduler, f"user-{i % 20}", [MODEL], 40,
+                     lambda m: groq_text_stream(client, messages=messages, model=m),
+                     health=health, hedge=resilient, fallback=resilient)
+    t0 = time.perf_counter()
+    first = None
+    try:
+        async for _ in run.stream():
+            if first is None:
+                first = time.perf_counter() - t0
+        results.append({"ttft": first, "total": time.perf_counter() - t0, "error": False,
+                        "fallback": run.model != MODEL, "hedged": run.hedged})
+    except Exception:
+        results.append({"ttft": None, "total": time.perf_counter() - t0, "error": True,
+                        "fallback": False, "hedged": run.hedged})
+
+
+async def _scenario(fault, resilient, requests, spacing):
+    server = serve(rpm=60_000, tpm=60_000_000, reply_tokens=40, ttft=0.15, delay=0.003, models=FAULTS[fault])
+    client = groq.AsyncGroq(api_key="bench", base_url=server.base_url, max_retries=0)
+    scheduler = RequestScheduler({m: {"rpm": 60_000, "tpm": 60_000_000} for m in (MODEL, FALLBACK_MODELS[MODEL])},
+                                 scale=1)
+    # Without the resilience layer no breaker ever opens; with it, a fresh one per run
+    health = UpstreamHealth() if resilient else UpstreamHealth(failures=10 ** 9)
+    results = []
+    await asyncio.gather(*(_one(i, client, scheduler, health, resilient, results, spacing) for i in range(requests)))
+    upstream = server.requests
+    server.shutdown()
+    await scheduler.close()
+    await client.close()
+    ok = [r for r in results if not r["error"]]
+    return {
+        "bench": "resilience", "case": fault, "mode": "resilient" if resilient else "plain",
+        "requests": requests, "error_rate": round(1 - len(ok) / len(results), 3),
+        "ttft_p50_s": _percentile([r["ttft"] for r in ok], 0.5),
+        "ttft_p95_s": _percentile([r["ttft"] for r in ok], 0.95),
+        "ttft_p99_s": _percentile([r["ttft"] for r in ok], 0.99),
+        "total_p99_s": _percentile([r["total"] for r in results], 0.99),
+        "hedged": sum(r["hedged"] for r in results), "fallback_answers": sum(r["fallback"] for r in ok),
+        "upstream_calls_per_request": round(upstream / requests, 2),
+        "breaker_trips": health.breaker(MODEL).trips,
+    }
+
+
+def run(requests: int = 300, spacing: float = 0.05) -> list:
+    rows = []
+    for fault in FAULTS:
+        for resilient in (False, True):
+            rows.append(asyncio.run(_scenario(fault, resilient, requests, spacing)))
+    return rows
+
+
+if __name__ == "__main__":
+    for row in run():
+        print(json.dumps(row))
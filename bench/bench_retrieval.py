@@ -0,0 +1,88 @@
+"""
+Cross-session retrieval memory: incremental indexing cost, search and
+recall() latency at 10k and 100k chunks, matrix size, and whether facts
+planted in old sessions come back for a related prompt in a new one.
+
+    python -m bench.bench_retrieval
+"""
+
+import json
+import statistics
+import time
+
+from hexaloy_features import RetrievalMemory
+from bench.corpus import make_sessions
+
+# (fact stated in an old chat, later prompt that should bring it back)
+NEEDLES = [
+    ("My dog Biscuit is a three year old beagle who hates thunderstorms.",
+     "Any tips to calm Biscuit the beagle during thunderstorms?"),
+    ("Our startup sells refurbished laptops to schools in Rajasthan.",
+     "Write a pitch for our refurbished laptops business for schools"),
+    ("I am allergic to peanuts and cashews, so avoid them in recipes.",
+     "Suggest a snack recipe, remember my peanuts allergy"),
+    ("The production database is PostgreSQL 15 running on a single replica.",
+     "How should I back up our PostgreSQL production database?"),
+    ("My thesis is about monsoon rainfall prediction with satellite data.",
+     "Outline a literature review for my monsoon rainfall thesis"),
+    ("We deploy the Streamlit frontend on Kubernetes behind an nginx ingress.",
+     "Why does nginx ingress drop Streamlit websocket connections on Kubernetes?"),
+    ("I'm training for a half marathon in Jaipur this December.",
+     "Make a weekly plan for my half marathon training"),
+    ("Our team uses Rust for the ingestion service and Go for the API gateway.",
+     "Should the ingestion service stay in Rust?"),
+]
+
+
+def _chunks_row(target_chunks: int, queries: int = 500) -> dict:
+    sessions = make_sessions(target_chunks, per_session=200)        # about 1.5 chunks per message
+    memory = RetrievalMemory(lambda session, i: sessions[session][i])
+    t0 = time.perf_counter()
+    added = 0
+    for name, history in sessions.items():
+        for i, msg in enumerate(history):
+            memory.add_message(name, i, msg)
+            added += 1
+            if len(memory) >= target_chunks:
+                break
+        if len(memory) >= target_chunks:
+            break
+    index_s = time.perf_counter() - t0
+    prompts = [history[i]["content"][:120] for history in sessions.values() for i in range(0, 200, 2)][:queries]
+    for j, (fact, _) in enumerate(NEEDLES):
+        sessions[f"Old chat {j}"] = [{"role": "user", "content": fact}]
+        memory.add_message(f"Old chat {j}", 0, sessions[f"Old chat {j}"][0])
+
+    search, recall = [], []
+    for prompt in prompts:
+        t0 = time.perf_counter()
+        memory.search(prompt, exclude="Session 1")
+        search.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        memory.recall(prompt, exclude="Session 1")
+        recall.append(time.perf_counter() - t0)
+    search.sort()
+    found = sum(
+        any(hit["session"] == f"Old chat {j}" for hit in memory.search(question, exclude="New chat"))
+        for j, (_, question) in enumerate(NEEDLES)
+    )
+    return {
+        "bench": "retrieval",
+        "entries": len(memory),
+        "messages": added,
+        "index_ms_per_message": round(1000 * index_s / added, 4),
+        "search_ms": round(1000 * statistics.median(search), 3),
+        "search_p95_ms": round(1000 * search[int(0.95 * len(search))], 3),
+        "recall_ms": round(1000 * statistics.median(recall), 3),
+        "needles_found": f"{found}/{len(NEEDLES)}",
+        "matrix_mb": round((memory._vectors.nbytes + memory._refs.nbytes) / 2 ** 20, 1),
+    }
+
+
+def run(sizes=(10_000, 100_000), queries: int = 500) -> list:
+    return [_chunks_row(n, queries) for n in sizes]
+
+
+if __name__ == "__main__":
+    for row in run():
+        print(json.dumps(row))
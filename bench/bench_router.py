@@ -0,0 +1,112 @@
+"""
+Intent routing: accuracy on the labeled corpus and prompts/second, for the
+compiled IntentRouter against the old per-prompt keyword scan plus the old
+check_sensitive_content(), and against checking the router's own cue set
+one regex at a time (what extending the old approach would cost).
+
+    python -m bench.bench_router
+"""
+
+import json
+import re
+import time
+
+from hexaloy_features import (
+    IMAGE_GENERATION_CUES, PERSONA_CUES, SENSITIVE_PATTERNS, TEMPLATE_CUES, TEMPLATE_PERSONAS, VISION_CUES,
+    IntentRouter,
+)
+from bench.intent_corpus import CASES
+
+_LEGACY_PATTERNS = [
+    r'\b(password|secret|api.?key|token|credential)\b',
+    r'\b\d{16}\b',
+    r'\b\d{3}-\d{2}-\d{4}\b',
+]
+
+
+def legacy_route(prompt: str, has_image: bool = False) -> dict:
+    intent = "image" if any(word in prompt.lower() for word in ["draw", "pic", "image", "photo bana"]) else (
+        "vision" if has_image else "chat")
+    warnings = []
+    for pattern in _LEGACY_PATTERNS:
+        if re.search(pattern, prompt, re.IGNORECASE):
+            if 'password' in pattern or 'key' in pattern:
+                warnings.append("⚠️ Possible credentials detected — avoid sharing passwords or API keys")
+            elif r'\d{16}' in pattern:
+                warnings.append("⚠️ Possible credit card number detected — do not share financial data")
+            elif 'SSN' in pattern or r'\d{3}-\d{2}' in pattern:
+                warnings.append("⚠️ Possible personal ID number detected — protect your identity")
+    return {"intent": intent, "warnings": warnings}
+
+
+def linear_router():
+    """The same cues, each compiled on its own and searched in turn."""
+    def compile_cue(pattern):
+        return re.compile(rf"(?<!\w)(?:{pattern})(?!\w)", re.IGNORECASE)
+    sensitive = [(re.compile(p, re.IGNORECASE), w) for p, w in SENSITIVE_PATTERNS]
+    vision = [compile_cue(p) for p in VISION_CUES]
+    image = [compile_cue(p) for p in IMAGE_GENERATION_CUES]
+    templates = [(name, [compile_cue(p) for p in ps]) for name, ps in TEMPLATE_CUES.items()]
+    personas = [(name, [compile_cue(p) for p in ps]) for name, ps in PERSONA_CUES.items()]
+
+    def route(prompt: str, has_image: bool = False) -> dict:
+        wants_image = any(rx.search(prompt) for rx in image)
+        wants_vision = any(rx.search(prompt) for rx in vision)
+        if has_image:
+            intent = "image" if wants_image and not wants_vision else "vision"
+        else:
+            intent = "image" if wants_image else "chat"
+        hits = [(min(m.start() for m in found), name) for name, rxs in templates
+                if (found := [m for rx in rxs if (m := rx.search(prompt))])]
+        template = min(hits)[1] if hits else None
+        counts = {name: sum(len(rx.findall(prompt)) for rx in rxs) for name, rxs in personas}
+        best = max(counts.values())
+        persona = next(n for n, c in counts.items() if c == best) if best else TEMPLATE_PERSONAS.get(template)
+        warnings = [w for rx, w in sensitive if rx.search(prompt)]
+        return {"intent": intent, "template": template, "persona": persona, "warnings": warnings}
+    return route
+
+
+def _score(route, cases) -> dict:
+    counts = {"intent": [0, 0], "template": [0, 0], "persona": [0, 0], "warnings": [0, 0]}
+    misses = []
+    for case in cases:
+        got = route(case["prompt"], case.get("has_image", False))
+        for field in counts:
+            if field in case and field in got:
+                counts[field][1] += 1
+                if got[field] == case[field]:
+                    counts[field][0] += 1
+                else:
+                    misses.append({"prompt": case["prompt"], field: got[field], "expected": case[field]})
+    return {f"{field}_accuracy": f"{ok}/{n}" for field, (ok, n) in counts.items() if n}, misses
+
+
+def _throughput(route, prompts, seconds: float = 1.0) -> float:
+    n, t0 = 0, time.perf_counter()
+    while time.perf_counter() - t0 < seconds:
+        for prompt in prompts:
+            route(prompt)
+        n += len(prompts)
+    return n / (time.perf_counter() - t0)
+
+
+def run() -> list:
+    router = IntentRouter()
+    prompts = [c["prompt"] for c in CASES]
+    long_prompts = [" ".join([p] * 40) for p in prompts[:10]]     # ~pasted-paragraph sized
+    rows = []
+    for name, route in (("legacy", legacy_route), ("linear_same_cues", linear_router()), ("router", router.route)):
+        scores, misses = _score(route, CASES)
+        rows.append({
+            "bench": "router", "impl": name, "cases": len(CASES), **scores,
+            "prompts_per_s": round(_throughput(route, prompts)),
+            "long_prompts_per_s": round(_throughput(route, long_prompts)),
+            "misses": misses,
+        })
+    return rows
+
+
+if __name__ == "__main__":
+    for row in run():
+        print(json.dumps(row, ensure_ascii=False))
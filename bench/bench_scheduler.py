@@ -0,0 +1,95 @@
+"""
+Load test of RequestScheduler against the local Groq stub: a burst of
+requests from several users, one of them sending half the load, with the
+stub enforcing rpm/tpm quotas (and, in one run, failing 10% with 503).
+Compared with calling the API directly (the SDK's own retries on and
+off): errors, sustained throughput against the quota, and how long light
+users wait behind the heavy one.
+
+    python -m bench.bench_scheduler
+"""
+
+import asyncio
+import json
+import statistics
+import time
+
+import groq
+
+from hexaloy_features import RequestScheduler, ScheduledRequest, count_tokens, groq_text_stream
+from bench.groq_stub import serve
+
+MODEL = "llama-3.3-70b-versatile"
+
+
+def _workload(users: int, requests: int):
+    """(owner, prompt) pairs: user-0 sends half of all requests, the rest share the other half."""
+    heavy = requests // 2
+    light = [(f"user-{1 + i % (users - 1)}", f"light question {i} about photosynthesis") for i in range(requests - heavy)]
+    return [("user-0", f"heavy question {i} about quantum physics") for i in range(heavy)] + light
+
+
+async def _one(client, scheduler, owner, prompt, t0, results):
+    messages = [{"role": "user", "content": prompt}]
+    try:
+        if scheduler is None:
+            stream = groq_text_stream(client, messages=messages, model=MODEL)
+        else:
+            request = ScheduledRequest(owner, MODEL, count_tokens(prompt) + 8, reply_tokens=100)
+            stream = scheduler.run(request, lambda: groq_text_stream(client, messages=messages, model=MODEL))
+        async for _ in stream:
+            pass
+        results.append((owner, time.perf_counter() - t0, None))
+    except Exception as e:
+        results.append((owner, time.perf_counter() - t0, type(e).__name__))
+
+
+async def _load(mode: str, rpm: float, tpm: float, burst: float, users: int, requests: int,
+                fail_rate: float) -> dict:
+    server = serve(rpm=rpm, tpm=tpm, burst=burst, fail_rate=fail_rate)
+    client = groq.AsyncGroq(api_key="bench", base_url=server.base_url,
+                            max_retries=2 if mode == "direct_sdk_retries" else 0)
+    scheduler = RequestScheduler({MODEL: {"rpm": rpm, "tpm": tpm, "burst": burst}}, scale=1) \
+        if mode == "scheduler" else None
+    results = []
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_one(client, scheduler, owner, prompt, t0, results)
+                           for owner, prompt in _workload(users, requests)))
+    elapsed = time.perf_counter() - t0
+    server.shutdown()
+    if scheduler is not None:
+        await scheduler.close()
+    await client.close()
+
+    ok = sorted(t for _, t, err in results if err is None)
+    burst_requests = int(rpm / 60 * burst)
+    sustained = ok[burst_requests:]       # after the saved-up burst is spent
+    light = [t for owner, t, err in results if err is None and owner != "user-0"]
+    heavy = [t for owner, t, err in results if err is None and owner == "user-0"]
+    return {
+        "bench": "scheduler",
+        "mode": mode,
+        "requests": requests,
+        "quota_rpm": rpm,
+        "injected_503_rate": fail_rate,
+        "completed": len(ok),
+        "errors": len(results) - len(ok),
+        "error_types": sorted({err for _, _, err in results if err}),
+        "upstream_429": server.rate_limited,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rpm": round(len(ok) / elapsed * 60, 1),
+        "sustained_rpm": round((len(sustained) - 1) / (sustained[-1] - sustained[0]) * 60, 1)
+        if len(sustained) > 1 and sustained[-1] - sustained[0] > 1 else None,
+        "light_users_median_s": round(statistics.median(light), 2) if light else None,
+        "heavy_user_median_s": round(statistics.median(heavy), 2) if heavy else None,
+    }
+
+
+def run(rpm: float = 600, tpm: float = 60000, burst: float = 2.0, users: int = 6, requests: int = 200) -> list:
+    modes = [("direct", 0.0), ("direct_sdk_retries", 0.0), ("scheduler", 0.0), ("scheduler", 0.1)]
+    return [asyncio.run(_load(mode, rpm, tpm, burst, users, requests, fail_rate)) for mode, fail_rate in modes]
+
+
+if __name__ == "__main__":
+    for row in run():
+        print(json.dumps(row))
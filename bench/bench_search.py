@@ -0,0 +1,47 @@
+"""
+Search latency vs. corpus size: linear scan vs. ConversationIndex.
+
+    python -m bench.bench_search
+"""
+
+import json
+import time
+
+from hexaloy_features import ConversationIndex, search_conversations
+from bench.corpus import VOCAB, make_sessions
+
+# Frequent words, a mid-frequency and a rare word, a prefix, a phrase and a miss.
+QUERIES = ["quantum", VOCAB[500], VOCAB[3000], "blockchain pi", "str", '"pizza delivery"', "zzz nothing"]
+
+
+def _time(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def run(sizes=(1_000, 10_000, 50_000)) -> list:
+    rows = []
+    for n in sizes:
+        sessions = make_sessions(n)
+        t0 = time.perf_counter()
+        index = ConversationIndex.from_sessions(sessions)
+        build_ms = (time.perf_counter() - t0) * 1000
+        for q in QUERIES:
+            rows.append({
+                "bench": "search",
+                "messages": n,
+                "query": q,
+                "scan_ms": round(_time(lambda: search_conversations(sessions, q)), 3),
+                "index_ms": round(_time(lambda: search_conversations(sessions, q, index=index)), 3),
+                "index_build_ms": round(build_ms, 1),
+            })
+    return rows
+
+
+if __name__ == "__main__":
+    for row in run():
+        print(json.dumps(row))
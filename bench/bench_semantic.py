@@ -0,0 +1,126 @@
+"""
+Semantic cache: match quality on the labeled paraphrase corpus at several
+thresholds, then hit rate and lookup latency with 10k and 100k cached
+entries under a mix of paraphrased repeats and new questions.
+
+    python -m bench.bench_semantic
+"""
+
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from hexaloy_features import SEMANTIC_EMBEDDING_VERSION, SEMANTIC_THRESHOLD, SemanticCache, embed_prompt
+from bench.paraphrase_corpus import NEAR_MISSES, PARAPHRASES
+
+FILLERS = ("can you explain", "please tell me about", "explain simply", "what is", "in simple terms")
+
+
+def corpus_rows(thresholds=(0.85, SEMANTIC_THRESHOLD, 0.95)) -> list:
+    rows = []
+    for threshold in thresholds:
+        cache = SemanticCache(max_entries=len(PARAPHRASES) + len(NEAR_MISSES), path=None, threshold=threshold)
+        pairs = [(a, b, True) for a, b in PARAPHRASES] + [(a, b, False) for a, b in NEAR_MISSES]
+        hits = false_hits = 0
+        for scope, (cached, asked, same) in enumerate(pairs):     # one scope per pair: judge each pair alone
+            cache.put(cached, scope, cached)
+            found = cache.lookup(asked, scope)
+            hits += bool(found) and same
+            false_hits += bool(found) and not same
+        rows.append({
+            "bench": "semantic", "case": "corpus", "threshold": threshold,
+            "recall": round(hits / len(PARAPHRASES), 3),
+            "false_hits": false_hits, "near_misses": len(NEAR_MISSES),
+            "precision": round(hits / (hits + false_hits), 3) if hits + false_hits else 1.0,
+        })
+    return rows
+
+
+def _question(rng: random.Random, vocab: list) -> list:
+    return rng.sample(vocab, rng.randint(3, 6))
+
+
+def _paraphrase(rng: random.Random, words: list) -> str:
+    return f"{rng.choice(FILLERS)} {' '.join(words)}?"
+
+
+def _snapshot(path: str, questions: list, scopes: int):
+    """Write `questions` in SemanticCache.save()'s format; put() one by one would take minutes at 100k."""
+    prompts = [" ".join(words) for words in questions]
+    np.savez(path, vectors=np.stack([embed_prompt(p) for p in prompts]),
+             scopes=np.arange(len(prompts), dtype=np.int64) % scopes,
+             used=np.arange(1, len(prompts) + 1, dtype=np.int64), version=np.array(SEMANTIC_EMBEDDING_VERSION),
+             texts=np.array(json.dumps({"prompts": prompts, "answers": [f"answer {i}" for i in range(len(prompts))]})))
+
+
+def scale_row(entries: int, queries: int = 2_000, repeat_rate: float = 0.5, scopes: int = 8, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    vocab = [f"w{i}x" for i in range(20_000)]
+    questions = [_question(rng, vocab) for _ in range(entries)]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "semantic.npz")
+        _snapshot(path, questions, scopes)
+        t0 = time.perf_counter()
+        cache = SemanticCache(max_entries=entries, path=path, save_every=10 ** 9)
+        load_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        cache.save()
+        save_s = time.perf_counter() - t0
+
+    lookups, repeats, hits, false_hits = [], 0, 0, 0
+    for _ in range(queries):
+        if rng.random() < repeat_rate:
+            i = rng.randrange(entries)
+            words, scope, repeat = questions[i], i % scopes, True
+        else:
+            words, scope, repeat = _question(rng, vocab), rng.randrange(scopes), False
+        t0 = time.perf_counter()
+        found = cache.lookup(_paraphrase(rng, words), scope)
+        lookups.append(time.perf_counter() - t0)
+        repeats += repeat
+        hits += bool(found) and repeat
+        false_hits += bool(found) and not repeat
+
+    puts = []
+    for i in range(200):                        # a full cache: every put evicts the least recently used
+        t0 = time.perf_counter()
+        cache.put(" ".join(_question(rng, vocab)), i % scopes, "new answer")
+        puts.append(time.perf_counter() - t0)
+    lookups.sort()
+    return {
+        "bench": "semantic", "case": "scale", "entries": entries, "queries": queries,
+        "repeat_rate": repeat_rate,
+        "hit_rate": round(hits / queries, 3),
+        "repeats_found": round(hits / repeats, 3) if repeats else None,
+        "false_hits": false_hits,
+        "lookup_ms": round(1000 * statistics.median(lookups), 3),
+        "lookup_p95_ms": round(1000 * lookups[int(0.95 * len(lookups))], 3),
+        "put_ms": round(1000 * statistics.median(puts), 3),
+        "embed_ms": round(1000 * _embed_seconds(rng, vocab), 4),
+        "load_s": round(load_s, 3),
+        "save_s": round(save_s, 3),
+        "evictions": cache.evictions,
+        "matrix_mb": round(cache._vectors.nbytes / 2 ** 20, 1),
+    }
+
+
+def _embed_seconds(rng: random.Random, vocab: list, n: int = 1_000) -> float:
+    prompts = [_paraphrase(rng, _question(rng, vocab)) for _ in range(n)]
+    t0 = time.perf_counter()
+    for prompt in prompts:
+        embed_prompt(prompt)
+    return (time.perf_counter() - t0) / n
+
+
+def run(sizes=(10_000, 100_000), queries: int = 2_000) -> list:
+    return corpus_rows() + [scale_row(n, queries) for n in sizes]
+
+
+if __name__ == "__main__":
+    for row in run():
+        print(json.dumps(row))
@@ -0,0 +1,81 @@
+"""
+Single-flight under a burst of identical requests (a one-click template
+sent by many users within half a second), against the local Groq stub
+behind the rate-limit scheduler: upstream calls, fan-out, errors, and
+time to first token / to the full answer per user, with and without
+coalescing.
+
+    python -m bench.bench_singleflight
+"""
+
+import asyncio
+import json
+import random
+import statistics
+import time
+
+import groq
+
+from hexaloy_features import (
+    RequestScheduler, ScheduledRequest, SingleFlight, count_tokens, groq_text_stream, response_cache_key,
+)
+from bench.groq_stub import serve
+
+MODEL = "llama-3.3-70b-versatile"
+PROMPT = "Write a professional email requesting a meeting with a potential client."
+
+
+async def _user(i, client, scheduler, flights, spread, results):
+    await asyncio.sleep(random.Random(i).uniform(0, spread))
+    messages = [{"role": "user", "content": PROMPT}]
+    request = ScheduledRequest(f"user-{i}", MODEL, count_tokens(PROMPT) + 8, reply_tokens=100)
+
+    def upstream():
+        return scheduler.run(request, lambda: groq_text_stream(client, messages=messages, model=MODEL))
+
+    t0 = time.perf_counter()
+    first = None
+    try:
+        stream = flights.subscribe(response_cache_key(MODEL, messages, 1.0), upstream) if flights else upstream()
+        async for _ in stream:
+            if first is None:
+                first = time.perf_counter() - t0
+        results.append((first, time.perf_counter() - t0, None))
+    except Exception as e:
+        results.append((first, time.perf_counter() - t0, type(e).__name__))
+
+
+async def _burst(coalesce: bool, users: int, spread: float, rpm: float) -> dict:
+    server = serve(rpm=rpm, tpm=rpm * 400, burst=5, reply_tokens=150, ttft=0.3, delay=0.01)
+    client = groq.AsyncGroq(api_key="bench", base_url=server.base_url, max_retries=0)
+    scheduler = RequestScheduler({MODEL: {"rpm": rpm, "tpm": rpm * 400, "burst": 5}}, scale=1)
+    flights = SingleFlight() if coalesce else None
+    results = []
+    await asyncio.gather(*(_user(i, client, scheduler, flights, spread, results) for i in range(users)))
+    server.shutdown()
+    await scheduler.close()
+    await client.close()
+    ok = [r for r in results if r[2] is None]
+    return {
+        "bench": "singleflight",
+        "mode": "coalesced" if coalesce else "independent",
+        "users": users,
+        "quota_rpm": rpm,
+        "upstream_requests": server.requests,
+        "fan_out": flights.stats()["fan_out"] if flights else 1.0,
+        "replayed_chunks": flights.replayed_chunks if flights else 0,
+        "errors": len(results) - len(ok),
+        "ttft_median_s": round(statistics.median(r[0] for r in ok), 3) if ok else None,
+        "ttft_max_s": round(max(r[0] for r in ok), 3) if ok else None,
+        "answer_median_s": round(statistics.median(r[1] for r in ok), 3) if ok else None,
+        "answer_max_s": round(max(r[1] for r in ok), 3) if ok else None,
+    }
+
+
+def run(users: int = 40, spread: float = 0.5, rpm: float = 120) -> list:
+    return [asyncio.run(_burst(coalesce, users, spread, rpm)) for coalesce in (False, True)]
+
+
+if __name__ == "__main__":
+    for row in run():
+        print(json.dumps(row))
@@ -0,0 +1,66 @@
+"""
+SessionStore: sidebar listing, cold reopen of a 500-message session and
+single-transaction appends, against a throwaway database.
+
+    python -m bench.bench_store
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from hexaloy_features import SessionStore, StoredSessions
+from bench.corpus import make_sessions
+
+
+def run(n_sessions: int = 200, per_session: int = 500) -> list:
+    corpus = make_sessions(n_sessions * per_session, per_session=per_session)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SessionStore(os.path.join(tmp, "bench.db"))
+        t0 = time.perf_counter()
+        for title, history in corpus.items():
+            store.append_messages(store.create_session("bench", title), history)
+        load_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        sessions = StoredSessions(store, "bench")
+        list_ms = (time.perf_counter() - t0) * 1000
+        first = sessions.find("Session 1")
+
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        history = list(sessions[first])
+        reopen_ms = (time.perf_counter() - t0) * 1000
+        _, reopen_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        t0 = time.perf_counter()
+        sessions[first].append({"role": "assistant", "content": "x" * 4000, "model": "llama-3.3-70b-versatile"})
+        append_ms = (time.perf_counter() - t0) * 1000
+        store.close()
+
+    in_memory = sys.getsizeof(corpus) + sum(
+        sys.getsizeof(h) + sum(sys.getsizeof(m) + sum(map(sys.getsizeof, m.values())) for m in h)
+        for h in corpus.values()
+    )
+
+    return [{
+        "bench": "store",
+        "sessions": n_sessions,
+        "messages_per_session": per_session,
+        "bulk_load_s": round(load_s, 2),
+        "list_titles_ms": round(list_ms, 3),
+        "cold_reopen_ms": round(reopen_ms, 3),
+        "reopened_messages": len(history),
+        "reopen_peak_kb": reopen_peak // 1024,
+        "all_in_memory_kb": in_memory // 1024,
+        "append_ms": round(append_ms, 3),
+    }]
+
+
+if __name__ == "__main__":
+    for row in run():
+        print(json.dumps(row))
@@ -0,0 +1,96 @@
+"""
+Vision uploads: bytes sent and request time per turn for a phone photo and
+a PNG screenshot, the old way (whole file base64'd as image/jpeg on every
+turn) against VisionUploads (downscaled once, cached by SHA-256). Requests
+go to the local stub at a simulated 10 Mbit/s uplink.
+
+    python -m bench.bench_vision
+"""
+
+import base64
+import io
+import json
+import time
+
+import httpx
+from PIL import Image, ImageDraw, ImageFilter
+
+from hexaloy_features import VisionUploads
+from bench.image_stub import serve
+
+
+def phone_photo(size=(4032, 3024)) -> bytes:
+    """A photo-like JPEG: smooth gradients plus sensor-style noise."""
+    img = Image.merge("RGB", [
+        Image.linear_gradient("L").resize(size),
+        Image.linear_gradient("L").rotate(90).resize(size),
+        Image.effect_noise(size, 40).filter(ImageFilter.GaussianBlur(1)),
+    ])
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=92)
+    return out.getvalue()
+
+
+def screenshot(size=(2560, 1600)) -> bytes:
+    """A UI-like PNG with text-ish rows."""
+    img = Image.new("RGB", size, (248, 249, 250))
+    draw = ImageDraw.Draw(img)
+    for y in range(40, size[1], 28):
+        draw.text((40, y), "def build_context_window(history, system_prompt, model, budget) -> tuple:  # " * 3,
+                  fill=(30, 41, 59))
+    out = io.BytesIO()
+    img.save(out, format="PNG")
+    return out.getvalue()
+
+
+def _legacy_data_url(data: bytes) -> str:
+    return f"data:image/jpeg;base64,{base64.b64encode(data).decode('utf-8')}"
+
+
+def _request(client: httpx.Client, url: str, data_url: str) -> float:
+    body = {"model": "llama-3.2-11b-vision-preview", "messages": [{"role": "user", "content": [
+        {"type": "text", "text": "What is in this image?"},
+        {"type": "image_url", "image_url": {"url": data_url}},
+    ]}]}
+    t0 = time.perf_counter()
+    client.post(url, json=body).raise_for_status()
+    return time.perf_counter() - t0
+
+
+def run(turns: int = 3, uplink_bps: float = 10e6) -> list:
+    server = serve(upload_bps=uplink_bps)
+    client = httpx.Client(timeout=120)
+    rows = []
+    for name, data in (("phone_photo", phone_photo()), ("screenshot", screenshot())):
+        uploads = VisionUploads()
+        legacy_prep, legacy_req, new_prep, new_req = [], [], [], []
+        for _ in range(turns):
+            t0 = time.perf_counter()
+            legacy = _legacy_data_url(data)
+            legacy_prep.append(time.perf_counter() - t0)
+            legacy_req.append(_request(client, server.base_url, legacy))
+
+            t0 = time.perf_counter()
+            entry = uploads.prepare(data)
+            new_prep.append(time.perf_counter() - t0)
+            new_req.append(_request(client, server.base_url, entry["data_url"]))
+        rows.append({
+            "bench": "vision", "image": name, "turns": turns, "uplink_mbps": uplink_bps / 1e6,
+            "original_kb": len(data) // 1024,
+            "legacy_payload_kb": len(legacy) // 1024,
+            "new_payload_kb": len(entry["data_url"]) // 1024,
+            "new_mime": entry["mime"], "new_size": [entry["width"], entry["height"]],
+            "legacy_prep_ms_per_turn": round(sum(legacy_prep) / turns * 1000, 2),
+            "new_prep_ms_first_turn": round(new_prep[0] * 1000, 2),
+            "new_prep_ms_repeat_turn": round(sum(new_prep[1:]) / max(turns - 1, 1) * 1000, 2),
+            "legacy_request_s": round(sum(legacy_req) / turns, 3),
+            "new_request_s": round(sum(new_req) / turns, 3),
+        })
+    client.close()
+    server.shutdown()
+    return rows
+
+
+if __name__ == "__main__":
+    for row in run():
+        print(json.dumps(row))
@@ -0,0 +1,52 @@
+"""
+Hand-labeled prompts for the model cascade: the tier each should get.
+"light" = a small model answers it as well as the large one would.
+A case may name the persona picked in the sidebar.
+"""
+
+from hexaloy_features import RESPONSE_ACTIONS
+
+_ACTIONS = dict(RESPONSE_ACTIONS)
+
+CASES = [
+    # chit-chat and short factual questions
+    {"prompt": "hi", "tier": "light"},
+    {"prompt": "thanks, that helped!", "tier": "light"},
+    {"prompt": "What is the capital of Australia?", "tier": "light"},
+    {"prompt": "Who wrote Godan?", "tier": "light"},
+    {"prompt": "what's a good name for a golden retriever puppy", "tier": "light"},
+    {"prompt": "Give me a synonym for happy", "tier": "light"},
+    {"prompt": "How many days are there in a leap year?", "tier": "light"},
+    {"prompt": "Tell me a fun fact about octopuses", "tier": "light"},
+    {"prompt": "Translate 'good morning' to French", "tier": "light"},
+    {"prompt": "Write a two line birthday wish for my sister", "tier": "light"},
+    {"prompt": "What does RSVP stand for?", "tier": "light"},
+    {"prompt": "suggest a movie for tonight", "tier": "light"},
+    # quick actions that reshape the last answer
+    {"prompt": _ACTIONS["⚡ Shorter"], "tier": "light"},
+    {"prompt": _ACTIONS["🌐 Translate"], "tier": "light"},
+    {"prompt": _ACTIONS["📋 Summarize"], "tier": "light"},
+    {"prompt": _ACTIONS["🎯 Key Points"], "tier": "light"},
+    {"prompt": _ACTIONS["💡 Simplify"], "tier": "light"},
+    # quick actions that need new content
+    {"prompt": _ACTIONS["💻 Show Code"], "tier": "full"},
+    {"prompt": _ACTIONS["🔍 Expand"], "tier": "full"},
+    {"prompt": _ACTIONS["🔄 Alternative"], "tier": "full"},
+    # code, maths, analysis
+    {"prompt": "Why does this raise a KeyError?\n```python\nd = {}\nprint(d['x'])\n```", "tier": "full"},
+    {"prompt": "Write a Python function that merges overlapping intervals", "tier": "full"},
+    {"prompt": "Explain the difference between a process and a thread, with examples in C", "tier": "full"},
+    {"prompt": "Solve 3x^2 - 12x + 9 = 0 and show each step", "tier": "full"},
+    {"prompt": "Prove that the square root of 2 is irrational", "tier": "full"},
+    {"prompt": "What is the probability of getting two sixes when rolling two dice?", "tier": "full"},
+    {"prompt": "Compare PostgreSQL and MongoDB for an analytics workload and explain the trade-offs",
+     "tier": "full"},
+    {"prompt": "Design a rate limiter for a multi-tenant API and explain the architecture", "tier": "full"},
+    {"prompt": "Write a SQL query for the top 5 customers by revenue last quarter", "tier": "full"},
+    {"prompt": "Analyze the pros and cons of remote work for a 20 person startup in detail", "tier": "full"},
+    {"prompt": "What is a closure?", "persona": "👨‍💻 Senior Dev", "tier": "full"},
+    {"prompt": "Review my go-to-market strategy for a D2C tea brand in Tier 2 Indian cities; we have a "
+               "small budget, two founders, and an existing Instagram audience of 8,000 followers. What "
+               "channels should we prioritise in the first six months, how should we price against "
+               "established brands, and what metrics should we track each week?", "tier": "full"},
+]
@@ -0,0 +1,49 @@
+"""Synthetic chat corpora for the HEXALOY benchmarks."""
+
+import itertools
+import random
+from typing import Dict, List
+
+WORDS = (
+    "python streamlit groq model latency token stream session history export analytics "
+    "search index quantum blockchain pizza delivery startup marketing india language code "
+    "review debug error function class memory cache database query vector embedding prompt "
+    "persona image vision upload theme gravity physics biology history business strategy"
+).split()
+
+
+def _vocabulary(size: int = 5000) -> List[str]:
+    """Real words first, then pronounceable filler so frequencies follow a Zipf curve."""
+    rng = random.Random(size)
+    syllables = ["ka", "lo", "mi", "ra", "ten", "vo", "su", "pre", "dex", "ni", "or", "bal"]
+    filler = {"".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))) for _ in range(size * 2)}
+    return list(dict.fromkeys(WORDS)) + sorted(filler - set(WORDS))[: size - len(WORDS)]
+
+
+VOCAB = _vocabulary()
+ZIPF_CUM_WEIGHTS = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(VOCAB))))
+# Sampling word by word is slow at 100k messages; draw once and slice windows instead.
+WORD_POOL = random.Random(0).choices(VOCAB, cum_weights=ZIPF_CUM_WEIGHTS, k=1 << 18)
+
+
+def make_message(rng: random.Random, role: str, n_words: int) -> dict:
+    start = rng.randrange(len(WORD_POOL) - n_words)
+    return {
+        "role": role,
+        "content": " ".join(WORD_POOL[start:start + n_words]),
+        "ts": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} "
+              f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}",
+        "model": "" if role == "user" else "llama-3.3-70b-versatile",
+    }
+
+
+def make_sessions(n_messages: int, per_session: int = 40, seed: int = 7) -> Dict[str, List[dict]]:
+    """Build `n_messages` alternating user/assistant messages split into sessions."""
+    rng = random.Random(seed)
+    sessions: Dict[str, List[dict]] = {}
+    for i in range(n_messages):
+        name = f"Session {i // per_session + 1}"
+        role = "user" if i % 2 == 0 else "assistant"
+        n_words = rng.randint(5, 25) if role == "user" else rng.randint(40, 160)
+        sessions.setdefault(name, []).append(make_message(rng, role, n_words))
+    return sessions
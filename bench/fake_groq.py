@@ -0,0 +1,188 @@
+"""
+Stand-ins for groq.Groq / groq.AsyncGroq that stream canned tokens, for
+running app.py without an API key or network.
+
+A stream is a schedule of (seconds after the request, text) pairs. It comes
+either from `tokens` with a fixed TTFT and inter-token delay, or from a
+recording of a real response (see record() and load_recording()), replayed
+with its original timing scaled by `time_scale`.
+
+    python -m bench.fake_groq record out.json "Explain photosynthesis"   # needs GROQ_API_KEY
+"""
+
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+import types
+from typing import Callable, List, Optional, Tuple
+
+import groq
+
+DEFAULT_TOKENS = ["Sure", "!", " Here", " is", " a", " short", " answer", " from", " the", " fake", " backend", "."]
+DEFAULT_MODEL = "llama-3.3-70b-versatile"
+
+Schedule = List[Tuple[float, str]]
+
+
+def make_schedule(tokens: List[str], ttft: float = 0.0, delay: float = 0.0) -> Schedule:
+    return [(ttft + i * delay, tok) for i, tok in enumerate(tokens)]
+
+
+def synthetic_schedule(n_tokens: int, ttft: float = 0.3, tokens_per_sec: float = 250.0) -> Schedule:
+    """A long answer at a steady rate, for load tests that don't need real text."""
+    words = (" the model streams one more token of a long answer").split(" ")
+    return [(ttft + i / tokens_per_sec, " " + words[i % len(words)] if i else "Answer") for i in range(n_tokens)]
+
+
+def load_recording(path: str) -> Schedule:
+    """Read a recording written by record(): {"model", "prompt", "chunks": [[seconds, text], ...]}."""
+    with open(path, encoding="utf-8") as f:
+        return [(float(at), text) for at, text in json.load(f)["chunks"]]
+
+
+def record(path: str, prompt: str, model: str = DEFAULT_MODEL, api_key: Optional[str] = None) -> int:
+    """Stream one real completion and save each delta with its arrival time. Returns the chunk count."""
+    client = groq.Groq(api_key=api_key or os.environ["GROQ_API_KEY"])
+    t0 = time.perf_counter()
+    chunks = []
+    for chunk in client.chat.completions.create(
+            messages=[{"role": "user", "content": prompt}], model=model, stream=True):
+        text = chunk.choices[0].delta.content if chunk.choices else None
+        if text:
+            chunks.append([round(time.perf_counter() - t0, 4), text])
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"model": model, "prompt": prompt, "chunks": chunks}, f, ensure_ascii=False, indent=1)
+    return len(chunks)
+
+
+class _Chunk:
+    def __init__(self, text: Optional[str]):
+        self.choices = [types.SimpleNamespace(delta=types.SimpleNamespace(content=text))]
+
+
+class _Completions:
+    def __init__(self, owner: "FakeGroq"):
+        self._owner = owner
+
+    def create(self, *, messages, model, stream=False, **kwargs):
+        self._owner.requests.append({"messages": messages, "model": model, **kwargs})
+        return self._owner.stream_tokens()
+
+
+class FakeGroq:
+    """Replays `schedule`, with every offset multiplied by `time_scale`."""
+
+    schedule: Schedule = make_schedule(DEFAULT_TOKENS)
+    time_scale: float = 1.0
+
+    def __init__(self, *args, **kwargs):
+        self.requests: List[dict] = []
+        self.chat = types.SimpleNamespace(completions=_Completions(self))
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def stream_tokens(self):
+        t0 = time.perf_counter()
+        for at, tok in self.schedule:
+            wait = t0 + at * self.time_scale - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            yield _Chunk(tok)
+        yield _Chunk(None)
+
+
+class _AsyncStream:
+    def __init__(self, owner: "FakeAsyncGroq"):
+        self._owner = owner
+        self.closed = False
+
+    async def __aiter__(self):
+        loop = asyncio.get_running_loop()
+        t0 = loop.time()
+        for at, tok in self._owner.schedule:
+            wait = t0 + at * self._owner.time_scale - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            yield _Chunk(tok)
+        yield _Chunk(None)
+
+    async def close(self):
+        self.closed = True
+
+
+class _AsyncCompletions:
+    def __init__(self, owner: "FakeAsyncGroq"):
+        self._owner = owner
+
+    async def create(self, *, messages, model, stream=False, **kwargs):
+        self._owner.requests.append({"messages": messages, "model": model, **kwargs})
+        stream = _AsyncStream(self._owner)
+        self._owner.streams.append(stream)
+        return stream
+
+
+class FakeAsyncGroq(FakeGroq):
+    """Async variant; `streams` records every stream handed out so tests can check it was closed."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.streams: List[_AsyncStream] = []
+        self.chat = types.SimpleNamespace(completions=_AsyncCompletions(self))
+
+    async def close(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+def install(tokens: Optional[List[str]] = None, ttft: float = 0.0, delay: float = 0.0,
+            recording: Optional[str] = None, schedule: Optional[Schedule] = None,
+            time_scale: float = 1.0) -> Callable[[], None]:
+    """
+    Make every `groq.Groq(...)` / `groq.AsyncGroq(...)` in this process a fake.
+    The stream is `schedule`, else the `recording` file, else `tokens` with
+    `ttft` and `delay`; all offsets are multiplied by `time_scale`.
+    Returns a function that puts the real clients (and the previous
+    schedule) back; installed() does both around a block.
+    """
+    if schedule is None:
+        schedule = load_recording(recording) if recording else make_schedule(tokens or DEFAULT_TOKENS, ttft, delay)
+    saved = (groq.Groq, groq.AsyncGroq, FakeGroq.schedule, FakeGroq.time_scale)
+    FakeGroq.schedule = schedule
+    FakeGroq.time_scale = time_scale
+    groq.Groq = FakeGroq
+    groq.AsyncGroq = FakeAsyncGroq
+
+    def uninstall():
+        groq.Groq, groq.AsyncGroq, FakeGroq.schedule, FakeGroq.time_scale = saved
+    return uninstall
+
+
+@contextlib.contextmanager
+def installed(**kwargs):
+    """install() for the duration of a `with` block."""
+    uninstall = install(**kwargs)
+    try:
+        yield
+    finally:
+        uninstall()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4 or sys.argv[1] != "record":
+        sys.exit("usage: python -m bench.fake_groq record OUT.json PROMPT [MODEL]")
+    print(record(sys.argv[2], sys.argv[3], *sys.argv[4:5]), "chunks")
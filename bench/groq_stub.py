@@ -0,0 +1,134 @@
+"""
+A local stand-in for Groq's OpenAI-compatible chat endpoint, for load tests
+with the real groq SDK. It streams `reply_tokens` chunks per request and
+enforces per-minute request and token quotas with a token bucket each,
+answering 429 with Retry-After when either is exhausted. Faults can be
+injected: a fraction of requests failed with 503 (`fail_rate`), and a
+fraction stalled for `stall` seconds before their first token
+(`stall_rate`), for tail-latency tests. `models` overrides ttft, delay and
+the fault settings per model name, e.g. to make a small model faster or broken.
+
+    server = serve(rpm=120, tpm=40000)
+    client = groq.AsyncGroq(api_key="stub", base_url=server.base_url, max_retries=0)
+    ...
+    server.shutdown()
+"""
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+
+class _Bucket:
+    def __init__(self, per_minute: float, burst: float):
+        self.rate = per_minute / 60.0
+        self.capacity = self.rate * burst
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_for(self, amount: float) -> float:
+        return max(0.0, (amount - self.level) / self.rate)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256        # a burst of clients shouldn't be refused at accept()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        prompt_chars = sum(len(str(m.get("content", ""))) for m in body.get("messages", []))
+        cost = prompt_chars // 4 + server.reply_tokens
+        speed = {"ttft": server.ttft, "delay": server.delay, "fail_rate": server.fail_rate,
+                 "stall_rate": server.stall_rate, "stall": server.stall,
+                 **server.models.get(body.get("model", ""), {})}
+        with server.lock:
+            server.requests += 1
+            server.requests_bucket.refill()
+            server.tokens_bucket.refill()
+            retry_after = max(server.requests_bucket.wait_for(1), server.tokens_bucket.wait_for(cost))
+            if retry_after > 0:
+                server.rate_limited += 1
+            elif random.random() < speed["fail_rate"]:
+                server.failed += 1
+                retry_after = -1
+            else:
+                server.requests_bucket.level -= 1
+                server.tokens_bucket.level -= cost
+                server.served += 1
+                server.tokens_served += cost
+        if retry_after:
+            status, error = (429, "Rate limit reached") if retry_after > 0 else (503, "Service unavailable")
+            payload = json.dumps({"error": {"message": error, "type": "stub"}}).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            if retry_after > 0:
+                self.send_header("retry-after", f"{retry_after:.2f}")
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(speed["stall"] if random.random() < speed["stall_rate"] else speed["ttft"])
+        for i in range(server.reply_tokens + 1):
+            if i:
+                time.sleep(speed["delay"])
+            chunk = {
+                "id": "stub", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": body.get("model", ""),
+                "choices": [{"index": 0, "delta": {"content": f" tok{i}"} if i < server.reply_tokens else {},
+                             "finish_reason": None if i < server.reply_tokens else "stop"}],
+            }
+            self._chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+        self._chunk(b"data: [DONE]\n\n")
+        self._chunk(b"")
+
+    def _chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def handle_one_request(self):
+        try:
+            super().handle_one_request()
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True        # the client cancelled the stream
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(rpm: float = 60, tpm: float = 20000, burst: float = 60.0, reply_tokens: int = 40,
+          ttft: float = 0.05, delay: float = 0.002, fail_rate: float = 0.0,
+          stall_rate: float = 0.0, stall: float = 3.0, models: Optional[Dict[str, Dict[str, float]]] = None) -> ThreadingHTTPServer:
+    """Start the stub on a free localhost port in a daemon thread. `burst`: seconds of quota a bucket holds."""
+    server = _Server(("127.0.0.1", 0), _Handler)
+    server.requests_bucket = _Bucket(rpm, burst)
+    server.tokens_bucket = _Bucket(tpm, burst)
+    server.reply_tokens = reply_tokens
+    server.ttft = ttft
+    server.delay = delay
+    server.fail_rate = fail_rate
+    server.stall_rate = stall_rate
+    server.stall = stall
+    server.models = models or {}
+    server.requests = server.served = server.rate_limited = server.failed = server.tokens_served = 0
+    server.lock = threading.Lock()
+    server.base_url = f"http://127.0.0.1:{server.server_port}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
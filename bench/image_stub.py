@@ -0,0 +1,74 @@
+"""
+A local stand-in for the image service: answers every GET with a small PNG
+after `delay` seconds, and counts requests. POSTs are read in full and
+acknowledged, taking as long as `upload_bps` (bits/s) would, to time
+request uploads.
+
+    server = serve(delay=0.5)      # server.base_url, server.requests
+    ...
+    server.shutdown()
+"""
+
+import io
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+
+def _png(width: int = 80, height: int = 40) -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", (width, height), (43, 91, 158)).save(out, format="PNG")
+    return out.getvalue()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests += 1
+        time.sleep(server.delay)
+        if server.fail:
+            self.send_error(503)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(server.body)))
+        self.end_headers()
+        self.wfile.write(server.body)
+
+    def do_POST(self):
+        server = self.server
+        size = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(size)
+        with server.lock:
+            server.requests += 1
+            server.received += size
+        if server.upload_bps:
+            time.sleep(size * 8 / server.upload_bps)
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(delay: float = 0.5, fail: bool = False, upload_bps: float = 0) -> ThreadingHTTPServer:
+    """Start the stub on a free localhost port in a daemon thread."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.daemon_threads = True
+    server.delay = delay
+    server.fail = fail
+    server.body = _png()
+    server.upload_bps = upload_bps
+    server.requests = 0
+    server.received = 0
+    server.lock = threading.Lock()
+    server.base_url = f"http://127.0.0.1:{server.server_port}/prompt/"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
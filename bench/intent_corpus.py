@@ -0,0 +1,133 @@
+"""
+Hand-labeled prompts for the intent router. Each case gives the prompt,
+whether an image was uploaded, and the expected intent; template, persona
+and warnings are checked only where a case lists them (None = expect none).
+"""
+
+CASES = [
+    # image generation
+    {"prompt": "draw a cat wearing a space helmet", "intent": "image"},
+    {"prompt": "Draw me a castle on a floating island", "intent": "image"},
+    {"prompt": "can you make a picture of a sunset over the Himalayas", "intent": "image"},
+    {"prompt": "generate an image of a futuristic Jaipur", "intent": "image"},
+    {"prompt": "create a logo for my bakery called Sweet Tooth", "intent": "image"},
+    {"prompt": "show me a photo of a red panda", "intent": "image"},
+    {"prompt": "pic of a lion in the rain", "intent": "image"},
+    {"prompt": "image of a dragon guarding gold", "intent": "image"},
+    {"prompt": "ek sher ki photo banao", "intent": "image"},
+    {"prompt": "Taj Mahal ki photo bana do", "intent": "image"},
+    {"prompt": "paint a watercolor of Varanasi ghats", "intent": "image"},
+    {"prompt": "sketch a robot reading a book", "intent": "image"},
+    {"prompt": "make me a wallpaper of a neon city", "intent": "image"},
+    {"prompt": "illustrate a child flying a kite", "intent": "image"},
+    {"prompt": "design a poster for our college fest", "intent": "image"},
+    {"prompt": "give me 3 pictures of mountains", "intent": "image"},
+    {"prompt": "draw a new cartoon character, not based on this", "has_image": True, "intent": "image"},
+    {"prompt": "can you draw me something cool", "intent": "image"},
+    {"prompt": "I want a painting of a tiger in the snow", "intent": "image"},
+    {"prompt": "Thanks! Now draw a fox in the same style.", "intent": "image"},
+    # vision (image uploaded)
+    {"prompt": "what is in this image?", "has_image": True, "intent": "vision"},
+    {"prompt": "describe this", "has_image": True, "intent": "vision"},
+    {"prompt": "Read the text in the screenshot", "has_image": True, "intent": "vision"},
+    {"prompt": "solve the equation in this photo", "has_image": True, "intent": "vision",
+     "persona": "🧑‍🔬 Research Scientist"},
+    {"prompt": "what does the chart show about sales?", "has_image": True, "intent": "vision"},
+    {"prompt": "identify this plant", "has_image": True, "intent": "vision"},
+    {"prompt": "is this mushroom safe to eat", "has_image": True, "intent": "vision"},
+    {"prompt": "draw this image in anime style", "has_image": True, "intent": "vision"},
+    {"prompt": "explain", "has_image": True, "intent": "vision"},
+    # chat, including prompts the old substring scan sent to image generation
+    {"prompt": "explain the topic of photosynthesis", "intent": "chat", "persona": "🧑‍🔬 Research Scientist"},
+    {"prompt": "what is an epic poem?", "intent": "chat", "persona": "✍️ Creative Writer"},
+    {"prompt": "plan a picnic for 10 people", "intent": "chat"},
+    {"prompt": "imagine a world without electricity", "intent": "chat"},
+    {"prompt": "what are the drawbacks of nuclear energy", "intent": "chat"},
+    {"prompt": "how does image compression work in JPEG?", "intent": "chat"},
+    {"prompt": "tips to improve my public image at work", "intent": "chat"},
+    {"prompt": "who picked the first president of India", "intent": "chat"},
+    {"prompt": "what is the typical salary of a photographer", "intent": "chat"},
+    {"prompt": "explain blockchain simply", "intent": "chat"},
+    {"prompt": "who made you?", "intent": "chat"},
+    {"prompt": "Explain the picture element in HTML", "intent": "chat"},
+    {"prompt": "summarize the causes of World War 1", "intent": "chat"},
+    {"prompt": "Illustrate the concept of recursion with an example", "intent": "chat"},
+    {"prompt": "Who made the painting Starry Night and when?", "intent": "chat"},
+    {"prompt": "How do I draw conclusions from a survey?", "intent": "chat"},
+    {"prompt": "Sketch out a plan for my startup launch", "intent": "chat"},
+    {"prompt": "how do I draw a line in matplotlib?", "intent": "chat"},
+    {"prompt": "what is the difference between a drawing and a painting", "intent": "chat"},
+    {"prompt": "illustrate the difference between TCP and UDP", "intent": "chat"},
+    {"prompt": "my kid loves painting, suggest some weekend activities", "intent": "chat"},
+    {"prompt": "picture this: you're the CEO, what do you cut first?", "intent": "chat",
+     "persona": None},
+    {"prompt": "describe this", "intent": "chat"},
+    {"prompt": "picture of health in rural india", "intent": "chat"},
+    {"prompt": "what is the image of a function under f", "intent": "chat", "template": None,
+     "persona": None},
+    {"prompt": "how many pictures of the moon has NASA published?", "intent": "chat"},
+    {"prompt": "the history behind a painting of the Sistine Chapel ceiling", "intent": "chat"},
+    {"prompt": "is a photo of a person covered by copyright law", "intent": "chat"},
+    # templates and personas
+    {"prompt": "please do a code review of my login handler", "intent": "chat",
+     "template": "💻 Code Review", "persona": "👨‍💻 Senior Dev"},
+    {"prompt": "I get TypeError: 'NoneType' object is not subscriptable in python", "intent": "chat",
+     "template": "🐛 Debug Code", "persona": "👨‍💻 Senior Dev"},
+    {"prompt": "help me debug this traceback", "intent": "chat",
+     "template": "🐛 Debug Code", "persona": "👨‍💻 Senior Dev"},
+    {"prompt": "write a blog post about remote work", "intent": "chat",
+     "template": "📝 Blog Post", "persona": "✍️ Creative Writer"},
+    {"prompt": "analyze this data: 12, 15, 9, 30, 11", "intent": "chat", "template": "📊 Data Analysis"},
+    {"prompt": "give me a catchy tagline for a chai startup", "intent": "chat",
+     "template": "🎯 Marketing Copy", "persona": "📈 Business Strategist"},
+    {"prompt": "make a study guide for class 12 chemistry board exams", "intent": "chat",
+     "template": "📚 Study Guide", "persona": "🧑‍🔬 Research Scientist"},
+    {"prompt": "write an email to my manager asking for leave", "intent": "chat",
+     "template": "💌 Professional Email", "persona": None},
+    {"prompt": "literature review on microplastics in rivers", "intent": "chat",
+     "template": "🔍 Research Summary", "persona": "🧑‍🔬 Research Scientist"},
+    {"prompt": "write a poem about the monsoon", "intent": "chat", "template": None,
+     "persona": "✍️ Creative Writer"},
+    {"prompt": "I'm stressed and keep procrastinating", "intent": "chat", "persona": "🧘 Life Coach"},
+    {"prompt": "translate 'good morning' into Japanese", "intent": "chat", "persona": "🌍 Language Tutor"},
+    {"prompt": "teach me recursion step by step", "intent": "chat", "persona": "🎓 Socratic Teacher"},
+    {"prompt": "SWOT analysis for a food delivery business", "intent": "chat",
+     "persona": "📈 Business Strategist"},
+    {"prompt": "explain quantum entanglement", "intent": "chat", "template": None,
+     "persona": "🧑‍🔬 Research Scientist"},
+    {"prompt": "what's the capital of Rajasthan", "intent": "chat", "template": None, "persona": None},
+    # bare words that only sometimes mean code, exams or bugs pick no template or persona
+    {"prompt": "what is the dress code for a wedding in Goa", "intent": "chat", "template": None, "persona": None},
+    {"prompt": "find the zip code for Connaught Place", "intent": "chat", "template": None, "persona": None},
+    {"prompt": "is a derivative a function of x?", "intent": "chat", "template": None},
+    {"prompt": "what does the API in API Gravity mean for crude oil", "intent": "chat", "template": None,
+     "persona": None},
+    {"prompt": "I have an eye exam tomorrow, what should I expect", "intent": "chat", "template": None,
+     "persona": None},
+    {"prompt": "a bug bit me on the arm and it is swollen", "intent": "chat", "template": None, "persona": None},
+    {"prompt": "is there an exception to the two-year rule for visas", "intent": "chat", "template": None,
+     "persona": None},
+    {"prompt": "how should I react when my boss criticizes me", "intent": "chat", "persona": None},
+    {"prompt": "how do I remove rust from a bicycle chain", "intent": "chat", "template": None, "persona": None},
+    {"prompt": "what is the pitch of a middle C note", "intent": "chat", "persona": None},
+    {"prompt": "write a python function that reverses a string", "intent": "chat",
+     "persona": "👨‍💻 Senior Dev"},
+    {"prompt": "my script throws an IndexError exception on line 4", "intent": "chat",
+     "template": "🐛 Debug Code", "persona": "👨‍💻 Senior Dev"},
+    {"prompt": "fix the bug in my code below", "intent": "chat", "template": "🐛 Debug Code",
+     "persona": "👨‍💻 Senior Dev"},
+    {"prompt": "help me prepare for my physics exam", "intent": "chat", "template": "📚 Study Guide"},
+    # safety warnings
+    {"prompt": "my password is hunter2, is it strong?", "intent": "chat",
+     "warnings": ["⚠️ Possible credentials detected — avoid sharing passwords or API keys"]},
+    {"prompt": "here is my api_key sk-123, why does it fail", "intent": "chat",
+     "warnings": ["⚠️ Possible credentials detected — avoid sharing passwords or API keys"]},
+    {"prompt": "card 4111111111111111 was declined", "intent": "chat",
+     "warnings": ["⚠️ Possible credit card number detected — do not share financial data"]},
+    {"prompt": "my SSN is 123-45-6789 and my token is abc", "intent": "chat",
+     "warnings": ["⚠️ Possible credentials detected — avoid sharing passwords or API keys",
+                  "⚠️ Possible personal ID number detected — protect your identity"]},
+    {"prompt": "draw a dragon, my password is dragon123", "intent": "image",
+     "warnings": ["⚠️ Possible credentials detected — avoid sharing passwords or API keys"]},
+    {"prompt": "what's a good passwordless login flow", "intent": "chat", "warnings": []},
+]
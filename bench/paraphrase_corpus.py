@@ -0,0 +1,58 @@
+"""
+Labeled prompt pairs for the semantic cache: paraphrases that should share
+an answer, and near misses on the same topic that must not.
+"""
+
+PARAPHRASES = [
+    ("explain blockchain simply", "blockchain for beginners, explained simply"),
+    ("explain blockchain simply", "Can you explain blockchain in simple terms?"),
+    ("What is photosynthesis?", "what is photosynthesis"),
+    ("How does photosynthesis work?", "Explain how photosynthesis works"),
+    ("Explain quantum computing in simple terms", "quantum computing explained in simple terms"),
+    ("Write a professional email requesting a meeting with a potential client.",
+     "write a professional email to a potential client requesting a meeting"),
+    ("What are the benefits of meditation?", "what are the benefits of meditating"),
+    ("Give me 5 tips to improve my productivity", "5 tips to improve productivity"),
+    ("How do I reverse a list in Python?", "how to reverse a list in python"),
+    ("What is the difference between TCP and UDP?", "difference between TCP and UDP"),
+    ("Explain the theory of relativity", "explain relativity theory"),
+    ("Summarize the causes of World War 1", "summarise the causes of world war I"),
+    ("What is machine learning?", "What's machine learning?"),
+    ("How do vaccines work?", "how does a vaccine work"),
+    ("Tips for a job interview", "give me some job interview tips"),
+    ("Explain recursion with an example", "explain recursion using an example"),
+    ("What causes inflation?", "what are the causes of inflation"),
+    ("How to make pizza dough at home", "how do I make pizza dough at home?"),
+    ("Explain the water cycle for kids", "water cycle explained for kids"),
+    ("Best way to learn JavaScript", "what is the best way to learn javascript"),
+]
+
+NEAR_MISSES = [
+    ("explain blockchain simply", "explain blockchain security risks"),
+    ("What is photosynthesis?", "What is cellular respiration?"),
+    ("How do I reverse a list in Python?", "How do I sort a list in Python?"),
+    ("How do I reverse a list in Python?", "How do I reverse a string in JavaScript?"),
+    ("What is the difference between TCP and UDP?", "What is the difference between HTTP and HTTPS?"),
+    ("Explain the theory of relativity", "Explain the theory of evolution"),
+    ("Summarize the causes of World War 1", "Summarize the causes of World War 2"),
+    ("Give me 5 tips to improve my productivity", "Give me 5 tips to improve my sleep"),
+    ("Write a professional email requesting a meeting with a potential client.",
+     "Write a professional email declining a meeting with a potential client."),
+    ("What are the benefits of meditation?", "What are the risks of meditation?"),
+    ("How to make pizza dough at home", "How to make bread dough at home"),
+    ("Explain quantum computing in simple terms", "Explain quantum entanglement in simple terms"),
+    ("What causes inflation?", "What causes deflation?"),
+    ("Best way to learn JavaScript", "Best way to learn Python"),
+    ("Explain recursion with an example", "Explain iteration with an example"),
+    ("Convert 100 USD to INR", "Convert 200 USD to INR"),
+    # Same words, different order or a one-letter difference
+    ("Convert Celsius to Fahrenheit", "Convert Fahrenheit to Celsius"),
+    ("Is Python faster than Java?", "Is Java faster than Python?"),
+    ("Summarize the causes of World War I", "Summarize the causes of World War II"),
+    ("Translate English to French", "Translate French to English"),
+    ("Convert 100 USD to INR", "Convert 100 INR to USD"),
+    ("How do I move from Windows to Linux?", "How do I move from Linux to Windows?"),
+    ("Write a poem about a dog chasing a cat", "Write a poem about a cat chasing a dog"),
+    ("Does A imply B?", "Does B imply A?"),
+    ("What foods are rich in vitamin A?", "What foods are rich in vitamin D?"),
+]
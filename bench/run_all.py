@@ -0,0 +1,139 @@
+"""
+Run the benchmark suite offline and write one JSON document with the rows
+of every benchmark plus the environment they ran in. Compare two documents
+to spot regressions.
+
+    python -m bench.run_all --out bench_results.json
+    python -m bench.run_all --quick --only functions,rerun
+    python -m bench.run_all --out new.json --baseline old.json
+"""
+
+import argparse
+import datetime
+import importlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+# hexaloy_features reads this at import; keep benchmark sessions out of the real database.
+os.environ.setdefault("HEXALOY_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="hexaloy-bench-"), "sessions.db"))
+
+# name -> (module, kwargs for --quick)
+BENCHMARKS = {
+    "functions": ("bench.bench_functions", {"sizes": (10, 1_000, 10_000)}),
+    "rerun":     ("bench.bench_rerun", {"message_counts": (0, 100), "reruns": 3, "time_scale": 0.1}),
+    "search":    ("bench.bench_search", {"sizes": (1_000,)}),
+    "analytics": ("bench.bench_analytics", {"sizes": (1_000, 10_000)}),
+    "export":    ("bench.bench_export", {"n_messages": 1_000}),
+    "context":   ("bench.bench_context", {"sizes": (100, 1_000)}),
+    "store":     ("bench.bench_store", {"n_sessions": 20, "per_session": 100}),
+    "router":    ("bench.bench_router", {}),
+    "images":    ("bench.bench_images", {"delay": 0.1}),
+    "vision":    ("bench.bench_vision", {}),
+    "scheduler": ("bench.bench_scheduler", {"requests": 60}),
+    "singleflight": ("bench.bench_singleflight", {"users": 10}),
+    "semantic":  ("bench.bench_semantic", {"sizes": (10_000,), "queries": 500}),
+    "messages":  ("bench.bench_messages", {"n_messages": 5_000}),
+    "retrieval": ("bench.bench_retrieval", {"sizes": (10_000,), "queries": 200}),
+    "cascade":   ("bench.bench_cascade", {}),
+    "compare":   ("bench.bench_compare", {"reply_tokens": 50}),
+    "prefetch":  ("bench.bench_prefetch", {"users": 3, "turns": 3, "read_seconds": 0.5}),
+    "resilience": ("bench.bench_resilience", {"requests": 60}),
+    "batch":     ("bench.bench_batch", {"prompts": 40}),
+}
+
+# Row fields that identify a measurement rather than being one.
+KEY_FIELDS = ("bench", "function", "format", "query", "messages", "sessions", "case", "image", "variant", "mode",
+              "injected_503_rate", "threshold", "entries")
+REGRESSION_TOLERANCE = 0.25     # flag timings more than 25% slower than the baseline
+NOISE_FLOOR_MS = 1.0            # millisecond timings below this are too noisy to compare
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def run(names: List[str], quick: bool = False) -> Dict:
+    results = {}
+    for name in names:
+        module, quick_kwargs = BENCHMARKS[name]
+        t0 = time.perf_counter()
+        rows = importlib.import_module(module).run(**(quick_kwargs if quick else {}))
+        results[name] = {"seconds": round(time.perf_counter() - t0, 2), "rows": rows}
+        print(f"{name}: {len(rows)} rows in {results[name]['seconds']}s", file=sys.stderr)
+    return {
+        "generated": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "quick": quick,
+        "results": results,
+    }
+
+
+def _row_key(row: Dict) -> tuple:
+    return tuple((k, row[k]) for k in KEY_FIELDS if k in row)
+
+
+def compare(new: Dict, old: Dict, tolerance: float = REGRESSION_TOLERANCE) -> List[Dict]:
+    """Timing (`*ms`, `*_s`) and memory (`*_kb`) fields of matching rows that grew by more than `tolerance`."""
+    regressions = []
+    for name, result in new["results"].items():
+        before = {_row_key(r): r for r in old.get("results", {}).get(name, {}).get("rows", [])}
+        for row in result["rows"]:
+            base = before.get(_row_key(row))
+            if base is None:
+                continue
+            for field, value in row.items():
+                if (not field.endswith(("ms", "_s", "_kb")) or field.endswith("per_s")
+                        or not isinstance(value, (int, float))):
+                    continue
+                if field.endswith("ms") and value < NOISE_FLOOR_MS:
+                    continue
+                was = base.get(field)
+                if isinstance(was, (int, float)) and was > 0 and value > was * (1 + tolerance):
+                    regressions.append({**dict(_row_key(row)), "field": field, "baseline": was, "now": value})
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", help="comma-separated subset of: " + ", ".join(BENCHMARKS))
+    parser.add_argument("--quick", action="store_true", help="small sizes, for a fast smoke run")
+    parser.add_argument("--out", help="write the JSON document here instead of stdout")
+    parser.add_argument("--baseline", help="earlier JSON document to compare against")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE,
+                        help="relative slowdown that counts as a regression (default %(default)s)")
+    args = parser.parse_args(argv)
+
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+    doc = run(names, quick=args.quick)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            doc["regressions"] = compare(doc, json.load(f), args.tolerance)
+    text = json.dumps(doc, indent=1, default=str)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    for reg in doc.get("regressions", []):
+        print(f"REGRESSION {reg}", file=sys.stderr)
+    return 1 if doc.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,247 @@
+"""
+Headless batch runner. Answers every prompt of a JSONL file through the
+chat pipeline the app uses (routing, persona and template system prompt,
+context window, model cascade, RequestScheduler quotas, hedging and
+fallback), with a bounded pool of concurrent workers. Appends one NDJSON
+line per prompt with the answer and its timings. Running again with the
+same output file resumes: prompts already answered are skipped.
+
+Each input line is {"prompt": ...} with optional "id", "persona" (a key of
+AI_PERSONAS), "template" (a key of PROMPT_TEMPLATES) and "history" (earlier
+{"role", "content"} turns). --combinations adds one prompt per template ×
+persona, filled in from SAMPLE_FIELDS.
+
+    GROQ_API_KEY=... python hexaloy_batch.py prompts.jsonl -o results.ndjson --workers 8
+    GROQ_API_KEY=... python hexaloy_batch.py --combinations -o combinations.ndjson
+"""
+
+import argparse
+import asyncio
+import datetime
+import hashlib
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Set
+
+from hexaloy_features import (
+    AI_PERSONAS, CHAT_TEMPERATURE, MODEL_QUOTAS, PROMPT_TEMPLATES, QUOTA_SCALE, TEMPLATE_PERSONAS,
+    RequestScheduler, describe_upstream_error, get_async_groq_client, route_prompt, run_chat,
+)
+
+BATCH_WORKERS = 4
+BATCH_OWNER = "batch"
+HISTORY_ROLES = ("system", "user", "assistant")
+# Values for the {placeholders} of PROMPT_TEMPLATES when generating --combinations
+SAMPLE_FIELDS = {
+    "audience": "first-year university students",
+    "benefits": "saves two hours a week, works offline, free for students",
+    "code": "def average(xs):\n    return sum(xs) / len(xs)",
+    "data": "month,sales\nJan,120\nFeb,135\nMar,90\nApr,160",
+    "error": "ZeroDivisionError: division by zero",
+    "language": "python",
+    "length": "800",
+    "points": "project kickoff moved to Monday; agenda attached; confirm attendance",
+    "product": "a flashcard app for exam preparation",
+    "purpose": "reschedule the project kickoff",
+    "recipient": "the project team",
+    "sender": "the project lead",
+    "tone": "friendly",
+    "topic": "photosynthesis",
+}
+
+
+def record_id(record: Dict[str, Any]) -> str:
+    """The record's "id", else a hash of its content (stable across runs, for resuming)."""
+    if record.get("id") is not None:
+        return str(record["id"])
+    return hashlib.sha1(json.dumps(record, sort_keys=True, ensure_ascii=False).encode()).hexdigest()[:16]
+
+
+def read_prompts(path: str) -> Iterator[Dict[str, Any]]:
+    """Records of a JSONL prompt file, blank lines skipped."""
+    with open(path, encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{n}: not valid JSON ({e.msg})") from None
+            if not isinstance(record, dict) or not isinstance(record.get("prompt"), str):
+                raise ValueError(f'{path}:{n}: expected an object with a "prompt" string')
+            if record.get("persona") is not None and record["persona"] not in AI_PERSONAS:
+                raise ValueError(f"{path}:{n}: unknown persona {record['persona']!r}")
+            if record.get("template") is not None and record["template"] not in PROMPT_TEMPLATES:
+                raise ValueError(f"{path}:{n}: unknown template {record['template']!r}")
+            history = record.get("history")
+            if history is not None and not (isinstance(history, list) and all(
+                    isinstance(turn, dict) and turn.get("role") in HISTORY_ROLES
+                    and isinstance(turn.get("content"), str) for turn in history)):
+                raise ValueError(f'{path}:{n}: "history" must be a list of {{"role", "content"}} objects '
+                                 f'with a role in {HISTORY_ROLES} and string content')
+            yield record
+
+
+def combination_records() -> Iterator[Dict[str, Any]]:
+    """One record per PROMPT_TEMPLATES × AI_PERSONAS pair."""
+    for template, spec in PROMPT_TEMPLATES.items():
+        prompt = spec["template"].format(**SAMPLE_FIELDS)
+        for persona in AI_PERSONAS:
+            yield {"id": f"{template} × {persona}", "prompt": prompt, "template": template, "persona": persona}
+
+
+def finished_ids(path: str) -> Set[str]:
+    """Ids already written to `path` with a final status; errors are retried."""
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue                # a line cut short by an interruption
+            if result.get("status") in ("ok", "skipped"):
+                done.add(result["id"])
+    return done
+
+
+async def answer_record(client, scheduler: RequestScheduler, record: Dict[str, Any],
+                        temperature: float = CHAT_TEMPERATURE) -> Dict[str, Any]:
+    """The NDJSON result for one record: {"id", "status", ...} plus run_chat()'s fields when answered."""
+    result = {"id": record_id(record), "prompt": record["prompt"],
+              "started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")}
+    route = route_prompt(record["prompt"])
+    if record.get("template"):
+        template = record["template"]
+        route = {**route, "template": template, "persona": route["persona"] or TEMPLATE_PERSONAS.get(template)}
+    if route["intent"] == "image":
+        return {**result, "status": "skipped", "reason": "image generation is not available in batch mode"}
+    started = time.perf_counter()
+    try:
+        answer = await run_chat(client, scheduler, BATCH_OWNER, record["prompt"], record.get("history", ()),
+                                record.get("persona"), route, temperature)
+    except Exception as e:
+        return {**result, "status": "error", "error": describe_upstream_error(e), "error_type": type(e).__name__,
+                "total_s": round(time.perf_counter() - started, 3)}
+    return {**result, "status": "ok", **answer}
+
+
+async def run_batch(records: List[Dict[str, Any]], client, out, workers: int = BATCH_WORKERS,
+                    quota_scale: float = QUOTA_SCALE, temperature: float = CHAT_TEMPERATURE,
+                    progress=None) -> List[Dict[str, Any]]:
+    """
+    Answer `records` with `workers` concurrent workers sharing one
+    RequestScheduler, writing each result to `out` (and flushing) as soon as
+    it is ready. Returns the results in completion order.
+    """
+    scheduler = RequestScheduler(MODEL_QUOTAS, scale=quota_scale)
+    queue: asyncio.Queue = asyncio.Queue()
+    for record in records:
+        queue.put_nowait(record)
+    results: List[Dict[str, Any]] = []
+
+    async def worker():
+        while True:
+            try:
+                record = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            result = await answer_record(client, scheduler, record, temperature)
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+            results.append(result)
+            if progress:
+                progress(len(results), len(records), result)
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(max(1, min(workers, len(records))))))
+    finally:
+        await scheduler.close()
+    return results
+
+
+def summarize(results: List[Dict[str, Any]], wall: float) -> Dict[str, Any]:
+    """Counts per status, throughput and latency percentiles of the answered prompts."""
+    ok = [r for r in results if r["status"] == "ok"]
+    totals = sorted(r["total_s"] for r in ok)
+    ttfts = sorted(r["ttft_s"] for r in ok if r.get("ttft_s") is not None)
+
+    def pct(values, p):
+        return values[min(len(values) - 1, int(p * len(values)))] if values else None
+
+    return {
+        "prompts": len(results), "ok": len(ok),
+        "errors": sum(r["status"] == "error" for r in results),
+        "skipped": sum(r["status"] == "skipped" for r in results),
+        "wall_s": round(wall, 2), "prompts_per_min": round(60 * len(results) / wall, 1) if wall > 0 else None,
+        "tokens": sum(r["tokens"] for r in ok),
+        "total_p50_s": pct(totals, 0.5), "total_p95_s": pct(totals, 0.95),
+        "ttft_p50_s": pct(ttfts, 0.5), "ttft_p95_s": pct(ttfts, 0.95),
+        "escalated": sum(r["escalated"] for r in ok), "hedged": sum(r["hedged"] for r in ok),
+    }
+
+
+def _print_progress(done: int, total: int, result: Dict[str, Any]):
+    detail = result.get("model") or result.get("reason") or result.get("error", "")
+    timing = f" {result['total_s']:.2f}s" if "total_s" in result else ""
+    print(f"[{done}/{total}] {result['status']:<7} {result['id']}{timing} {detail}", file=sys.stderr)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of prompts with the HEXALOY chat pipeline.")
+    parser.add_argument("input", nargs="?", help="JSONL file, one {\"prompt\": ...} object per line")
+    parser.add_argument("-o", "--out", default="batch_results.ndjson",
+                        help="NDJSON results file; appended to, and prompts already in it are skipped")
+    parser.add_argument("--combinations", action="store_true",
+                        help="also run every prompt template × persona combination")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="prompts answered concurrently")
+    parser.add_argument("--quota-scale", type=float, default=QUOTA_SCALE,
+                        help="multiplier on MODEL_QUOTAS (paid tiers allow more requests and tokens per minute)")
+    parser.add_argument("--temperature", type=float, default=CHAT_TEMPERATURE)
+    parser.add_argument("--base-url", default=os.environ.get("GROQ_BASE_URL"),
+                        help="Groq-compatible endpoint (default: the Groq API)")
+    parser.add_argument("--quiet", action="store_true", help="no per-prompt progress lines")
+    args = parser.parse_args(argv)
+
+    if not args.input and not args.combinations:
+        parser.error("give a prompt file, --combinations, or both")
+    api_key = os.environ.get("GROQ_API_KEY")
+    if not api_key:
+        parser.error("set GROQ_API_KEY")
+    try:
+        records = list(read_prompts(args.input)) if args.input else []
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    if args.combinations:
+        records += combination_records()
+
+    done = finished_ids(args.out)
+    pending, seen = [], set(done)
+    for record in records:
+        rid = record_id(record)
+        if rid not in seen:
+            seen.add(rid)
+            pending.append(record)
+    print(f"{len(pending)} prompts to run, {len(records) - len(pending)} already done or duplicated",
+          file=sys.stderr)
+
+    client = get_async_groq_client(api_key, args.base_url)
+    results: List[Dict[str, Any]] = []
+    started = time.perf_counter()
+    with open(args.out, "a", encoding="utf-8") as out:
+        try:
+            results = asyncio.run(run_batch(pending, client, out, args.workers, args.quota_scale, args.temperature,
+                                            None if args.quiet else _print_progress))
+        except KeyboardInterrupt:
+            print(f"Interrupted; results so far are in {args.out}. Run the same command again to resume.",
+                  file=sys.stderr)
+            return 130
+    print(json.dumps(summarize(results, time.perf_counter() - started)), file=sys.stderr)
+    return 1 if any(r["status"] == "error" for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
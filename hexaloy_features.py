@@ -8,14 +8,40 @@
 import streamlit as st
 import json
 import datetime
+import functools
 import os
 import re
+import secrets
 import random
 import hashlib
 import time
+import asyncio
 import base64
+import bisect
+import contextlib
+import cProfile
+import groq
+import httpx
+import io
+import heapq
+import inspect
+import itertools
+import math
+import pstats
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
 import urllib.parse
-from typing import Optional, List, Dict, Any, Generator, Tuple
+import zipfile
+import zlib
+import numpy as np
+from collections import Counter, OrderedDict, deque
+from collections.abc import Mapping, Sequence
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Optional, List, Dict, Any, AsyncIterator, Callable, Generator, Tuple
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -111,12 +137,9 @@ def inject_keyboard_shortcuts():
 # FEATURE MODULE 2: EXPORT / DOWNLOAD UTILITIES
 # ──────────────────────────────────────────────────────────────────────────────
 
-def export_chat_as_markdown(history: list, session_name: str) -> str:
-    """
-    Convert chat history to beautifully formatted Markdown.
-    Returns the Markdown string.
-    """
-    lines = [
+def iter_chat_markdown(history: Sequence, session_name: str) -> Generator[str, None, None]:
+    """Yield the Markdown export chunk by chunk, one message at a time."""
+    yield "\n".join([
         f"# 💠 HEXALOY AI — Chat Export",
         f"",
         f"**Session:** {session_name}",
@@ -125,7 +148,7 @@ def export_chat_as_markdown(history: list, session_name: str) -> str:
         f"",
         "---",
         "",
-    ]
+    ]) + "\n"
     for msg in history:
         role = msg.get("role", "user")
         content = msg.get("content", "")
@@ -133,67 +156,69 @@ def export_chat_as_markdown(history: list, session_name: str) -> str:
         model = msg.get("model", "")
 
         if role == "user":
-            lines.append(f"### 🧑‍💼 You{' · ' + ts if ts else ''}")
+            heading = f"### 🧑‍💼 You{' · ' + ts if ts else ''}"
         else:
-            lines.append(f"### 💠 HEXALOY{' · ' + ts if ts else ''}{' · ' + model if model else ''}")
+            heading = f"### 💠 HEXALOY{' · ' + ts if ts else ''}{' · ' + model if model else ''}"
+        yield f"{heading}\n\n{content}\n\n---\n\n"
+
+    yield f"*Generated by HEXALOY AI v7.0 — Architected by VINIT MAAN*"
+
 
-        lines.append("")
-        lines.append(content)
-        lines.append("")
-        lines.append("---")
-        lines.append("")
+def export_chat_as_markdown(history: list, session_name: str) -> str:
+    """
+    Convert chat history to beautifully formatted Markdown.
+    Returns the Markdown string.
+    """
+    return "".join(iter_chat_markdown(history, session_name))
 
-    lines.append(f"*Generated by HEXALOY AI v7.0 — Architected by VINIT MAAN*")
-    return "\n".join(lines)
 
+def _indent_json(value: Any, prefix: str) -> str:
+    """json.dumps(indent=2) of `value` as it appears nested under `prefix`."""
+    return json.dumps(value, indent=2, ensure_ascii=False).replace("\n", "\n" + prefix)
 
-def export_chat_as_json(history: list, session_name: str) -> str:
-    """Export chat history as formatted JSON."""
-    data = {
+
+def iter_chat_json(history: Sequence, session_name: str) -> Generator[str, None, None]:
+    """
+    Yield the JSON export chunk by chunk. The concatenated output is
+    byte-for-byte what json.dumps(indent=2) produces for the whole document.
+    """
+    head = json.dumps({
         "hexaloy_version": "7.0",
         "session_name": session_name,
         "exported_at": datetime.datetime.now().isoformat(),
         "message_count": len(history),
-        "messages": history,
-        "metadata": {
-            "architect": "VINIT MAAN",
-            "platform": "HEXALOY Enterprise AI",
-        }
-    }
-    return json.dumps(data, indent=2, ensure_ascii=False)
-
+    }, indent=2, ensure_ascii=False)
+    yield head[:-2] + ',\n  "messages": ['
+
+    # Dump messages in batches: one json.dumps per message is much slower,
+    # one for the whole list would hold everything in memory again.
+    first = True
+    batch = []
+    for msg in itertools.chain(history, [None]):
+        if msg is not None:
+            batch.append(dict(msg))
+            if len(batch) < 256:
+                continue
+        if batch:
+            body = json.dumps(batch, indent=2, ensure_ascii=False)[2:-2]
+            yield ("\n  " if first else ",\n  ") + body.replace("\n", "\n  ")
+            first = False
+            batch = []
 
-def export_chat_as_html(history: list, session_name: str) -> str:
-    """Export chat history as a standalone beautiful HTML file."""
-    msgs_html = ""
-    for msg in history:
-        role = msg.get("role", "user")
-        content = msg.get("content", "")
-        ts = msg.get("ts", "")
-        is_user = role == "user"
+    yield ("],\n" if first else "\n  ],\n") + '  "metadata": ' + _indent_json({
+        "architect": "VINIT MAAN",
+        "platform": "HEXALOY Enterprise AI",
+    }, "  ") + "\n}"
 
-        # Escape HTML
-        content_escaped = content.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
 
-        avatar  = "🧑‍💼" if is_user else "💠"
-        label   = "You" if is_user else "HEXALOY"
-        bg      = "#EEF2FF" if is_user else "#FFFFFF"
-        border  = "#C7D7FF" if is_user else "#E2E8F0"
+def export_chat_as_json(history: list, session_name: str) -> str:
+    """Export chat history as formatted JSON."""
+    return "".join(iter_chat_json(history, session_name))
 
-        msgs_html += f"""
-        <div style="
-            background:{bg}; border:1px solid {border};
-            border-radius:16px; padding:18px 22px; margin-bottom:14px;
-        ">
-            <div style="font-weight:700;margin-bottom:8px;color:#0D1B4B;">
-                {avatar} {label}
-                <span style="font-weight:400;font-size:0.75rem;color:#7A8BB0;margin-left:8px;">{ts}</span>
-            </div>
-            <div style="color:#1E293B;line-height:1.7;white-space:pre-wrap;font-size:0.95rem;">{content_escaped}</div>
-        </div>
-        """
 
-    return f"""<!DOCTYPE html>
+def iter_chat_html(history: Sequence, session_name: str) -> Generator[str, None, None]:
+    """Yield the standalone HTML export chunk by chunk, one message at a time."""
+    yield f"""<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
@@ -219,109 +244,336 @@ def export_chat_as_html(history: list, session_name: str) -> str:
                 {datetime.datetime.now().strftime('%B %d, %Y')}
             </div>
         </div>
-        {msgs_html}
+        """
+    for msg in history:
+        role = msg.get("role", "user")
+        content = msg.get("content", "")
+        ts = msg.get("ts", "")
+        is_user = role == "user"
+
+        # Escape HTML
+        content_escaped = content.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+        avatar  = "🧑‍💼" if is_user else "💠"
+        label   = "You" if is_user else "HEXALOY"
+        bg      = "#EEF2FF" if is_user else "#FFFFFF"
+        border  = "#C7D7FF" if is_user else "#E2E8F0"
+
+        yield f"""
+        <div style="
+            background:{bg}; border:1px solid {border};
+            border-radius:16px; padding:18px 22px; margin-bottom:14px;
+        ">
+            <div style="font-weight:700;margin-bottom:8px;color:#0D1B4B;">
+                {avatar} {label}
+                <span style="font-weight:400;font-size:0.75rem;color:#7A8BB0;margin-left:8px;">{ts}</span>
+            </div>
+            <div style="color:#1E293B;line-height:1.7;white-space:pre-wrap;font-size:0.95rem;">{content_escaped}</div>
+        </div>
+        """
+
+    yield """
         <div class="footer">HEXALOY AI v7.0 &nbsp;·&nbsp; Architected by VINIT MAAN</div>
     </div>
 </body>
 </html>"""
 
 
-def render_export_panel(history: list, session_name: str):
-    """Render an export panel with download buttons in Streamlit."""
+def export_chat_as_html(history: list, session_name: str) -> str:
+    """Export chat history as a standalone beautiful HTML file."""
+    return "".join(iter_chat_html(history, session_name))
+
+
+EXPORT_FORMATS = {
+    # fmt: (chunk generator, mime type, file extension)
+    "md":   (iter_chat_markdown, "text/markdown",    "md"),
+    "json": (iter_chat_json,     "application/json", "json"),
+    "html": (iter_chat_html,     "text/html",        "html"),
+}
+
+
+def export_file_name(session_name: str, ext: str) -> str:
+    return f"hexaloy_{session_name.replace(' ', '_')}.{ext}"
+
+
+def write_chat_export(fmt: str, history: Sequence, session_name: str, fp) -> int:
+    """Stream one session in `fmt` into the binary file `fp` in a single pass. Returns bytes written."""
+    iter_chunks = EXPORT_FORMATS[fmt][0]
+    written = 0
+    for chunk in iter_chunks(history, session_name):
+        written += fp.write(chunk.encode("utf-8"))
+    return written
+
+
+def iter_sessions_ndjson(sessions: Mapping) -> Generator[str, None, None]:
+    """Yield every message of every session as one JSON line tagged with its session's title."""
+    for session, history in sessions.items():
+        session_name = session_title(sessions, session)
+        for msg in history:
+            yield json.dumps({"session": session_name, **msg}, ensure_ascii=False) + "\n"
+
+
+def write_sessions_archive(sessions: Mapping, fp, fmt: str = "zip") -> int:
+    """
+    Stream all sessions into the binary file `fp`: "ndjson" writes one line per
+    message, "zip" writes one Markdown file per session. Returns bytes written
+    for NDJSON, or the number of sessions for zip.
+    """
+    if fmt == "ndjson":
+        written = 0
+        for line in iter_sessions_ndjson(sessions):
+            written += fp.write(line.encode("utf-8"))
+        return written
+
+    with zipfile.ZipFile(fp, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        used = set()
+        for session, history in sessions.items():
+            session_name = session_title(sessions, session)
+            name = export_file_name(re.sub(r'[\\/:*?"<>|]', "_", session_name), "md")
+            if name in used:
+                name = name[:-3] + f"_{len(used)}.md"
+            used.add(name)
+            with zf.open(name, "w") as member:
+                write_chat_export("md", history, session_name, member)
+    return len(used)
+
+
+def _spooled(write) -> tempfile.SpooledTemporaryFile:
+    """Run `write(fp)` into a spooled temp file (RAM up to 8 MB, then disk) and rewind it."""
+    fp = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    write(fp)
+    fp.seek(0)
+    return fp
+
+
+def render_export_panel(history: list, session_name: str, sessions: Optional[Mapping] = None):
+    """
+    Render an export panel with download buttons in Streamlit.
+    Nothing is generated until a button is clicked; pass `sessions` to also
+    offer an all-sessions archive.
+    """
     if not history:
         st.warning("No messages to export yet.")
         return
 
-    st.markdown("#### 📥 Export Chat")
+    # the download callables run off the script thread: hand them detached copies, never the live caches
+    history = history.snapshot() if isinstance(history, StoredHistory) else list(history)
+    if sessions:
+        sessions = sessions.snapshot() if isinstance(sessions, StoredSessions) else dict(sessions)
 
-    md_content   = export_chat_as_markdown(history, session_name)
-    json_content = export_chat_as_json(history, session_name)
-    html_content = export_chat_as_html(history, session_name)
+    st.markdown("#### 📥 Export Chat")
 
-    col1, col2, col3 = st.columns(3)
-    with col1:
-        st.download_button(
-            label="📄 Markdown",
-            data=md_content,
-            file_name=f"hexaloy_{session_name.replace(' ', '_')}.md",
-            mime="text/markdown",
-            use_container_width=True,
-        )
-    with col2:
-        st.download_button(
-            label="📊 JSON",
-            data=json_content,
-            file_name=f"hexaloy_{session_name.replace(' ', '_')}.json",
-            mime="application/json",
-            use_container_width=True,
-        )
-    with col3:
-        st.download_button(
-            label="🌐 HTML",
-            data=html_content,
-            file_name=f"hexaloy_{session_name.replace(' ', '_')}.html",
-            mime="text/html",
-            use_container_width=True,
-        )
+    buttons = [("md", "📄 Markdown"), ("json", "📊 JSON"), ("html", "🌐 HTML")]
+    for col, (fmt, label) in zip(st.columns(3), buttons):
+        _, mime, ext = EXPORT_FORMATS[fmt]
+        with col:
+            st.download_button(
+                label=label,
+                data=lambda fmt=fmt: _spooled(lambda fp: write_chat_export(fmt, history, session_name, fp)),
+                file_name=export_file_name(session_name, ext),
+                mime=mime,
+                on_click="ignore",
+                use_container_width=True,
+            )
+
+    if sessions:
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button(
+                label="🗂️ All chats (.zip)",
+                data=lambda: _spooled(lambda fp: write_sessions_archive(sessions, fp, "zip")),
+                file_name="hexaloy_all_chats.zip",
+                mime="application/zip",
+                on_click="ignore",
+                use_container_width=True,
+            )
+        with col2:
+            st.download_button(
+                label="🧾 All chats (.ndjson)",
+                data=lambda: _spooled(lambda fp: write_sessions_archive(sessions, fp, "ndjson")),
+                file_name="hexaloy_all_chats.ndjson",
+                mime="application/x-ndjson",
+                on_click="ignore",
+                use_container_width=True,
+            )
 
 
 # ──────────────────────────────────────────────────────────────────────────────
 # FEATURE MODULE 3: ANALYTICS DASHBOARD
 # ──────────────────────────────────────────────────────────────────────────────
 
-def compute_analytics(sessions: dict) -> dict:
-    """Compute comprehensive analytics from all sessions."""
-    total_sessions = len(sessions)
-    total_messages = 0
-    total_words    = 0
-    total_tokens   = 0
-    user_messages  = 0
-    ai_messages    = 0
-    longest_msg    = 0
-    session_lengths = []
-    word_freq: Dict[str, int] = {}
-
-    for sname, history in sessions.items():
-        session_lengths.append(len(history))
-        for msg in history:
-            content = msg.get("content", "")
-            if not isinstance(content, str):
-                continue
-            total_messages += 1
-            words = content.split()
-            total_words += len(words)
-            total_tokens += len(content) // 4
-            longest_msg = max(longest_msg, len(content))
-
-            if msg.get("role") == "user":
-                user_messages += 1
-                for w in words:
-                    w_clean = re.sub(r'[^\w]', '', w.lower())
-                    if len(w_clean) > 4:
-                        word_freq[w_clean] = word_freq.get(w_clean, 0) + 1
+_NON_WORD_RE = re.compile(r'[^\w]')
+
+
+class AnalyticsAccumulator:
+    """
+    Running totals behind the analytics dashboard.
+    Each appended message updates the counters and the top-k keyword list in
+    O(words in the message), so rendering never walks the whole history.
+    Ties in `top_words` break by first occurrence, exactly like the full
+    recomputation in compute_analytics.
+    """
+
+    TOP_K = 10
+    STATE_KEY = "analytics"
+
+    def __init__(self):
+        self._lengths: Dict[Any, int] = {}      # session -> messages seen (in session order)
+        self._ranks: Dict[Any, int] = {}        # session -> position, for first-occurrence ties
+        self.total_messages = 0
+        self.total_words    = 0
+        self.total_tokens   = 0
+        self.user_messages  = 0
+        self.ai_messages    = 0
+        self.longest_msg    = 0
+        self._word_freq: Dict[str, int] = {}
+        self._word_first: Dict[str, Tuple[int, int, int]] = {}
+        self._top: List[str] = []
+        self.pending = 0                        # messages added since the last save
+
+    @classmethod
+    def from_sessions(cls, sessions: Mapping) -> "AnalyticsAccumulator":
+        acc = cls()
+        acc.sync(sessions)
+        return acc
+
+    def _rank_key(self, word: str) -> Tuple[int, Tuple[int, int, int]]:
+        return (-self._word_freq[word], self._word_first[word])
+
+    def _bump_word(self, word: str, pos: Tuple[int, int, int]):
+        self._word_freq[word] = self._word_freq.get(word, 0) + 1
+        first = self._word_first.get(word)
+        if first is None or pos < first:
+            self._word_first[word] = pos
+
+        # A word's rank key only ever improves, so only it can enter the top-k.
+        top = self._top
+        if word not in top:
+            if len(top) < self.TOP_K:
+                top.append(word)
+            elif self._rank_key(word) < self._rank_key(top[-1]):
+                top[-1] = word
             else:
-                ai_messages += 1
+                return
+        top.sort(key=self._rank_key)
 
-    top_words = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)[:10]
-    avg_session_length = (sum(session_lengths) / len(session_lengths)) if session_lengths else 0
+    def add_message(self, session: Any, msg_index: int, msg: dict):
+        """Fold one appended message into the totals."""
+        if session not in self._lengths:
+            self._ranks[session] = len(self._ranks)
+            self._lengths[session] = 0
+        self._lengths[session] = max(self._lengths[session], msg_index + 1)
+        self.pending += 1
 
-    return {
-        "total_sessions":     total_sessions,
-        "total_messages":     total_messages,
-        "total_words":        total_words,
-        "total_tokens":       total_tokens,
-        "user_messages":      user_messages,
-        "ai_messages":        ai_messages,
-        "longest_msg_chars":  longest_msg,
-        "avg_session_length": round(avg_session_length, 1),
-        "top_words":          top_words,
-        "session_lengths":    session_lengths,
-    }
+        content = msg.get("content", "")
+        if not isinstance(content, str):
+            return
+        self.total_messages += 1
+        words = content.split()
+        self.total_words += len(words)
+        self.total_tokens += len(content) // 4
+        self.longest_msg = max(self.longest_msg, len(content))
+
+        if msg.get("role") == "user":
+            self.user_messages += 1
+            rank = self._ranks[session]
+            for i, w in enumerate(words):
+                w_clean = _NON_WORD_RE.sub('', w.lower())
+                if len(w_clean) > 4:
+                    self._bump_word(w_clean, (rank, msg_index, i))
+        else:
+            self.ai_messages += 1
+
+    def add_session(self, session: Any):
+        if session not in self._lengths:
+            self._ranks[session] = len(self._ranks)
+            self._lengths[session] = 0
+
+    def rename_session(self, old: Any, new: Any):
+        """Re-key a session in place, keeping its position."""
+        if old not in self._lengths:
+            return
+        self._lengths = {(new if k == old else k): v for k, v in self._lengths.items()}
+        self._ranks[new] = self._ranks.pop(old)
+
+    def sync(self, sessions: Mapping):
+        """
+        Catch up with `sessions`: new sessions and newly appended messages are
+        folded in incrementally; anything else (removed or reordered sessions)
+        triggers a full rebuild.
+        """
+        known = list(self._lengths)
+        if list(itertools.islice(sessions, len(known))) != known:
+            self.__init__()
+        for session, history in sessions.items():
+            self.add_session(session)
+            for i in range(self._lengths[session], len(history)):
+                self.add_message(session, i, history[i])
+
+    def snapshot(self) -> dict:
+        """The analytics dict, in the same shape compute_analytics returns."""
+        session_lengths = list(self._lengths.values())
+        avg_session_length = (sum(session_lengths) / len(session_lengths)) if session_lengths else 0
+        return {
+            "total_sessions":     len(self._lengths),
+            "total_messages":     self.total_messages,
+            "total_words":        self.total_words,
+            "total_tokens":       self.total_tokens,
+            "user_messages":      self.user_messages,
+            "ai_messages":        self.ai_messages,
+            "longest_msg_chars":  self.longest_msg,
+            "avg_session_length": round(avg_session_length, 1),
+            "top_words":          [(w, self._word_freq[w]) for w in self._top],
+            "session_lengths":    session_lengths,
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "sessions": [[s, n, self._ranks[s]] for s, n in self._lengths.items()],
+            "totals": [self.total_messages, self.total_words, self.total_tokens,
+                       self.user_messages, self.ai_messages, self.longest_msg],
+            "words": {w: [c, *self._word_first[w]] for w, c in self._word_freq.items()},
+            "top": self._top,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "AnalyticsAccumulator":
+        acc = cls()
+        for session, length, rank in data["sessions"]:
+            acc._lengths[session] = length
+            acc._ranks[session] = rank
+        (acc.total_messages, acc.total_words, acc.total_tokens,
+         acc.user_messages, acc.ai_messages, acc.longest_msg) = data["totals"]
+        for w, (count, *first) in data["words"].items():
+            acc._word_freq[w] = count
+            acc._word_first[w] = tuple(first)
+        acc._top = list(data["top"])
+        return acc
+
+    def save(self, store: "SessionStore", owner: str):
+        """Persist the counters next to the owner's sessions."""
+        store.save_state(owner, self.STATE_KEY, json.dumps(self.to_dict(), ensure_ascii=False))
+        self.pending = 0
+
+    @classmethod
+    def load(cls, store: "SessionStore", owner: str) -> "AnalyticsAccumulator":
+        """Load the saved counters, or start empty; call sync() afterwards to catch up."""
+        raw = store.load_state(owner, cls.STATE_KEY)
+        return cls.from_dict(json.loads(raw)) if raw else cls()
+
+
+def compute_analytics(sessions: dict) -> dict:
+    """Compute comprehensive analytics from all sessions."""
+    return AnalyticsAccumulator.from_sessions(sessions).snapshot()
 
 
-def render_analytics_panel(sessions: dict):
-    """Render a full analytics dashboard in Streamlit."""
-    analytics = compute_analytics(sessions)
+def render_analytics_panel(sessions: dict, accumulator: Optional[AnalyticsAccumulator] = None):
+    """Render a full analytics dashboard in Streamlit. Pass an `accumulator` to skip full recomputation."""
+    if accumulator is not None:
+        accumulator.sync(sessions)
+        analytics = accumulator.snapshot()
+    else:
+        analytics = compute_analytics(sessions)
 
     st.markdown("""
     <h3 style="font-family:'Playfair Display',serif;color:#0D1B4B;margin-bottom:20px;">
@@ -580,11 +832,219 @@ def render_persona_selector() -> str:
 # FEATURE MODULE 6: CONVERSATION SEARCH
 # ──────────────────────────────────────────────────────────────────────────────
 
-def search_conversations(sessions: dict, query: str) -> List[Dict]:
-    """Search across all sessions for a query string."""
+_TOKEN_RE  = re.compile(r"\w+")
+_PHRASE_RE = re.compile(r'"([^"]+)"')
+
+
+def _make_snippet(content: str, query_lower: str) -> str:
+    """Cut a short snippet of `content` around the first match of `query_lower`."""
+    idx = max(0, content.lower().find(query_lower))
+    start = max(0, idx - 60)
+    end   = min(len(content), idx + 120)
+    return ("…" if start > 0 else "") + content[start:end] + ("…" if end < len(content) else "")
+
+
+class ConversationIndex:
+    """
+    Incrementally maintained inverted index over all chat sessions.
+    Messages are added as they are appended, so a search never rescans the
+    corpus. Every query term matches as a prefix, "quoted phrases" must
+    appear verbatim, and hits are ranked with BM25. Only the postings and
+    (session, msg_index) per message are kept; `fetch(session, msg_index)`
+    reads the text back for the hits actually returned. Thread-safe, so one
+    index can serve every browser session of an owner (see OwnerIndexes).
+    """
+
+    K1 = 1.2
+    B  = 0.75
+
+    def __init__(self, fetch: Callable[[Any, int], Optional[Mapping]]):
+        self.fetch = fetch
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Dict[int, int]] = {}   # token -> {doc_id: term freq}
+        self._docs: Dict[int, Tuple[Any, int]] = {}       # doc_id -> (session, msg_index)
+        self._doc_len: Dict[int, int] = {}
+        self._session_docs: Dict[Any, List[int]] = {}
+        self._indexed: Dict[Any, int] = {}                # session -> messages seen
+        self._vocab: List[str] = []
+        self._vocab_dirty = False
+        self._next_id = 0
+        self._total_len = 0
+
+    @classmethod
+    def from_sessions(cls, sessions: Mapping) -> "ConversationIndex":
+        index = cls(lambda session, i: sessions[session][i])
+        index.sync(sessions)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def add_message(self, session: Any, msg_index: int, msg: Mapping):
+        """Index one message. Call this whenever a message is appended; already indexed ones are skipped."""
+        with self._lock:
+            if msg_index < self._indexed.get(session, 0):
+                return
+            self._indexed[session] = msg_index + 1
+            self._session_docs.setdefault(session, [])
+            content = msg.get("content", "")
+            if not isinstance(content, str):
+                return
+
+            doc_id = self._next_id
+            self._next_id += 1
+            tokens = _TOKEN_RE.findall(content.lower())
+            self._docs[doc_id] = (session, msg_index)
+            self._doc_len[doc_id] = len(tokens)
+            self._total_len += len(tokens)
+            self._session_docs[session].append(doc_id)
+
+            for tok, tf in Counter(tokens).items():
+                posting = self._postings.get(tok)
+                if posting is None:
+                    posting = self._postings[tok] = {}
+                    self._vocab_dirty = True
+                posting[doc_id] = tf
+
+    def add_messages(self, messages):
+        """Index (session, msg_index, msg) triples, e.g. SessionStore.iter_messages(), under one lock."""
+        with self._lock:
+            for session, msg_index, msg in messages:
+                self.add_message(session, msg_index, msg)
+
+    def sync(self, sessions: Mapping):
+        """Index any messages not seen yet and drop sessions that no longer exist."""
+        with self._lock:
+            for session in [s for s in self._indexed if s not in sessions]:
+                self.remove_session(session)
+            for session, history in sessions.items():
+                for i in range(self._indexed.get(session, 0), len(history)):
+                    self.add_message(session, i, history[i])
+
+    def remove_session(self, session: Any):
+        """Forget every message of a session. Walks the postings once, so meant for deletes, not hot paths."""
+        with self._lock:
+            self._indexed.pop(session, None)
+            dead = set(self._session_docs.pop(session, []))
+            if not dead:
+                return
+            for doc_id in dead:
+                del self._docs[doc_id]
+                self._total_len -= self._doc_len.pop(doc_id)
+            for tok in list(self._postings):
+                posting = self._postings[tok]
+                for doc_id in dead.intersection(posting):
+                    del posting[doc_id]
+                if not posting:
+                    del self._postings[tok]
+                    self._vocab_dirty = True
+
+    def _expand(self, prefix: str) -> List[str]:
+        """All indexed tokens starting with `prefix`, via bisect on the sorted vocabulary."""
+        if self._vocab_dirty:
+            self._vocab = sorted(self._postings)
+            self._vocab_dirty = False
+        lo = bisect.bisect_left(self._vocab, prefix)
+        hi = bisect.bisect_left(self._vocab, prefix + "\U0010FFFF")
+        return self._vocab[lo:hi]
+
+    def _rank(self, terms: List[str], limit: Optional[int]) -> List[Tuple[float, Any, int]]:
+        """(score, session, msg_index) of the documents matching every term, best first (top `limit`)."""
+        # Gather (and score) candidates, starting from the rarest term so the
+        # intersection shrinks as fast as possible.
+        n_docs = len(self._docs)
+        avg_len = self._total_len / n_docs or 1.0
+        expanded = []
+        for term in dict.fromkeys(terms):
+            matches = self._expand(term)
+            if not matches:
+                return []
+            expanded.append(matches)
+        expanded.sort(key=lambda m: sum(len(self._postings[t]) for t in m))
+
+        candidates: Optional[set] = None
+        for matches in expanded:
+            docs = set()
+            for tok in matches:
+                docs.update(self._postings[tok])
+            candidates = docs if candidates is None else candidates & docs
+            if not candidates:
+                return []
+
+        scores: Dict[int, float] = dict.fromkeys(candidates, 0.0)
+        doc_len = self._doc_len
+        norm_base  = self.K1 * (1 - self.B)
+        norm_scale = self.K1 * self.B / avg_len
+        for matches in expanded:
+            for tok in matches:
+                posting = self._postings[tok]
+                df = len(posting)
+                weight = math.log(1 + (n_docs - df + 0.5) / (df + 0.5)) * (self.K1 + 1)
+                for doc_id, tf in posting.items():
+                    if doc_id in scores:
+                        scores[doc_id] += weight * tf / (tf + norm_base + norm_scale * doc_len[doc_id])
+
+        if limit is None:
+            ranked = sorted(scores, key=lambda d: (-scores[d], d))
+        else:
+            ranked = heapq.nsmallest(limit, scores, key=lambda d: (-scores[d], d))
+        return [(scores[d], *self._docs[d]) for d in ranked]
+
+    def search(self, query: str, limit: int = 20) -> List[Dict]:
+        """Return up to `limit` ranked hits in the same shape as search_conversations."""
+        query_lower = query.lower().strip()
+        phrases = [p.strip() for p in _PHRASE_RE.findall(query_lower) if p.strip()]
+        terms = _TOKEN_RE.findall(_PHRASE_RE.sub(" ", query_lower))
+        for phrase in phrases:
+            terms.extend(_TOKEN_RE.findall(phrase))
+        if not terms:
+            return []
+        with self._lock:
+            if not self._docs:
+                return []
+            # Only a phrase filter can reject hits, so without one a top-k heap is
+            # enough; with one, walk the ranking until `limit` hits pass the check.
+            ranked = self._rank(terms, None if phrases else limit)
+
+        # Text is read back only for the hits walked here, outside the lock
+        snippet_key = phrases[0] if phrases else terms[0]
+        results = []
+        for score, session, msg_index in ranked:
+            msg = self.fetch(session, msg_index)
+            if msg is None:
+                continue
+            content = msg.get("content", "")
+            if phrases:
+                content_lower = content.lower()
+                if not all(p in content_lower for p in phrases):
+                    continue
+            results.append({
+                "session": session,
+                "msg_index": msg_index,
+                "role": msg.get("role", "user"),
+                "snippet": _make_snippet(content, snippet_key),
+                "ts": msg.get("ts", ""),
+                "score": round(score, 3),
+            })
+            if len(results) >= limit:
+                break
+        return results
+
+
+def search_conversations(sessions: dict, query: str, index: Optional[ConversationIndex] = None,
+                         limit: int = 20) -> List[Dict]:
+    """
+    Search across all sessions for a query string.
+    With an `index` (kept current by the append/delete hooks, never synced
+    here), results come ranked from the inverted index; otherwise the
+    sessions are scanned in order until `limit` matches are found.
+    """
     if not query or len(query) < 2:
         return []
 
+    if index is not None:
+        return index.search(query, limit=limit)
+
     results = []
     query_lower = query.lower()
 
@@ -594,30 +1054,98 @@ def search_conversations(sessions: dict, query: str) -> List[Dict]:
             if not isinstance(content, str):
                 continue
             if query_lower in content.lower():
-                # Extract snippet around match
-                idx = content.lower().find(query_lower)
-                start = max(0, idx - 60)
-                end   = min(len(content), idx + 120)
-                snippet = ("…" if start > 0 else "") + content[start:end] + ("…" if end < len(content) else "")
-
                 results.append({
                     "session": session_name,
                     "msg_index": i,
                     "role": msg.get("role", "user"),
-                    "snippet": snippet,
+                    "snippet": _make_snippet(content, query_lower),
                     "ts": msg.get("ts", ""),
                 })
+                if len(results) >= limit:
+                    return results
 
-    return results[:20]  # Max 20 results
+    return results
 
 
-def render_search_panel(sessions: dict):
+OWNER_INDEX_LIMIT = int(os.environ.get("HEXALOY_OWNER_INDEXES", "64"))   # owners whose indexes stay in memory
+
+
+class OwnerIndexes:
+    """
+    Each owner's search index and retrieval memory, each built once from the
+    SessionStore on first use and shared by all of that owner's browser
+    sessions. The app reports appends and
+    deletes through add_message() / remove_session(), which only touch
+    indexes already built; the least recently used owners beyond `limit`
+    are dropped and rebuilt from the store on their next search.
+    """
+
+    def __init__(self, store: "SessionStore", limit: int = OWNER_INDEX_LIMIT):
+        self.store = store
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._search: "OrderedDict[str, ConversationIndex]" = OrderedDict()
+        self._memory: "OrderedDict[str, RetrievalMemory]" = OrderedDict()
+
+    def _get(self, table: "OrderedDict[str, Any]", owner: str, create: Callable[[], Any]):
+        with self._lock:
+            index = table.get(owner)
+            if index is not None:
+                table.move_to_end(owner)
+                return index
+            index = table[owner] = create()
+            while len(table) > self.limit:
+                table.popitem(last=False)
+            index._lock.acquire()           # hooks and searches for this owner wait until it is filled
+        try:
+            index.add_messages(self.store.iter_messages(owner))
+        finally:
+            index._lock.release()
+        return index
+
+    def _built(self, owner: str) -> list:
+        with self._lock:
+            return [i for i in (self._search.get(owner), self._memory.get(owner)) if i is not None]
+
+    def search_index(self, owner: str) -> ConversationIndex:
+        return self._get(self._search, owner, lambda: ConversationIndex(self.store.load_message))
+
+    def retrieval_memory(self, owner: str) -> "RetrievalMemory":
+        return self._get(self._memory, owner,
+                         lambda: RetrievalMemory(self.store.load_message, title=self.store.session_title))
+
+    def add_message(self, owner: str, session_id: int, msg_index: int, msg: Mapping):
+        """Index a message just appended to `session_id`."""
+        for index in self._built(owner):
+            index.add_message(session_id, msg_index, msg)
+
+    def remove_session(self, owner: str, session_id: int):
+        """Forget a deleted session."""
+        for index in self._built(owner):
+            index.remove_session(session_id)
+
+    def transfer_owner(self, old: str, new: str):
+        """Follow SessionStore.transfer_owner(): session ids are unchanged, so the indexes just move."""
+        with self._lock:
+            for table in (self._search, self._memory):
+                if old in table:
+                    table[new] = table.pop(old)
+
+
+@st.cache_resource
+def get_owner_indexes() -> OwnerIndexes:
+    """One OwnerIndexes per process, over the shared SessionStore."""
+    return OwnerIndexes(get_session_store())
+
+
+def render_search_panel(sessions: dict, index: Optional[ConversationIndex] = None):
     """Render conversation search UI."""
     st.markdown("#### 🔍 Search Conversations")
     query = st.text_input("Search across all chats", placeholder="Type to search…", key="search_query")
 
     if query:
-        results = search_conversations(sessions, query)
+        # A shared index may know chats created in another tab since this one listed its sessions
+        results = [r for r in search_conversations(sessions, query, index=index) if r["session"] in sessions]
         if results:
             st.markdown(f"*Found {len(results)} result(s) for **\"{query}\"***")
             for r in results:
@@ -631,7 +1159,7 @@ def render_search_panel(sessions: dict):
                     border-radius:10px; padding:12px 16px; margin-bottom:8px;
                 ">
                     <div style="font-size:0.72rem;color:#7A8BB0;margin-bottom:4px;">
-                        {emoji} {r['role'].title()} · {r['session']} {' · ' + r['ts'] if r['ts'] else ''}
+                        {emoji} {r['role'].title()} · {session_title(sessions, r['session'])} {' · ' + r['ts'] if r['ts'] else ''}
                     </div>
                     <div style="font-size:0.88rem;color:#0D1B4B;line-height:1.5;">{highlighted}</div>
                 </div>
@@ -783,16 +1311,8 @@ def render_chat_insights(history: list):
 # ──────────────────────────────────────────────────────────────────────────────
 
 def show_toast(message: str, emoji: str = "✦", duration: int = 3):
-    """Display a toast notification."""
-    placeholder = st.empty()
-    placeholder.markdown(f"""
-    <div class="toast">
-        <span style="font-size:1.1rem;">{emoji}</span>
-        <span>{message}</span>
-    </div>
-    """, unsafe_allow_html=True)
-    time.sleep(duration)
-    placeholder.empty()
+    """Display a toast notification. The browser dismisses it after `duration` seconds; the script doesn't wait."""
+    st.toast(f"{emoji} {message}", duration=duration)
 
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -839,6 +1359,10 @@ def generate_theme_css(theme_vars: dict) -> str:
     return f"<style>:root {{\n{vars_str}\n}}</style>"
 
 
+# Built once at import rather than on every rerun
+THEME_CSS = {name: generate_theme_css(preset) for name, preset in THEME_PRESETS.items()}
+
+
 def render_theme_selector() -> str:
     """Render theme selector. Returns CSS override string."""
     theme_name = st.selectbox(
@@ -846,8 +1370,7 @@ def render_theme_selector() -> str:
         list(THEME_PRESETS.keys()),
         key="theme_selector"
     )
-    preset = THEME_PRESETS[theme_name]
-    return generate_theme_css(preset)
+    return THEME_CSS[theme_name]
 
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -865,18 +1388,26 @@ def compress_history(history: list, max_messages: int = 20, max_chars: int = 120
     # Keep the last N messages
     recent = history[-max_messages:]
 
-    # Calculate total chars
-    total_chars = sum(len(str(m.get("content", ""))) for m in recent)
+    # Longest suffix within max_chars: bisect on the running total from the newest message back
+    newest_first = itertools.accumulate(len(str(m.get("content", ""))) for m in reversed(recent))
+    keep = bisect.bisect_right(list(newest_first), max_chars)
+    return recent[len(recent) - keep:]
+
 
-    if total_chars <= max_chars:
-        return recent
+def _topic_digest(messages, max_topics: int = 3) -> str:
+    topics = []
+    for msg in messages:
+        if msg.get("role") == "user":
+            content = str(msg.get("content", ""))
+            if content:
+                topics.append(content[:50] + "…" if len(content) > 50 else content)
+                if len(topics) >= max_topics:
+                    break
 
-    # Further trim if still too long
-    while recent and total_chars > max_chars:
-        removed = recent.pop(0)
-        total_chars -= len(str(removed.get("content", "")))
+    if not topics:
+        return ""
 
-    return recent
+    return f"[Earlier context: discussed {'; '.join(topics)}]"
 
 
 def build_context_summary(history: list) -> str:
@@ -884,18 +1415,160 @@ def build_context_summary(history: list) -> str:
     if len(history) < 6:
         return ""
 
-    older = history[:-4]
-    topics = []
-    for msg in older:
-        if msg.get("role") == "user":
-            content = str(msg.get("content", ""))
-            if content:
-                topics.append(content[:50] + "…" if len(content) > 50 else content)
+    return _topic_digest(history[:-4])
 
-    if not topics:
-        return ""
 
-    return f"[Earlier context: discussed {'; '.join(topics[:3])}]"
+# Both Groq models use the Llama 3 tokenizer. Without shipping its vocabulary we
+# split text with the same pre-tokenizer pattern and charge each piece by its
+# UTF-8 length. That is an estimate, not a bound: rare words split into more
+# pieces than it charges (" hexaloy" counts 2, the tokenizer makes 3), so the
+# hard context-window cap keeps TOKEN_ESTIMATE_MARGIN of it unused.
+MODEL_PROFILES = {
+    "llama-3.3-70b-versatile": {
+        "tokenizer": "llama3", "context_window": 131072, "message_overhead": 4, "image_tokens": 0,
+    },
+    "llama-3.2-11b-vision-preview": {
+        "tokenizer": "llama3", "context_window": 8192, "message_overhead": 4, "image_tokens": 1601,
+    },
+    "llama-3.1-8b-instant": {
+        "tokenizer": "llama3", "context_window": 131072, "message_overhead": 4, "image_tokens": 0,
+    },
+}
+DEFAULT_MODEL_PROFILE = {"tokenizer": "llama3", "context_window": 8192, "message_overhead": 4, "image_tokens": 1601}
+
+DEFAULT_CONTEXT_BUDGET = 6000      # tokens of prompt (system + history) per request
+REPLY_TOKEN_RESERVE    = 1024      # kept free in the context window for the answer
+TOKEN_ESTIMATE_MARGIN  = 0.15      # share of the context window left for count_tokens() undercounting
+MAX_CONTEXT_TURNS      = 100       # newest messages considered before folding into the digest
+
+_LLAMA3_PRETOKEN_RE = re.compile(
+    r"(?i:'s|'t|'re|'ve|'m|'ll|'d)"
+    r"|(?:[^\r\n\w]|_)?[^\W\d_]+"
+    r"|\d{1,3}"
+    r"| ?(?:[^\w\s]|_)+[\r\n]*"
+    r"|\s*[\r\n]+"
+    r"|\s+(?!\S)"
+    r"|\s+"
+)
+
+
+def _count_llama3(text: str) -> int:
+    tokens = 0
+    for piece in _LLAMA3_PRETOKEN_RE.findall(text):
+        if piece.isascii():
+            tokens += 1 + (len(piece) - 1) // 6     # common words are one token, long ones split
+        else:
+            tokens += max(1, len(piece.encode("utf-8")) // 3)
+    return tokens
+
+
+TOKENIZERS = {
+    "llama3": _count_llama3,
+}
+
+
+def get_model_profile(model: str) -> dict:
+    return MODEL_PROFILES.get(model, DEFAULT_MODEL_PROFILE)
+
+
+@functools.lru_cache(maxsize=8192)
+def count_tokens(text: str, model: str = "llama-3.3-70b-versatile") -> int:
+    """Estimated prompt tokens for `text` under `model`'s tokenizer."""
+    return TOKENIZERS[get_model_profile(model)["tokenizer"]](text)
+
+
+def _message_text(msg: dict) -> str:
+    content = msg.get("content", "")
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):   # multimodal parts: keep the text ones
+        return " ".join(p.get("text", "") for p in content if isinstance(p, dict))
+    return str(content)
+
+
+def count_message_tokens(messages: List[dict], model: str) -> int:
+    """Estimated prompt tokens for a full chat.completions `messages` list."""
+    profile = get_model_profile(model)
+    total = 0
+    for msg in messages:
+        total += profile["message_overhead"] + count_tokens(_message_text(msg), model)
+        if not isinstance(msg.get("content"), str):
+            total += profile["image_tokens"] * sum(
+                1 for p in msg.get("content") or [] if isinstance(p, dict) and p.get("type") == "image_url"
+            )
+    return total
+
+
+def _truncate_to_tokens(text: str, max_tokens: int, model: str) -> str:
+    """Longest prefix of `text` (plus an ellipsis) that fits in `max_tokens`."""
+    if count_tokens(text, model) <= max_tokens:
+        return text
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count_tokens(text[:mid] + "…", model) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo] + "…" if lo else ""
+
+
+def build_context_window(history: Sequence, system_prompt: str, model: str,
+                         budget: int = DEFAULT_CONTEXT_BUDGET, reserve_for_reply: int = REPLY_TOKEN_RESERVE,
+                         extra_tokens: int = 0) -> Tuple[List[dict], int]:
+    """
+    Build the `messages` list for a completion request from a chat history
+    whose last entry is the new user turn.
+
+    The newest turns are kept while they fit in `budget` tokens (capped by the
+    model's context window less TOKEN_ESTIMATE_MARGIN and `reserve_for_reply`,
+    minus `extra_tokens`, e.g. for an attached image). Older turns are folded
+    into a one-line digest on the system prompt. Returns (messages, estimated prompt tokens); the
+    estimate never exceeds the budget, truncating an oversized system prompt
+    or new turn if it has to.
+    """
+    profile  = get_model_profile(model)
+    overhead = profile["message_overhead"]
+    window   = int(profile["context_window"] * (1 - TOKEN_ESTIMATE_MARGIN))
+    budget   = min(budget, window - reserve_for_reply) - extra_tokens
+    if budget < 4 * overhead:
+        raise ValueError(f"Context budget too small for {model}: {budget} tokens left after reserves")
+
+    n = len(history)
+    start = max(0, n - MAX_CONTEXT_TURNS)
+    turns = [{"role": m.get("role", "user"), "content": _message_text(m)} for m in history[start:]]
+    costs = [overhead + count_tokens(t["content"], model) for t in turns]
+    if overhead + count_tokens(system_prompt, model) > budget // 2:
+        system_prompt = _truncate_to_tokens(system_prompt, budget // 2 - overhead, model)
+    system_cost = overhead + count_tokens(system_prompt, model)
+    newest_first = list(itertools.accumulate(reversed(costs)))
+
+    def fit(available: int) -> int:
+        return bisect.bisect_right(newest_first, available)
+
+    keep = fit(budget - system_cost)
+    digest = ""
+    if keep < len(turns) or start:
+        digest = _topic_digest(itertools.chain(itertools.islice(history, start), turns[:len(turns) - keep]))
+        if digest:
+            digest_cost = overhead + count_tokens(system_prompt + "\n\n" + digest, model) - system_cost
+            keep_with_digest = fit(budget - system_cost - digest_cost)
+            if keep_with_digest:
+                keep, system_cost = keep_with_digest, system_cost + digest_cost
+            else:
+                digest = ""
+
+    kept = turns[len(turns) - keep:]
+    used = system_cost + (newest_first[keep - 1] if keep else 0)
+    if not kept and turns:
+        # Even the new turn alone is over budget: send as much of it as fits
+        room = budget - system_cost - overhead
+        newest = dict(turns[-1], content=_truncate_to_tokens(turns[-1]["content"], max(room, 0), model))
+        kept = [newest]
+        used = system_cost + overhead + count_tokens(newest["content"], model)
+
+    system = {"role": "system", "content": system_prompt + ("\n\n" + digest if digest else "")}
+    return [system] + kept, used + extra_tokens
 
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -903,24 +1576,23 @@ def build_context_summary(history: list) -> str:
 # ──────────────────────────────────────────────────────────────────────────────
 
 SENSITIVE_PATTERNS = [
-    r'\b(password|secret|api.?key|token|credential)\b',
-    r'\b\d{16}\b',  # Credit card pattern
-    r'\b\d{3}-\d{2}-\d{4}\b',  # SSN pattern
+    (r'\b(?:password|secret|api.?key|token|credential)\b',
+     "⚠️ Possible credentials detected — avoid sharing passwords or API keys"),
+    (r'\b\d{16}\b',              # Credit card pattern
+     "⚠️ Possible credit card number detected — do not share financial data"),
+    (r'\b\d{3}-\d{2}-\d{4}\b',   # SSN pattern
+     "⚠️ Possible personal ID number detected — protect your identity"),
 ]
 
+_SENSITIVE_RE = re.compile(
+    "|".join(f"(?P<s{i}>{pattern})" for i, (pattern, _) in enumerate(SENSITIVE_PATTERNS)), re.IGNORECASE
+)
+
 
 def check_sensitive_content(text: str) -> List[str]:
     """Detect potentially sensitive information in user input."""
-    warnings = []
-    for pattern in SENSITIVE_PATTERNS:
-        if re.search(pattern, text, re.IGNORECASE):
-            if 'password' in pattern or 'key' in pattern:
-                warnings.append("⚠️ Possible credentials detected — avoid sharing passwords or API keys")
-            elif r'\d{16}' in pattern:
-                warnings.append("⚠️ Possible credit card number detected — do not share financial data")
-            elif 'SSN' in pattern or r'\d{3}-\d{2}' in pattern:
-                warnings.append("⚠️ Possible personal ID number detected — protect your identity")
-    return warnings
+    found = {int(m.lastgroup[1:]) for m in _SENSITIVE_RE.finditer(text)}
+    return [SENSITIVE_PATTERNS[i][1] for i in sorted(found)]
 
 
 def render_safety_warnings(text: str):
@@ -1012,50 +1684,3692 @@ def render_onboarding_tips():
 
 
 # ──────────────────────────────────────────────────────────────────────────────
-# MODULE EXPORTS / USAGE REFERENCE
+# FEATURE MODULE 16: PERSISTENT SESSION STORE (SQLite)
 # ──────────────────────────────────────────────────────────────────────────────
+
+SESSION_DB_PATH = os.environ.get("HEXALOY_DB_PATH", "hexaloy_sessions.db")
+MESSAGE_PAGE_SIZE = 200
+
+_SESSION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id            INTEGER PRIMARY KEY,
+    owner         TEXT    NOT NULL,
+    title         TEXT    NOT NULL,
+    created       REAL    NOT NULL,
+    updated       REAL    NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS sessions_owner ON sessions (owner, id);
+CREATE INDEX IF NOT EXISTS sessions_owner_updated ON sessions (owner, updated);
+CREATE TABLE IF NOT EXISTS messages (
+    session_id INTEGER NOT NULL REFERENCES sessions (id) ON DELETE CASCADE,
+    seq        INTEGER NOT NULL,
+    role       TEXT    NOT NULL,
+    content    TEXT,
+    ts         TEXT,
+    model      TEXT,
+    extra      TEXT,
+    PRIMARY KEY (session_id, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS owner_state (
+    owner TEXT NOT NULL,
+    name  TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (owner, name)
+) WITHOUT ROWID;
 """
-INTEGRATION GUIDE — hexaloy_features.py
-==========================================
 
-To integrate these features into your main app.py:
+_MESSAGE_COLUMNS = ("role", "content", "ts", "model")
+_MISSING = object()
 
-    from hexaloy_features import (
-        inject_keyboard_shortcuts,
-        render_export_panel,
-        render_analytics_panel,
-        render_prompt_templates_panel,
-        render_persona_selector,
-        render_search_panel,
-        render_response_actions,
-        render_image_settings,
-        render_chat_insights,
-        show_toast,
-        render_theme_selector,
-        compress_history,
-        render_safety_warnings,
-        render_inspiration_widget,
-        render_onboarding_tips,
-        build_enhanced_image_prompt,
-    )
 
-Usage examples:
+class Message(Mapping):
+    """
+    One chat message, stored compactly: slots instead of a dict, role and
+    model interned (one string object per distinct value in the process),
+    and any other keys (metrics, image_key, ...) in a dict only when there
+    are some. The timestamp is kept as read from the store, so it is never
+    reformatted on access. Reads like the message dict it replaces, so
+    `msg["role"]`, `msg.get("ts", "")` and `{**msg}` keep working.
+    Immutable: assigning an attribute raises AttributeError; use `dict(msg)`
+    for an editable copy.
+    """
 
-    # At the top of your app, inject JS enhancements:
-    inject_keyboard_shortcuts()
+    __slots__ = ("role", "content", "ts", "model", "_extra")
+
+    def __init__(self, role: str = "user", content: Any = "", ts: Any = None,
+                 model: Optional[str] = None, extra: Optional[Dict[str, Any]] = None):
+        init = object.__setattr__
+        init(self, "role", sys.intern(role))
+        init(self, "content", content)
+        init(self, "ts", ts)
+        init(self, "model", sys.intern(model) if model is not None else None)
+        init(self, "_extra", extra or None)
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError("Message is immutable; use dict(msg) for an editable copy")
+
+    def __delattr__(self, name: str):
+        raise AttributeError("Message is immutable; use dict(msg) for an editable copy")
+
+    def __reduce__(self):
+        return (Message, (self.role, self.content, self.ts, self.model, self._extra))
+
+    @classmethod
+    def from_dict(cls, msg: Mapping) -> "Message":
+        if isinstance(msg, Message):
+            return msg
+        extra = {k: v for k, v in msg.items() if k not in _MESSAGE_COLUMNS}
+        return cls(msg.get("role", "user"), msg.get("content", ""), msg.get("ts"), msg.get("model"), extra)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key == "role":
+            return self.role
+        if key == "content":
+            return self.content
+        if key == "ts" and self.ts is not None:
+            return self.ts
+        if key == "model" and self.model is not None:
+            return self.model
+        return self._extra.get(key, default) if self._extra else default
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __iter__(self):
+        yield "role"
+        yield "content"
+        if self.ts is not None:
+            yield "ts"
+        if self.model is not None:
+            yield "model"
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return 2 + (self.ts is not None) + (self.model is not None) + len(self._extra or ())
+
+    def __repr__(self) -> str:
+        return f"Message({dict(self)!r})"
+
+
+def _message_to_row(session_id: int, seq: int, msg: dict) -> tuple:
+    """Flatten a message dict into a `messages` row; unknown keys go to `extra` as JSON."""
+    extra = {k: v for k, v in msg.items() if k not in _MESSAGE_COLUMNS}
+    content = msg.get("content", "")
+    if not isinstance(content, str):
+        extra["content"] = content
+        content = None
+    return (session_id, seq, msg.get("role", "user"), content, msg.get("ts"), msg.get("model"),
+            json.dumps(extra, ensure_ascii=False) if extra else None)
+
+
+def _row_to_message(row: tuple) -> Message:
+    role, content, ts, model, extra = row
+    extra = json.loads(extra) if extra else None
+    if extra and "content" in extra:
+        content = extra.pop("content")
+    return Message(role, content, ts, model, extra)
+
+
+class SessionStore:
+    """
+    SQLite-backed chat history shared by every browser session of the process.
+    Runs in WAL mode so readers never block the writer; every write is one
+    transaction, so appending a finished streamed answer costs a single commit.
+    """
 
-    # In sidebar for theme:
-    theme_css = render_theme_selector()
-    st.markdown(theme_css, unsafe_allow_html=True)
+    def __init__(self, path: str = SESSION_DB_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(_SESSION_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def list_sessions(self, owner: str) -> List[Tuple[int, str, int]]:
+        """(id, title, message_count) for every session of `owner`, oldest first. No message bodies."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, title, message_count FROM sessions WHERE owner = ? ORDER BY id", (owner,)
+            ).fetchall()
+
+    def recent_sessions(self, owner: str, prefix: str = "", limit: int = 20,
+                        offset: int = 0) -> Tuple[int, List[Tuple[int, str, int, float]]]:
+        """
+        One page of (id, title, message_count, updated) for `owner`, most
+        recently active first, optionally only titles starting with `prefix`
+        (case-insensitive). Returns (total matching, page).
+        """
+        where, args = "owner = ?", [owner]
+        if prefix:
+            escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            where += " AND title LIKE ? ESCAPE '\\'"
+            args.append(escaped + "%")
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM sessions WHERE {where}", args).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT id, title, message_count, updated FROM sessions WHERE {where} "
+                "ORDER BY updated DESC, id DESC LIMIT ? OFFSET ?", args + [limit, offset],
+            ).fetchall()
+        return total, rows
+
+    def create_session(self, owner: str, title: str) -> int:
+        now = time.time()
+        with self._lock, self._conn:
+            cur = self._conn.execute(
+                "INSERT INTO sessions (owner, title, created, updated) VALUES (?, ?, ?, ?)",
+                (owner, title, now, now),
+            )
+            return cur.lastrowid
+
+    def rename_session(self, session_id: int, title: str):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE sessions SET title = ? WHERE id = ?", (title, session_id))
+
+    def delete_session(self, session_id: int):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def transfer_owner(self, old: str, new: str):
+        """Move every session and saved state of `old` to `new`, e.g. when a link token is rotated."""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE sessions SET owner = ? WHERE owner = ?", (new, old))
+            self._conn.execute("UPDATE owner_state SET owner = ? WHERE owner = ?", (new, old))
+
+    def message_count(self, session_id: int) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT message_count FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return row[0] if row else 0
+
+    def load_messages(self, session_id: int, offset: int = 0, limit: Optional[int] = None) -> List[Message]:
+        """Load messages `offset` .. `offset + limit` of a session in order."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT role, content, ts, model, extra FROM messages "
+                "WHERE session_id = ? AND seq >= ? ORDER BY seq LIMIT ?",
+                (session_id, offset, -1 if limit is None else limit),
+            ).fetchall()
+        return [_row_to_message(r) for r in rows]
+
+    def load_message(self, session_id: int, index: int) -> Optional[Message]:
+        """Message `index` of a session, or None if it has no such message."""
+        messages = self.load_messages(session_id, offset=index, limit=1)
+        return messages[0] if messages else None
+
+    def iter_messages(self, owner: str) -> Generator[Tuple[int, int, Message], None, None]:
+        """(session id, index, message) for every message of `owner`, read a page at a time."""
+        for session_id, _, count in self.list_sessions(owner):
+            for offset in range(0, count, MESSAGE_PAGE_SIZE):
+                for i, msg in enumerate(self.load_messages(session_id, offset, MESSAGE_PAGE_SIZE), offset):
+                    yield session_id, i, msg
+
+    def session_title(self, session_id: int) -> str:
+        with self._lock:
+            row = self._conn.execute("SELECT title FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return row[0] if row else str(session_id)
+
+    def append_messages(self, session_id: int, messages: List[Mapping]) -> int:
+        """Append messages in one transaction. Returns the new message count."""
+        with self._lock, self._conn:
+            count = self._conn.execute(
+                "SELECT message_count FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()[0]
+            self._conn.executemany(
+                "INSERT INTO messages (session_id, seq, role, content, ts, model, extra) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [_message_to_row(session_id, count + i, m) for i, m in enumerate(messages)],
+            )
+            count += len(messages)
+            self._conn.execute(
+                "UPDATE sessions SET message_count = ?, updated = ? WHERE id = ?",
+                (count, time.time(), session_id),
+            )
+        return count
+
+    def save_state(self, owner: str, name: str, value: str):
+        """Store a named blob (e.g. serialized analytics) for `owner`."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO owner_state (owner, name, value) VALUES (?, ?, ?)", (owner, name, value)
+            )
+
+    def load_state(self, owner: str, name: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM owner_state WHERE owner = ? AND name = ?", (owner, name)
+            ).fetchone()
+        return row[0] if row else None
+
+
+@st.cache_resource
+def get_session_store(path: str = SESSION_DB_PATH) -> SessionStore:
+    """One SessionStore per process, shared across reruns and browser sessions."""
+    return SessionStore(path)
+
+
+class StoredHistory(Sequence):
+    """
+    A session's messages, paged in from the store on first access as
+    compact Message records. Behaves like the plain list it replaces;
+    `append`/`extend` take message dicts and write through.
+    """
 
-    # In sidebar for persona:
-    system_prompt = render_persona_selector()
+    def __init__(self, store: SessionStore, session_id: int, count: Optional[int] = None):
+        self.store = store
+        self.session_id = session_id
+        self._count = store.message_count(session_id) if count is None else count
+        self._pages: Dict[int, List[Message]] = {}
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _page(self, page: int) -> List[Message]:
+        if page not in self._pages:
+            offset = page * MESSAGE_PAGE_SIZE      # never past len(self): a snapshot ignores later appends
+            self._pages[page] = self.store.load_messages(
+                self.session_id, offset=offset, limit=min(MESSAGE_PAGE_SIZE, self._count - offset)
+            )
+        return self._pages[page]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._count))]
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("message index out of range")
+        return self._page(i // MESSAGE_PAGE_SIZE)[i % MESSAGE_PAGE_SIZE]
+
+    def __iter__(self):
+        for page in range((self._count + MESSAGE_PAGE_SIZE - 1) // MESSAGE_PAGE_SIZE):
+            yield from self._page(page)
+
+    def snapshot(self) -> "StoredHistory":
+        """The messages so far as a separate history with its own page cache, safe to read from another thread."""
+        return StoredHistory(self.store, self.session_id, self._count)
+
+    def append(self, msg: Mapping):
+        self.extend([msg])
+
+    def extend(self, messages: List[Mapping]):
+        messages = [Message.from_dict(m) for m in messages]
+        if not messages:
+            return
+        self.store.append_messages(self.session_id, messages)
+        for msg in messages:
+            page, offset = divmod(self._count, MESSAGE_PAGE_SIZE)
+            if offset == 0:
+                self._pages[page] = []
+            if page in self._pages:
+                self._pages[page].append(msg)
+            self._count += 1
+
+
+class StoredSessions(Mapping):
+    """
+    Drop-in for the `{session: [messages]}` dict kept in st.session_state,
+    keyed by session id; titles are display-only (title()) and kept unique
+    per owner. Only titles and counts are read up front; message bodies are
+    paged in when a session is actually opened.
+    """
 
-    # In sidebar for search:
-    render_search_panel(st.session_state.sessions)
+    MAX_OPEN = 8
+
+    def __init__(self, store: SessionStore, owner: str):
+        self.store = store
+        self.owner = owner
+        self._titles: Dict[int, str] = {}
+        self._counts: Dict[int, int] = {}
+        self._open: Dict[int, StoredHistory] = {}
+        self.refresh()
+
+    def refresh(self):
+        """Re-read the session list (titles only) from the store."""
+        self._titles = {}
+        self._counts = {}
+        for session_id, title, count in self.store.list_sessions(self.owner):
+            self._titles[session_id] = title
+            self._counts[session_id] = count
+        self._open.clear()
+
+    def __len__(self) -> int:
+        return len(self._titles)
+
+    def __iter__(self):
+        return iter(self._titles)
+
+    def __contains__(self, session_id) -> bool:
+        return session_id in self._titles
+
+    def __getitem__(self, session_id: int) -> StoredHistory:
+        history = self._open.pop(session_id, None)
+        if history is None:
+            if session_id not in self._titles:
+                raise KeyError(session_id)
+            history = StoredHistory(self.store, session_id, self._counts.get(session_id))
+        self._open[session_id] = history          # most recently used last
+        while len(self._open) > self.MAX_OPEN:
+            evicted = self._open.pop(next(iter(self._open)))
+            self._counts[evicted.session_id] = len(evicted)
+        return history
 
-    # Before sending a message:
-    render_safety_warnings(user_input)
+    def title(self, session_id: int) -> str:
+        return self._titles[session_id]
+
+    def snapshot(self) -> Dict[str, StoredHistory]:
+        """
+        `{title: history}` as of now, sharing none of this object's caches,
+        so it can be read from another thread (e.g. a deferred download).
+        """
+        snapshot = {}
+        for session_id, title in self._titles.items():
+            opened = self._open.get(session_id)
+            count = len(opened) if opened is not None else self._counts.get(session_id)
+            snapshot[title] = StoredHistory(self.store, session_id, count)
+        return snapshot
+
+    def find(self, title: str) -> Optional[int]:
+        """Id of the session called `title`, if any."""
+        return next((i for i, t in self._titles.items() if t == title), None)
+
+    def _unique(self, title: str) -> str:
+        taken = set(self._titles.values())
+        candidate, n = title, 2
+        while candidate in taken:
+            candidate = f"{title} ({n})"
+            n += 1
+        return candidate
+
+    def create(self, title: str) -> int:
+        """Create an empty session with a (de-duplicated) `title` and return its id."""
+        title = self._unique(title)
+        session_id = self.store.create_session(self.owner, title)
+        self._titles[session_id] = title
+        self._counts[session_id] = 0
+        return session_id
+
+    def rename(self, session_id: int, title: str) -> str:
+        """Retitle a session and return the (de-duplicated) new title. Its id, and so its place, stay."""
+        if title == self._titles[session_id]:
+            return title
+        title = self._unique(title)
+        self.store.rename_session(session_id, title)
+        self._titles[session_id] = title
+        return title
+
+    def delete(self, session_id: int):
+        del self._titles[session_id]
+        self._counts.pop(session_id, None)
+        self._open.pop(session_id, None)
+        self.store.delete_session(session_id)
+
+
+def session_title(sessions: Mapping, session: Any) -> str:
+    """Display title of `session`: StoredSessions is keyed by id, a plain `{title: messages}` dict by title."""
+    title = getattr(sessions, "title", None)
+    return title(session) if title is not None else str(session)
+
+
+OWNER_PARAM = "u"               # query parameter with the history token when nobody is signed in
+OWNER_STATE_KEYS = ("owner", "sessions", "current_chat", "analytics")
+
+
+def signed_in_owner() -> Optional[str]:
+    """"user:<subject>" when the visitor signed in with st.login() (an [auth] secret is configured), else None."""
+    user = getattr(st, "user", None)
+    if user is None or not user.get("is_logged_in"):
+        return None
+    subject = user.get("sub") or user.get("email")
+    return f"user:{subject}" if subject else None
+
+
+def resolve_owner() -> Tuple[str, bool]:
+    """
+    The owner chat history is stored under, and whether it is a link token.
+    A signed-in visitor is identified by their account and nothing goes in
+    the URL. Otherwise history is keyed to a random token in the `?u=` query
+    parameter, so a bookmarked link survives restarts; anyone holding that
+    link can read the history, which render_owner_link_notice() says.
+    """
+    owner = signed_in_owner()
+    if owner:
+        return owner, False
+    if OWNER_PARAM not in st.query_params:
+        st.query_params[OWNER_PARAM] = secrets.token_urlsafe(16)
+    return st.query_params[OWNER_PARAM], True
+
+
+def _rotate_owner_token(store: SessionStore, old: str):
+    new = secrets.token_urlsafe(16)
+    store.transfer_owner(old, new)
+    get_owner_indexes().transfer_owner(old, new)
+    st.query_params[OWNER_PARAM] = new
+    for key in OWNER_STATE_KEYS:
+        st.session_state.pop(key, None)
+
+
+def render_owner_link_notice(store: SessionStore, owner: str):
+    """Warn that the page link gives access to the chat history, with a button to issue a new link."""
+    with st.expander("🔗 Private link"):
+        st.caption("Your chats are tied to the token in this page's address. Anyone you share or paste "
+                   "the link to can read them, so share answers with Export instead.")
+        st.button("🔄 Issue a new private link", key="rotate_owner_token", on_click=_rotate_owner_token,
+                  args=(store, owner), help="Moves your chats to a new token; the old link stops working. "
+                                            "Bookmark the new address.")
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# FEATURE MODULE 17: RESPONSE CACHE (LRU + TTL, optional disk tier)
+# ──────────────────────────────────────────────────────────────────────────────
+
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get("HEXALOY_CACHE_MB", "32")) * 1024 * 1024
+RESPONSE_CACHE_TTL       = int(os.environ.get("HEXALOY_CACHE_TTL", "3600"))    # seconds
+RESPONSE_CACHE_DISK_PATH = os.environ.get("HEXALOY_CACHE_PATH")                # unset = memory only
+
+_WS_RE = re.compile(r"\s+")
+
+
+def _normalize_for_key(content: Any) -> Any:
+    if isinstance(content, str):
+        return _WS_RE.sub(" ", content).strip()
+    return content
+
+
+def response_cache_key(model: str, messages: List[dict], temperature: float) -> str:
+    """
+    Canonical key for a completion request: model, temperature and every
+    message (system prompt/persona included) with whitespace normalized.
+    """
+    payload = json.dumps(
+        [model, round(float(temperature), 3),
+         [[m.get("role"), _normalize_for_key(m.get("content"))] for m in messages]],
+        ensure_ascii=False, separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def replay_chunks(text: str, chunk_words: int = 8) -> Generator[str, None, None]:
+    """Yield a cached answer in word-sized pieces so st.write_stream renders it like a live stream."""
+    pieces = re.findall(r"\S+\s*|\s+", text)
+    for i in range(0, len(pieces), chunk_words):
+        yield "".join(pieces[i:i + chunk_words])
+
+
+class ResponseCache:
+    """
+    Cache of finished answers keyed by response_cache_key().
+    Memory tier: LRU with a TTL and a cap on total answer bytes. Disk tier
+    (optional): an SQLite file that survives restarts and is consulted on a
+    memory miss. Thread-safe; one instance is shared by all sessions.
+    """
+
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_MAX_BYTES, ttl: float = RESPONSE_CACHE_TTL,
+                 disk_path: Optional[str] = RESPONSE_CACHE_DISK_PATH):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, str, float]]" = OrderedDict()  # key -> (expires, text, gen secs)
+        self._bytes = 0
+        self.hits = self.disk_hits = self.misses = self.evictions = 0
+        self.saved_seconds = 0.0
+        self.saved_tokens = 0
+        self._disk = None
+        if disk_path:
+            self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+            self._disk.execute("PRAGMA journal_mode=WAL")
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, expires REAL NOT NULL, text TEXT NOT NULL, gen_seconds REAL NOT NULL)"
+            )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _insert(self, key: str, expires: float, text: str, gen_seconds: float):
+        size = len(text.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old[1].encode("utf-8"))
+        self._entries[key] = (expires, text, gen_seconds)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, (_, evicted, _) = self._entries.popitem(last=False)
+            self._bytes -= len(evicted.encode("utf-8"))
+            self.evictions += 1
+
+    def get(self, key: str) -> Optional[str]:
+        """The cached answer for `key`, or None. Counts a hit or a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                self._bytes -= len(self._entries.pop(key)[1].encode("utf-8"))
+                entry = None
+            if entry is None and self._disk is not None:
+                row = self._disk.execute(
+                    "SELECT expires, text, gen_seconds FROM responses WHERE key = ? AND expires > ?", (key, now)
+                ).fetchone()
+                if row:
+                    self._insert(key, *row)
+                    entry = row
+                    self.disk_hits += 1
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += entry[2]
+            self.saved_tokens += count_tokens(entry[1])
+            return entry[1]
+
+    def put(self, key: str, text: str, gen_seconds: float = 0.0):
+        if not text:
+            return
+        expires = time.time() + self.ttl
+        with self._lock:
+            self._insert(key, expires, text, gen_seconds)
+            if self._disk is not None:
+                with self._disk:
+                    self._disk.execute("DELETE FROM responses WHERE expires <= ?", (time.time(),))
+                    self._disk.execute(
+                        "INSERT OR REPLACE INTO responses (key, expires, text, gen_seconds) VALUES (?, ?, ?, ?)",
+                        (key, expires, text, gen_seconds),
+                    )
+
+    def stream(self, key: str, produce) -> Generator[str, None, None]:
+        """
+        Yield the answer for `key`: replayed from the cache on a hit, otherwise
+        streamed from `produce()` and stored once it has finished. An answer
+        that was interrupted or failed is never cached.
+        """
+        text = self.get(key)
+        if text is not None:
+            yield from replay_chunks(text)
+            return
+        parts = []
+        t0 = time.perf_counter()
+        for piece in produce():
+            parts.append(piece)
+            yield piece
+        self.put(key, "".join(parts), time.perf_counter() - t0)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries":       len(self._entries),
+            "bytes":         self._bytes,
+            "hits":          self.hits,
+            "disk_hits":     self.disk_hits,
+            "misses":        self.misses,
+            "evictions":     self.evictions,
+            "hit_rate":      round(self.hits / lookups, 3) if lookups else 0.0,
+            "saved_seconds": round(self.saved_seconds, 2),
+            "saved_tokens":  self.saved_tokens,
+        }
+
+
+@st.cache_resource
+def get_response_cache() -> ResponseCache:
+    """One ResponseCache per process, shared by every browser session."""
+    return ResponseCache()
+
+
+def render_cache_stats(cache: ResponseCache, flights: Optional["SingleFlight"] = None,
+                       semantic: Optional["SemanticCache"] = None,
+                       prefetch: Optional["SpeculativePrefetcher"] = None):
+    """Small sidebar readout of cache (and, if given, shared-stream, semantic cache and prefetch) effectiveness."""
+    s = cache.stats()
+    st.caption(
+        f"⚡ Cache: {s['hits']} hits · {s['misses']} misses ({s['hit_rate']:.0%}) · "
+        f"~{s['saved_seconds']}s and ~{s['saved_tokens']:,} tokens saved"
+    )
+    if flights is not None and flights.joined:
+        f = flights.stats()
+        st.caption(f"🔀 Shared streams: {f['joined']} joins · fan-out {f['fan_out']}× (max {f['max_fan_out']})")
+    if semantic is not None and semantic.hits + semantic.misses:
+        m = semantic.stats()
+        st.caption(f"🧭 Similar questions: {m['hits']} reused ({m['hit_rate']:.0%}) · {m['lookup_ms']:.1f} ms lookups")
+    if prefetch is not None and prefetch.prefetched:
+        p = prefetch.stats()
+        st.caption(f"🔮 Prepared actions: {p['hits'] + p['joined']} of {p['prefetched']} used ({p['hit_rate']:.0%}) · "
+                   f"{p['wasted_tokens']:,} tokens wasted")
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# FEATURE MODULE 18: SHARED CLIENT & STATIC ASSETS (built once per process)
+# ──────────────────────────────────────────────────────────────────────────────
+
+GROQ_MAX_CONNECTIONS = 50
+GROQ_KEEPALIVE_CONNECTIONS = 20
+GROQ_KEEPALIVE_SECONDS = 60.0
+GROQ_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+
+APP_CSS = """
+    <style>
+    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700;800&display=swap');
+    html, body, [class*="css"] { font-family: 'Inter', sans-serif; background-color: #F8F9FA; color: #1E293B; }
+    #MainMenu {visibility: hidden;} footer {visibility: hidden;}
+
+    .stChatInputContainer { border-radius: 12px !important; border: 1px solid #CBD5E1 !important; background-color: #FFFFFF !important; box-shadow: 0 4px 6px -1px rgba(0, 0, 0, 0.05); }
+
+    div[data-testid="stChatMessage"] { border-radius: 12px; padding: 15px 20px; margin-bottom: 20px; }
+    div[data-testid="stChatMessage"]:nth-child(odd) { background-color: #F1F5F9 !important; border: 1px solid #E2E8F0 !important; color: #0F172A; }
+    div[data-testid="stChatMessage"]:nth-child(even) { background-color: #FFFFFF !important; border: 1px solid #E2E8F0 !important; box-shadow: 0 2px 4px rgba(0,0,0,0.02); color: #0F172A; }
+
+    section[data-testid="stSidebar"] { background-color: #FFFFFF; border-right: 1px solid #E2E8F0; }
+    .stButton>button { width: 100%; text-align: left; background-color: transparent; border: 1px solid transparent; padding: 10px 15px; border-radius: 8px; font-weight: 500; color: #475569; transition: 0.2s; }
+    .stButton>button:hover { background-color: #F1F5F9; color: #0F172A; border: 1px solid #CBD5E1; }
+
+    .new-chat-btn>div>button { background-color: #1A56A8; color: white; justify-content: center; font-weight: 600; margin-bottom: 20px; border-radius: 8px; }
+    .new-chat-btn>div>button:hover { background-color: #134282; color: white; }
+
+    .signature-box { margin-top: 40px; margin-bottom: 20px; padding: 15px; border-radius: 8px; background: #F8F9FA; border: 1px solid #E2E8F0; text-align: center; }
+    .signature-box p { margin: 0; font-size: 0.75rem; color: #64748B; text-transform: uppercase; letter-spacing: 1px; }
+    .signature-box h3 { margin: 5px 0 0 0; font-size: 1.1rem; color: #0F172A; font-weight: 700; }
+    </style>
+    """
+
+
+def _shrink_png(data: bytes, width: int) -> bytes:
+    """Downscale a PNG to `width` px wide; returns the input unchanged if that fails or isn't smaller."""
+    try:
+        from PIL import Image
+        img = Image.open(io.BytesIO(data))
+        if img.width > width:
+            img = img.resize((width, round(img.height * width / img.width)), Image.LANCZOS)
+        out = io.BytesIO()
+        img.save(out, format="PNG", optimize=True)
+        return out.getvalue() if out.tell() < len(data) else data
+    except Exception:
+        return data
+
+
+def _png_data_uri(data: bytes) -> str:
+    return f"data:image/png;base64,{base64.b64encode(data).decode()}"
+
+
+@st.cache_resource
+def load_static_assets(logo_path: str = "logo.png", user_avatar_path: str = "user.png") -> Dict[str, Any]:
+    """
+    Read, shrink and encode the images the page shows on every rerun, once.
+    The logo is shown at 50 px, so it is stored at 2x that as a data URI;
+    avatars are small PNG data URIs (or an emoji if the file is missing):
+    st.chat_message passes those straight through, where image bytes would
+    be decoded, hashed and registered as a media file for every message.
+    """
+    assets: Dict[str, Any] = {"logo_html": None, "assistant_avatar": "💠", "user_avatar": "🧑‍💼"}
+    try:
+        with open(logo_path, "rb") as f:
+            logo = f.read()
+    except FileNotFoundError:
+        logo = None
+    if logo is not None:
+        logo_base64 = base64.b64encode(_shrink_png(logo, 100)).decode()
+        assets["logo_html"] = f"""
+        <div style="display: flex; align-items: center; justify-content: center; margin-bottom: 25px; padding-top: 10px;">
+            <img src="data:image/png;base64,{logo_base64}" style="width: 50px; margin-right: 12px;">
+            <span style="font-family: 'Inter', sans-serif; font-size: 2.2rem; font-weight: 800; color: #2B5B9E; letter-spacing: 1.5px;">HEXALOY</span>
+        </div>
+        """
+        assets["assistant_avatar"] = _png_data_uri(_shrink_png(logo, 64))
+    try:
+        with open(user_avatar_path, "rb") as f:
+            assets["user_avatar"] = _png_data_uri(_shrink_png(f.read(), 64))
+    except FileNotFoundError:
+        pass
+    return assets
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# FEATURE MODULE 19: ASYNC STREAMING ENGINE (bounded queue, cancel, metrics)
+# ──────────────────────────────────────────────────────────────────────────────
+
+STREAM_QUEUE_SIZE = 64          # chunks buffered before the upstream read is paused
+STREAM_FLUSH_INTERVAL = 0.05    # seconds of chunks coalesced into one UI update
+STREAM_IDLE_POLL = 0.25         # how often the consumer wakes up while nothing arrives
+
+_STREAM_END = object()
+_STREAM_IDLE = object()
+
+
+@st.cache_resource
+def get_async_groq_client(api_key: str, base_url: Optional[str] = None) -> groq.AsyncGroq:
+    """
+    One Groq client per process (per API key and endpoint), shared by every
+    rerun and browser session and used on the streaming engine's event
+    loop, so the HTTPS connections to the API stay pooled and kept alive.
+    The SDK's own retries are off: RequestScheduler retries with backoff
+    and keeps the rate-limit buckets in step. `base_url` points it at
+    another Groq-compatible endpoint (the batch runner's --base-url).
+    """
+    http_client = groq.DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=GROQ_MAX_CONNECTIONS,
+            max_keepalive_connections=GROQ_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=GROQ_KEEPALIVE_SECONDS,
+        ),
+        timeout=GROQ_TIMEOUT,
+    )
+    return groq.AsyncGroq(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+
+
+async def groq_text_stream(client: groq.AsyncGroq, **request) -> AsyncIterator[str]:
+    """Yield the text deltas of a streamed chat completion; the HTTP response is closed on exit or cancel."""
+    stream = await client.chat.completions.create(stream=True, **request)
+    try:
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        await stream.close()
+
+
+class ResponseStream:
+    """
+    Handle on one in-flight completion. The producer runs on the engine's
+    event loop and fills a bounded queue; the Streamlit thread drains it in
+    coalesced batches via batches(). cancel() stops the upstream request.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, queue_size: int):
+        self._loop = loop
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._task: Optional[asyncio.Task] = None
+        self._getter: Optional[asyncio.Future] = None
+        self.text = ""
+        self.error: Optional[BaseException] = None
+        self.done = False
+        self.cancelled = False
+        self.started = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    async def _pump(self, open_stream: Callable[[], AsyncIterator[str]]):
+        try:
+            async for piece in open_stream():
+                if self.first_token_at is None:
+                    self.first_token_at = time.perf_counter()
+                await self._queue.put(piece)        # waits while the UI is behind
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished_at = time.perf_counter()
+        await self._queue.put(_STREAM_END)
+
+    async def _get(self, timeout: float):
+        """Next queue item, or _STREAM_IDLE after `timeout`. The pending get survives a timeout, so nothing is lost."""
+        if self._getter is None:
+            self._getter = asyncio.ensure_future(self._queue.get())
+        done, _ = await asyncio.wait({self._getter}, timeout=max(timeout, 0))
+        if not done:
+            return _STREAM_IDLE
+        item, self._getter = self._getter.result(), None
+        return item
+
+    async def _drain(self, interval: float, idle: float) -> Tuple[List[str], bool]:
+        """Wait up to `idle` for a chunk, then keep collecting for `interval` more."""
+        pieces: List[str] = []
+        item = await self._get(idle)
+        deadline = self._loop.time() + (interval if self.text else 0)   # show the first token at once
+        while item is not _STREAM_IDLE:
+            if item is _STREAM_END:
+                return pieces, True
+            pieces.append(item)
+            item = await self._get(deadline - self._loop.time()) if self._queue.empty() else self._queue.get_nowait()
+        return pieces, False
+
+    def batches(self, interval: float = STREAM_FLUSH_INTERVAL,
+                idle: float = STREAM_IDLE_POLL) -> Generator[str, None, None]:
+        """
+        Yield the answer in coalesced batches. Yields "" every `idle` seconds
+        while nothing arrives so the caller can refresh a status line. Raises
+        the upstream error, if any, once the buffered text has been yielded.
+        """
+        try:
+            while not self.done:
+                pieces, self.done = asyncio.run_coroutine_threadsafe(
+                    self._drain(interval, idle), self._loop
+                ).result()
+                batch = "".join(pieces)
+                self.text += batch
+                yield batch
+        finally:
+            if not self.done:
+                self.cancel()
+        if self.error is not None:
+            raise self.error
+
+    def cancel(self):
+        """Cancel the upstream request; text received so far stays in `text`."""
+        if self._task is not None and not self.done:
+            self.cancelled = True
+            self.done = True
+            self._loop.call_soon_threadsafe(self._abort)
+
+    def _abort(self):
+        self._task.cancel()
+        if self._getter is not None:
+            self._getter.cancel()
+
+    def metrics(self) -> Dict[str, Any]:
+        """Time to first token, generation rate and size of the answer streamed so far."""
+        end = self.finished_at or time.perf_counter()
+        tokens = count_tokens(self.text)
+        gen_time = end - self.first_token_at if self.first_token_at else 0.0
+        return {
+            "ttft":           round(self.first_token_at - self.started, 3) if self.first_token_at else None,
+            "tokens":         tokens,
+            "tokens_per_sec": round(tokens / gen_time, 1) if gen_time > 0 else None,
+            "total_seconds":  round(end - self.started, 3),
+            "cancelled":      self.cancelled,
+        }
+
+
+class StreamingEngine:
+    """An asyncio event loop on a daemon thread that runs every upstream stream of the process."""
+
+    def __init__(self, queue_size: int = STREAM_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="hexaloy-stream", daemon=True)
+        self._thread.start()
+
+    def submit(self, open_stream: Callable[[], AsyncIterator[str]]) -> ResponseStream:
+        """Start `open_stream()` (an async iterator of text) on the loop and return its handle."""
+        async def start() -> ResponseStream:
+            handle = ResponseStream(self.loop, self.queue_size)
+            handle._task = asyncio.ensure_future(handle._pump(open_stream))
+            return handle
+        return asyncio.run_coroutine_threadsafe(start(), self.loop).result()
+
+    def close(self, timeout: float = 5.0):
+        """Cancel every task still running on the loop (streams, dispatchers), then stop the loop and its thread."""
+        async def cancel_all():
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        if self.loop.is_closed():
+            return
+        with contextlib.suppress(FutureTimeoutError):
+            asyncio.run_coroutine_threadsafe(cancel_all(), self.loop).result(timeout)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+        if not self._thread.is_alive():
+            self.loop.close()
+
+
+@st.cache_resource
+def get_stream_engine() -> StreamingEngine:
+    """One streaming event loop per process."""
+    return StreamingEngine()
+
+
+def format_stream_metrics(metrics: Dict[str, Any]) -> str:
+    """One-line caption for a response's streaming metrics."""
+    if metrics.get("cached"):
+        if metrics.get("prefetched"):
+            return "⚡ Prepared in the background"
+        if metrics.get("similarity"):
+            return f"⚡ Served from cache · answer to a similar question ({metrics['similarity']:.0%} match)"
+        return "⚡ Served from cache"
+    parts = []
+    if metrics.get("ttft") is not None:
+        parts.append(f"first token {metrics['ttft']:.2f}s")
+    if metrics.get("tokens_per_sec"):
+        parts.append(f"{metrics['tokens_per_sec']:.0f} tok/s")
+    parts.append(f"{metrics.get('tokens', 0)} tokens")
+    if metrics.get("model"):
+        parts.append(metrics["model"] + (" (escalated)" if metrics.get("escalated") else ""))
+    if metrics.get("hedged"):
+        parts.append("hedged")
+    if metrics.get("cancelled"):
+        parts.append("stopped")
+    return "⏱ " + " · ".join(parts)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# FEATURE MODULE 20: BACKGROUND IMAGE JOBS (thread pool + byte cache)
+# ──────────────────────────────────────────────────────────────────────────────
+
+IMAGE_API_URL = os.environ.get("HEXALOY_IMAGE_URL", "https://image.pollinations.ai/prompt/")
+IMAGE_WIDTH, IMAGE_HEIGHT = 800, 400
+IMAGE_WORKERS = 4
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get("HEXALOY_IMAGE_CACHE_MB", "64")) * 1024 * 1024
+IMAGE_MAX_BYTES = 10 * 1024 * 1024
+IMAGE_FETCH_TIMEOUT = httpx.Timeout(90.0, connect=5.0)
+IMAGE_POLL_INTERVAL = 0.5       # seconds between progress refreshes of a pending image
+IMAGE_EXPECTED_SECONDS = 12     # only scales the progress bar
+
+
+def image_url(prompt: str, base_url: str = IMAGE_API_URL,
+              width: int = IMAGE_WIDTH, height: int = IMAGE_HEIGHT) -> str:
+    return f"{base_url}{urllib.parse.quote(prompt)}?width={width}&height={height}&nologo=true"
+
+
+def image_cache_key(prompt: str) -> str:
+    """Cache key of an image: hash of the full (enhanced) prompt it was generated from."""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+class ImageJob:
+    """One image being fetched on the worker pool."""
+
+    def __init__(self, key: str, prompt: str, url: str):
+        self.key = key
+        self.prompt = prompt
+        self.url = url
+        self.started = time.perf_counter()
+        self.future = None
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+
+class ImageJobs:
+    """
+    Fetches generated images on a small thread pool so the script thread
+    never waits on the image service. Finished images are kept in an LRU of
+    bytes keyed by image_cache_key(); a prompt already in flight is joined
+    rather than fetched twice. One instance is shared by all sessions.
+    """
+
+    def __init__(self, workers: int = IMAGE_WORKERS, max_bytes: int = IMAGE_CACHE_MAX_BYTES,
+                 base_url: str = IMAGE_API_URL):
+        self.base_url = base_url
+        self.max_bytes = max_bytes
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hexaloy-image")
+        self._http = httpx.Client(timeout=IMAGE_FETCH_TIMEOUT, follow_redirects=True)
+        self._lock = threading.Lock()
+        self._pending: Dict[str, ImageJob] = {}
+        self._images: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self.fetched = self.hits = self.joined = self.failures = 0
+        self.last_error: Optional[str] = None
+
+    def _fetch(self, job: ImageJob) -> bytes:
+        resp = self._http.get(job.url)
+        resp.raise_for_status()
+        if not resp.headers.get("content-type", "").startswith("image/"):
+            raise ValueError(f"image service returned {resp.headers.get('content-type')!r}")
+        if len(resp.content) > IMAGE_MAX_BYTES:
+            raise ValueError("image too large")
+        return resp.content
+
+    def _finish(self, job: ImageJob, future):
+        with self._lock:
+            self._pending.pop(job.key, None)
+            if future.exception() is not None:
+                self.failures += 1
+                self.last_error = str(future.exception())
+                return
+            data = future.result()
+            self.fetched += 1
+            self._images[job.key] = data
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes and len(self._images) > 1:
+                _, evicted = self._images.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def submit(self, prompt: str) -> ImageJob:
+        """Start fetching the image for `prompt` (if it isn't cached or in flight) and return its job."""
+        key = image_cache_key(prompt)
+        with self._lock:
+            if key in self._images:
+                self.hits += 1
+                return ImageJob(key, prompt, image_url(prompt, self.base_url))
+            if key in self._pending:
+                self.joined += 1
+                return self._pending[key]
+            job = ImageJob(key, prompt, image_url(prompt, self.base_url))
+            self._pending[key] = job
+        job.future = self._pool.submit(self._fetch, job)
+        job.future.add_done_callback(functools.partial(self._finish, job))
+        return job
+
+    def image(self, key: str) -> Optional[bytes]:
+        """Bytes of a finished image, or None."""
+        with self._lock:
+            data = self._images.get(key)
+            if data is not None:
+                self._images.move_to_end(key)
+            return data
+
+    def pending(self, key: str) -> Optional[ImageJob]:
+        """The job still fetching `key`, or None once it has finished or failed."""
+        with self._lock:
+            return self._pending.get(key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending), "cached": len(self._images), "bytes": self._bytes,
+            "fetched": self.fetched, "hits": self.hits, "joined": self.joined, "failures": self.failures,
+        }
+
+
+@st.cache_resource
+def get_image_jobs() -> ImageJobs:
+    """One image worker pool and byte cache per process."""
+    return ImageJobs()
+
+
+def _image_polls() -> Dict[str, bool]:
+    """{image key: polled since the last full run} for this browser session's pending images."""
+    return st.session_state.setdefault("_image_polls", {})
+
+
+@st.fragment(run_every=IMAGE_POLL_INTERVAL)
+def _poll_image_job(jobs: ImageJobs, key: str, url: str):
+    # Re-runs on its own every IMAGE_POLL_INTERVAL; the rest of the page is untouched
+    polls = _image_polls()
+    job = jobs.pending(key)
+    if job is not None:
+        st.progress(min(job.elapsed() / IMAGE_EXPECTED_SECONDS, 0.95),
+                    text=f"🎨 Generating visualization… {job.elapsed():.0f}s")
+        polls[key] = True
+    elif polls.pop(key, False):
+        st.rerun()                    # finished since the last poll: redraw the page without this poller
+    else:
+        _show_image(jobs, key, url)
+
+
+def _show_image(jobs: ImageJobs, key: str, url: str):
+    data = jobs.image(key)
+    if data is not None:
+        st.image(data)
+    else:
+        st.markdown(f"![Generated Image]({url})")   # fetch failed or was evicted: let the browser load it
+
+
+def render_generated_image(jobs: ImageJobs, key: str, url: str):
+    """Show a generated image: from the byte cache, as a live progress bar while it's fetched, or by URL."""
+    polls = _image_polls()
+    for done in [k for k in polls if jobs.pending(k) is None]:
+        del polls[done]               # finished, or left behind when the user switched chats
+    if jobs.pending(key) is None:
+        _show_image(jobs, key, url)
+    else:
+        polls[key] = False            # a full run; only the poller's own reruns may rerun the app
+        _poll_image_job(jobs, key, url)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# FEATURE MODULE 21: INTENT ROUTER (one compiled pass per prompt)
+# ──────────────────────────────────────────────────────────────────────────────
+
+# Cue lists are regex fragments matched case-insensitively on whole words.
+# Earlier entries win where two cues could match at the same position.
+# Things one draws or sketches figuratively rather than as a picture
+_ABSTRACT_OBJECTS = (r"(?:example|concept|conclusion|plan|strategy|outline|roadmap|difference|comparison|point|idea"
+                     r"|process|proof|line|distinction|analogy|parallel|timeline|framework|solution|answer|argument"
+                     r"|summary)s?")
+_PICTURE_NOUNS = r"(?:image|picture|pic|photo|illustration|wallpaper|drawing|painting|sketch)s?"
+IMAGE_GENERATION_CUES = [
+    r"(?:generate|create|make|design|show\s+me|give\s+me|send\s+me)\s+(?:\w+\s+){0,3}?"
+    r"(?:image|picture|pic|photo|illustration|wallpaper|logo|poster)s?",
+    # "<picture> of …" only as a request: after "I want/need/'d like a", or opening the prompt with
+    # a determiner after "of" ("pic of a lion …"); not "picture of health", "the image of a function"
+    r"(?:i\s+(?:want|need)|i'?d\s+like|i\s+would\s+like)\s+(?:an?|some|\d+)\s+" + _PICTURE_NOUNS + r"\s+of",
+    r"^\s*(?:an?\s+)?" + _PICTURE_NOUNS + r"\s+of\s+(?:an?|the|some|\d+|my|our)",
+    # Art verbs only as a request for a picture: "draw a cat", "can you paint me a …", "a sketch of …";
+    # not "draw conclusions", "sketch out a plan", "illustrate the concept of …", "the painting Starry Night"
+    r"(?:^|(?<![\w,;:])\s+)(?:(?:now|then|also)\s+)?(?:please\s+)?(?:(?:can|could|would|will)\s+you\s+)?(?:please\s+)?"
+    r"(?:draw|paint|sketch|illustrate)\s+(?:(?:me|us)\s+(?:(?:an?|the|some|\d+)\s+)?|(?:an?|the|some|\d+)\s+)"
+    r"(?!" + _ABSTRACT_OBJECTS + r"(?!\w))\w+",
+    r"photo\s+bana\w*", r"(?:pic|image)\s+bana\w*", r"tasv[ei]e?r\s+bana\w*",
+]
+VISION_CUES = [
+    r"(?:this|the|my|attached|uploaded|above)\s+(?:image|picture|pic|photo|screenshot|diagram|chart|graph|scan)s?",
+    r"what(?:'s|\s+is)\s+in\s+(?:it|this|here)", r"describe\s+(?:it|this|what\s+you\s+see)",
+    r"read\s+(?:the\s+)?text", r"ocr", r"identify\s+(?:this|the|it)",
+]
+TEMPLATE_CUES = {
+    "💻 Code Review":       [r"code\s+review", r"review\s+(?:my|this|the)\s+(?:code|function|class|script|pr|pull\s+request)"],
+    "📝 Blog Post":         [r"blog(?:\s+post)?s?", r"article\s+(?:on|about)"],
+    "📊 Data Analysis":     [r"data\s+analysis", r"analy[sz]e\s+(?:this\s+|the\s+|my\s+)?(?:data|dataset|numbers|csv|spreadsheet|sales\s+figures)"],
+    "🎯 Marketing Copy":    [r"marketing\s+copy", r"ad\s+copy", r"tagline", r"slogan", r"product\s+description"],
+    "🐛 Debug Code":        [r"debug\w*", r"traceback", r"stack\s*trace", r"\w*error:", r"\w+exception", r"segfault",
+                            r"(?:unhandled|uncaught|runtime)\s+exception", r"(?:throws?|raises?)\s+an?\s+\w*\s*exception",
+                            r"(?:fix|find)\s+(?:the|this|a|my)\s+bug", r"bug\s+in\s+(?:my|this|the)\s+(?:code|function|script|program)"],
+    "📚 Study Guide":       [r"study\s+(?:guide|notes|plan)", r"revision\s+notes", r"cheat\s*sheet", r"board\s+exams?",
+                            r"(?:prepare|preparing|study|studying|revise|revising)\s+for\s+(?:my|the|an?)\s+(?:\w+\s+){0,2}?exams?"],
+    "💌 Professional Email": [r"e-?mail", r"cover\s+letter", r"leave\s+application"],
+    "🔍 Research Summary":  [r"research\s+(?:summary|paper)s?", r"literature\s+review", r"summari[sz]e\s+(?:the\s+)?research"],
+}
+PERSONA_CUES = {
+    # Only names and phrases that mean software: a bare "function", "code" or "api" is as often
+    # maths ("the image of a function"), a dress code or a zip code
+    "👨‍💻 Senior Dev": [
+        r"python", r"javascript", r"typescript", r"java", r"golang", r"c\+\+", r"sql", r"docker", r"kubernetes",
+        r"git(?:hub)?", r"regex", r"django", r"flask", r"compiler", r"coding", r"programming",
+        r"(?:in|with)\s+rust", r"rust\s+(?:code|crate|program|compiler)", r"react(?:\.js|\s+(?:app|component|hooks?))",
+        r"(?:rest|graphql|web)\s+api", r"api\s+(?:endpoint|call|request|response)s?",
+        r"(?:source|my|this|python|js)\s+code", r"code\s+(?:snippet|base|block)s?", r"codebase",
+        r"(?:write|writing|implement)\s+(?:a|an|the|me\s+a)\s+(?:function|script|program|class|method)",
+        r"(?:recursive|async|lambda|helper)\s+functions?",
+    ],
+    "🧑‍🔬 Research Scientist": [
+        r"physics", r"chemistry", r"biology", r"quantum", r"molecules?", r"theorem", r"equations?",
+        r"hypothesis", r"experiment", r"dna", r"relativity", r"entropy", r"photosynthesis",
+    ],
+    "✍️ Creative Writer": [
+        r"story", r"stories", r"poem", r"poetry", r"lyrics", r"haiku", r"novel", r"screenplay", r"film\s+script",
+    ],
+    "📈 Business Strategist": [
+        r"startup", r"business", r"revenue", r"pricing", r"investors?", r"(?:investor|sales|elevator)\s+pitch",
+        r"pitch\s+deck", r"swot", r"okrs?", r"profit",
+        r"sales", r"go-to-market",
+    ],
+    "🧘 Life Coach": [
+        r"stress(?:ed)?", r"anxious", r"anxiety", r"motivat\w*", r"procrastinat\w*", r"habits?",
+        r"burn(?:ed|t)?\s*out", r"self[-\s]confidence", r"overwhelmed",
+    ],
+    "🌍 Language Tutor": [
+        r"translat\w*", r"grammar", r"vocabulary", r"pronounc\w*", r"spanish", r"french", r"german",
+        r"japanese", r"hindi",
+    ],
+    "🎓 Socratic Teacher": [
+        r"teach\s+me", r"quiz\s+me", r"help\s+me\s+understand", r"step\s+by\s+step", r"socratic",
+    ],
+}
+TEMPLATE_PERSONAS = {
+    "💻 Code Review": "👨‍💻 Senior Dev",
+    "🐛 Debug Code": "👨‍💻 Senior Dev",
+    "📝 Blog Post": "✍️ Creative Writer",
+    "🎯 Marketing Copy": "📈 Business Strategist",
+    "📊 Data Analysis": "📈 Business Strategist",
+    "🔍 Research Summary": "🧑‍🔬 Research Scientist",
+    "📚 Study Guide": "🎓 Socratic Teacher",
+}
+
+
+class IntentRouter:
+    """
+    Classifies a prompt in one finditer over a single precompiled regex that
+    ORs every cue together: image generation vs. vision vs. chat, the
+    best-matching prompt template and persona, and safety warnings.
+    The combined pattern has no capture groups (they defeat re's fast path
+    for alternations); which cue a hit belongs to is worked out only for
+    the few spans that match, and memoized. Extend it by adding cues above.
+    """
+
+    MEMO_SIZE = 4096
+
+    def __init__(self, image_cues: List[str] = IMAGE_GENERATION_CUES, vision_cues: List[str] = VISION_CUES,
+                 template_cues: Dict[str, List[str]] = TEMPLATE_CUES,
+                 persona_cues: Dict[str, List[str]] = PERSONA_CUES,
+                 sensitive_patterns: List[Tuple[str, str]] = SENSITIVE_PATTERNS):
+        cues: List[Tuple[str, str, str]] = [("warning", warning, pattern) for pattern, warning in sensitive_patterns]
+        cues += [("vision", "", pattern) for pattern in vision_cues]
+        cues += [("image", "", pattern) for pattern in image_cues]
+        cues += [("template", name, p) for name, patterns in template_cues.items() for p in patterns]
+        cues += [("persona", name, p) for name, patterns in persona_cues.items() for p in patterns]
+        # Prompts are lowercased once, so no IGNORECASE (it slows every comparison)
+        self._re = re.compile(r"(?<!\w)(?:" + "|".join(p for _, _, p in cues) + r")(?!\w)")
+        self._cues = [(re.compile(p), kind, label, i) for i, (kind, label, p) in enumerate(cues)]
+        self._memo: Dict[str, Tuple[str, str, int]] = {}
+
+    def _classify(self, span: str) -> Tuple[str, str, int]:
+        """(kind, label, cue index) of the first cue that matches `span` exactly."""
+        hit = self._memo.get(span)
+        if hit is None:
+            hit = next(((kind, label, i) for rx, kind, label, i in self._cues if rx.fullmatch(span)), ("", "", -1))
+            if len(self._memo) >= self.MEMO_SIZE:
+                self._memo.clear()
+            self._memo[span] = hit
+        return hit
+
+    def route(self, prompt: str, has_image: bool = False) -> Dict[str, Any]:
+        """
+        Returns {"intent": "image" | "vision" | "chat", "template": name or None,
+        "persona": name or None, "warnings": [...]}. Vision needs an uploaded
+        image; with one, only an explicit request to create a new picture
+        (and no reference to the uploaded one) routes to image generation.
+        """
+        image = vision = False
+        template = None
+        warned: Dict[int, str] = {}
+        personas: Counter = Counter()
+        for m in self._re.finditer(prompt.lower()):
+            kind, label, cue = self._classify(m.group())
+            if kind == "image":
+                image = True
+            elif kind == "vision":
+                vision = True
+            elif kind == "template":
+                template = template or label
+            elif kind == "persona":
+                personas[label] += 1
+            elif kind == "warning":
+                warned[cue] = label
+
+        if has_image:
+            intent = "image" if image and not vision else "vision"
+        else:
+            intent = "image" if image else "chat"
+        persona = personas.most_common(1)[0][0] if personas else TEMPLATE_PERSONAS.get(template)
+        warnings = [warned[cue] for cue in sorted(warned)]
+        return {"intent": intent, "template": template, "persona": persona, "warnings": warnings}
+
+
+ROUTER = IntentRouter()
+
+
+def route_prompt(prompt: str, has_image: bool = False) -> Dict[str, Any]:
+    """Route a prompt with the shared, precompiled IntentRouter."""
+    return ROUTER.route(prompt, has_image)
+
+
+def _template_outline(template: str) -> str:
+    """The fixed instructions of a prompt template, without its fill-in lines and markup."""
+    lines = [line.strip().replace("**", "") for line in template.splitlines()] + [""]
+
+    def fill_in(line: str) -> bool:
+        return "{" in line or line.startswith("```")
+
+    return " ".join(
+        line for line, nxt in zip(lines, lines[1:])
+        if line and not fill_in(line) and not (line.endswith(":") and fill_in(nxt))
+    )
+
+
+TEMPLATE_OUTLINES = {name: _template_outline(t["template"]) for name, t in PROMPT_TEMPLATES.items()}
+DEFAULT_PERSONA = "💠 Default HEXALOY"
+
+
+def effective_persona(route: Dict[str, Any], persona: Optional[str] = None) -> Optional[str]:
+    """The persona an answer is written in: the user's explicit pick, else the routed one."""
+    return persona if persona and persona != DEFAULT_PERSONA else route.get("persona")
+
+
+def build_system_prompt(base: str, route: Dict[str, Any], persona: Optional[str] = None) -> str:
+    """
+    Extend the app's system prompt with the routed persona (or `persona`,
+    when the user picked one explicitly) and the routed template's outline.
+    """
+    persona = effective_persona(route, persona)
+    extra = []
+    if persona and persona != DEFAULT_PERSONA:
+        extra.append(f"Answer in this role: {AI_PERSONAS[persona]['prompt']}")
+    if route.get("template"):
+        extra.append(f"Where it fits the question, shape the answer like this: {TEMPLATE_OUTLINES[route['template']]}")
+    return base.rstrip() + "".join(f"\n{line}" for line in extra)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# FEATURE MODULE 22: VISION UPLOAD PIPELINE (downscale once, cache by hash)
+# ──────────────────────────────────────────────────────────────────────────────
+
+VISION_MAX_SIDE = 1120                  # the vision model tiles at 560 px, up to 2x2 tiles
+VISION_TARGET_BYTES = 400 * 1024        # encoded size to aim for before base64
+VISION_JPEG_QUALITIES = (85, 75, 65, 50)
+VISION_CACHE_ENTRIES = 32
+
+
+class VisionUploads:
+    """
+    Turns an uploaded image into the data URL sent to the vision model.
+    Each distinct file (by SHA-256 of its bytes) is decoded, EXIF-rotated,
+    downscaled to VISION_MAX_SIDE and re-encoded to about
+    VISION_TARGET_BYTES once; later turns with the same attachment reuse
+    the cached payload. Files already small enough are sent as they are,
+    under their real MIME type.
+    """
+
+    def __init__(self, max_side: int = VISION_MAX_SIDE, target_bytes: int = VISION_TARGET_BYTES,
+                 max_entries: int = VISION_CACHE_ENTRIES):
+        self.max_side = max_side
+        self.target_bytes = target_bytes
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._payloads: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.hits = self.misses = 0
+
+    def _encode(self, data: bytes) -> Dict[str, Any]:
+        from PIL import Image, ImageOps
+        img = Image.open(io.BytesIO(data))
+        fmt = (img.format or "").upper()
+        if (fmt in ("JPEG", "PNG") and len(data) <= self.target_bytes
+                and max(img.size) <= self.max_side and img.getexif().get(0x0112, 1) == 1):
+            return {"mime": f"image/{fmt.lower()}", "payload": data, "size": img.size}
+
+        if fmt == "JPEG":
+            img.draft("RGB", (self.max_side, self.max_side))    # let the decoder skip detail we'd discard
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((self.max_side, self.max_side), Image.LANCZOS)
+        if fmt == "PNG":
+            # Screenshots and diagrams keep sharper text as PNG when that fits the budget
+            out = io.BytesIO()
+            img.save(out, format="PNG")
+            if out.tell() <= self.target_bytes:
+                return {"mime": "image/png", "payload": out.getvalue(), "size": img.size}
+        if img.mode in ("RGBA", "LA", "P"):
+            img = img.convert("RGBA")
+            flat = Image.new("RGB", img.size, (255, 255, 255))
+            flat.paste(img, mask=img.getchannel("A"))
+            img = flat
+        elif img.mode != "RGB":
+            img = img.convert("RGB")
+
+        while True:
+            for quality in VISION_JPEG_QUALITIES:
+                out = io.BytesIO()
+                img.save(out, format="JPEG", quality=quality, optimize=True)
+                if out.tell() <= self.target_bytes:
+                    break
+            if out.tell() <= self.target_bytes or max(img.size) <= 256:
+                return {"mime": "image/jpeg", "payload": out.getvalue(), "size": img.size}
+            img = img.resize((round(img.width * 0.75), round(img.height * 0.75)), Image.LANCZOS)
+
+    def prepare(self, data: bytes) -> Dict[str, Any]:
+        """
+        {"sha256", "mime", "data_url", "width", "height", "original_bytes",
+        "payload_bytes"} for an uploaded image, from the cache when possible.
+        """
+        key = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            entry = self._payloads.get(key)
+            if entry is not None:
+                self._payloads.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        encoded = self._encode(data)
+        entry = {
+            "sha256": key,
+            "mime": encoded["mime"],
+            "data_url": f"data:{encoded['mime']};base64,{base64.b64encode(encoded['payload']).decode()}",
+            "width": encoded["size"][0],
+            "height": encoded["size"][1],
+            "original_bytes": len(data),
+            "payload_bytes": len(encoded["payload"]),
+        }
+        with self._lock:
+            self._payloads[key] = entry
+            while len(self._payloads) > self.max_entries:
+                self._payloads.popitem(last=False)
+        return entry
+
+
+@st.cache_resource
+def get_vision_uploads() -> VisionUploads:
+    """One vision payload cache per process."""
+    return VisionUploads()
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# FEATURE MODULE 23: PROFILING SPANS, RERUN BREAKDOWN & METRICS DUMP
+# ──────────────────────────────────────────────────────────────────────────────
+
+PROFILE_ENABLED = os.environ.get("HEXALOY_PROFILE", "1") != "0"
+PROFILE_RING_SIZE = 4096        # recent samples kept for percentiles
+PROFILE_RUNS_KEPT = 50          # recent reruns kept with their span breakdown
+PROFILE_DUMP_DIR = os.environ.get("HEXALOY_PROFILE_DIR", ".")
+DEBUG_PANEL_ENABLED = os.environ.get("HEXALOY_DEBUG_PANEL", "0") == "1"     # allows ?debug=1
+
+
+def script_session_id() -> Optional[str]:
+    """Id of the browser session whose script is running on this thread, if any."""
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else None
+
+
+class Profiler:
+    """
+    Process-wide timing of named spans (seconds) and other observed values
+    (e.g. tokens/sec). Keeps a ring buffer of recent samples for
+    percentiles, lifetime count/sum/max per name, and a per-rerun breakdown
+    for the run active on the current thread. The next rerun of a session
+    that asks for it can be captured with cProfile.
+    """
+
+    def __init__(self, ring_size: int = PROFILE_RING_SIZE, runs_kept: int = PROFILE_RUNS_KEPT,
+                 enabled: bool = PROFILE_ENABLED):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.samples: "deque[Tuple[str, str, float]]" = deque(maxlen=ring_size)   # (kind, name, value)
+        self.totals: Dict[Tuple[str, str], List[float]] = {}                     # -> [count, sum, max]
+        self.runs: "deque[Dict[str, Any]]" = deque(maxlen=runs_kept)
+        self._cprofile_sessions: set = set()
+        self.last_cprofile: Optional[str] = None
+        self.last_cprofile_session: Optional[str] = None
+
+    def observe(self, name: str, value: float, kind: str = "value"):
+        """Record one sample. Spans also add to the current thread's rerun breakdown."""
+        if not self.enabled or value is None:
+            return
+        with self._lock:
+            self.samples.append((kind, name, value))
+            total = self.totals.setdefault((kind, name), [0, 0.0, 0.0])
+            total[0] += 1
+            total[1] += value
+            total[2] = max(total[2], value)
+        run = getattr(self._local, "run", None)
+        if run is not None and kind == "span":
+            run["spans"][name] = run["spans"].get(name, 0.0) + value
+
+    @contextlib.contextmanager
+    def span(self, name: str):
+        """Time the enclosed block as span `name`."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0, "span")
+
+    def timed(self, name: Optional[str] = None):
+        """Decorator form of span(). For generator functions the span covers the whole iteration."""
+        def wrap(fn):
+            label = name or fn.__name__
+            if inspect.isgeneratorfunction(fn):
+                @functools.wraps(fn)
+                def gen_wrapper(*args, **kwargs):
+                    with self.span(label):
+                        yield from fn(*args, **kwargs)
+                return gen_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(label):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return wrap
+
+    def record_stream(self, metrics: Dict[str, Any], prefix: str = "generate"):
+        """Record a ResponseStream.metrics() dict: TTFT and total as spans, tokens/sec as a value."""
+        if metrics.get("cached"):
+            self.observe(f"{prefix}.cache_hits", 1)
+            return
+        self.observe(f"{prefix}.ttft", metrics.get("ttft"), "span")
+        self.observe(f"{prefix}.total", metrics.get("total_seconds"), "span")
+        self.observe(f"{prefix}.tokens_per_sec", metrics.get("tokens_per_sec"))
+
+    def request_cprofile(self, session: Optional[str]):
+        """Capture the next rerun of browser session `session` with cProfile."""
+        with self._lock:
+            self._cprofile_sessions.add(session)
+
+    def begin_run(self, session: Optional[str] = None) -> Dict[str, Any]:
+        """Start timing a script rerun of `session` on this thread; pass the result to end_run()."""
+        run = {"started": time.time(), "t0": time.perf_counter(), "spans": {}, "cprofile": None,
+               "session": session}
+        self._local.run = run
+        with self._lock:
+            profile = session in self._cprofile_sessions
+            self._cprofile_sessions.discard(session)
+        if profile:
+            run["cprofile"] = cProfile.Profile()
+            run["cprofile"].enable()
+        return run
+
+    def end_run(self, run: Dict[str, Any]):
+        elapsed = time.perf_counter() - run["t0"]
+        self._local.run = None
+        if run["cprofile"] is not None:
+            run["cprofile"].disable()
+            out = io.StringIO()
+            pstats.Stats(run["cprofile"], stream=out).sort_stats("cumulative").print_stats(40)
+            self.last_cprofile, self.last_cprofile_session = out.getvalue(), run["session"]
+            run["cprofile"].dump_stats(os.path.join(PROFILE_DUMP_DIR, "hexaloy_rerun.prof"))
+        self.observe("rerun", elapsed, "span")
+        with self._lock:
+            self.runs.append({
+                "started": run["started"], "total": elapsed,
+                "spans": dict(sorted(run["spans"].items(), key=lambda kv: -kv[1])),
+            })
+
+    @contextlib.contextmanager
+    def rerun(self, session: Optional[str] = None):
+        """
+        Time the enclosed script rerun. The run is closed (and any cProfile
+        capture stopped) however the script ends, including st.rerun() and
+        st.stop(), whose control exceptions pass through.
+        """
+        run = self.begin_run(session)
+        try:
+            yield run
+        finally:
+            self.end_run(run)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Per name: kind, lifetime count/sum/max and p50/p95 over the ring buffer."""
+        with self._lock:
+            samples = list(self.samples)
+            totals = {k: list(v) for k, v in self.totals.items()}
+        recent: Dict[Tuple[str, str], List[float]] = {}
+        for kind, name, value in samples:
+            recent.setdefault((kind, name), []).append(value)
+        rows = []
+        for (kind, name), (count, total, peak) in sorted(totals.items(), key=lambda kv: -kv[1][1]):
+            values = sorted(recent.get((kind, name), [0.0]))
+            rows.append({
+                "name": name, "kind": kind, "count": int(count), "sum": total, "max": peak,
+                "p50": values[len(values) // 2], "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+            })
+        return rows
+
+    def to_json(self) -> str:
+        return json.dumps({"generated": time.time(), "stats": self.stats(), "runs": list(self.runs)}, indent=2)
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition: spans as a summary in seconds, other values as a summary."""
+        lines = []
+        for kind, metric, help_text in (("span", "hexaloy_span_seconds", "Time spent in instrumented spans."),
+                                        ("value", "hexaloy_value", "Other observed values.")):
+            rows = [r for r in self.stats() if r["kind"] == kind]
+            if not rows:
+                continue
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} summary"]
+            for r in rows:
+                label = f'name="{r["name"]}"'
+                lines.append(f'{metric}{{{label},quantile="0.5"}} {r["p50"]:.6g}')
+                lines.append(f'{metric}{{{label},quantile="0.95"}} {r["p95"]:.6g}')
+                lines.append(f"{metric}_sum{{{label}}} {r['sum']:.6g}")
+                lines.append(f"{metric}_count{{{label}}} {r['count']}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, directory: str = PROFILE_DUMP_DIR) -> List[str]:
+        """Write hexaloy_metrics.json and hexaloy_metrics.prom; returns their paths."""
+        paths = []
+        for name, text in (("hexaloy_metrics.json", self.to_json()), ("hexaloy_metrics.prom", self.to_prometheus())):
+            path = os.path.join(directory, name)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+            paths.append(path)
+        return paths
+
+
+PROFILER = Profiler()
+span = PROFILER.span
+timed = PROFILER.timed
+
+
+def render_debug_panel(profiler: Profiler = PROFILER):
+    """
+    Hidden diagnostics (shown with ?debug=1 when HEXALOY_DEBUG_PANEL=1): span
+    table, last rerun breakdown, cProfile of this session's next rerun and dumps.
+    """
+    with st.expander("🛠 Debug: performance", expanded=False):
+        rows = profiler.stats()
+        if rows:
+            st.dataframe(
+                [{"span": r["name"], "count": r["count"],
+                  "p50 ms": round(r["p50"] * 1000, 2) if r["kind"] == "span" else r["p50"],
+                  "p95 ms": round(r["p95"] * 1000, 2) if r["kind"] == "span" else r["p95"],
+                  "max ms": round(r["max"] * 1000, 2) if r["kind"] == "span" else r["max"]} for r in rows],
+                use_container_width=True, hide_index=True,
+            )
+        if profiler.runs:
+            last = profiler.runs[-1]
+            st.caption(f"Previous rerun: {last['total'] * 1000:.1f} ms")
+            st.json({name: round(sec * 1000, 2) for name, sec in last["spans"].items()}, expanded=False)
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("Profile next rerun", key="debug_cprofile"):
+                profiler.request_cprofile(script_session_id())
+                st.rerun()
+        with col2:
+            if st.button("Write metrics dump", key="debug_dump"):
+                st.caption(" · ".join(profiler.dump()))
+        if profiler.last_cprofile and profiler.last_cprofile_session == script_session_id():
+            st.code(profiler.last_cprofile, language="text")
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# FEATURE MODULE 24: WINDOWED CHAT RENDERING (last N messages + load earlier)
+# ──────────────────────────────────────────────────────────────────────────────
+
+CHAT_WINDOW = 40                # messages rendered by default, newest last
+CHAT_WINDOW_STEP = 40           # messages added by each "load earlier" click
+
+
+def chat_window_start(total: int, pages_loaded: int, window: int = CHAT_WINDOW,
+                      step: int = CHAT_WINDOW_STEP) -> int:
+    """Index of the first message to render for a chat of `total` messages."""
+    return max(0, total - window - pages_loaded * step)
+
+
+def _load_earlier(chat: Any):
+    windows = st.session_state.setdefault("chat_windows", {})
+    windows[chat] = windows.get(chat, 0) + 1
+
+
+def render_chat_messages(history: Sequence, chat: Any, assets: Dict[str, Any],
+                         window: int = CHAT_WINDOW, step: int = CHAT_WINDOW_STEP):
+    """
+    Render the last `window` messages of chat `chat` (its session id), with
+    a "load earlier" button that widens the window by `step` for this chat.
+    Older messages are neither read from the store nor sent to the browser
+    until asked for.
+    """
+    total = len(history)
+    start = chat_window_start(total, st.session_state.get("chat_windows", {}).get(chat, 0), window, step)
+    if start:
+        st.button(f"⬆ Load {min(step, start)} earlier messages", key=f"load_earlier_{chat}",
+                  on_click=_load_earlier, args=(chat,),
+                  help=f"Showing the last {total - start} of {total} messages")
+
+    for message in history[start:]:
+        avatar_icon = assets["user_avatar"] if message["role"] == "user" else assets["assistant_avatar"]
+        with st.chat_message(message["role"], avatar=avatar_icon):
+            if message.get("image_key"):
+                render_generated_image(get_image_jobs(), message["image_key"], message["image_url"])
+            elif message.get("compare"):
+                render_compare_message(message)
+            else:
+                st.markdown(message["content"])
+            if message.get("metrics"):
+                st.caption(format_stream_metrics(message["metrics"]))
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# FEATURE MODULE 25: SIDEBAR SESSION INDEX (recent first, date groups, pages)
+# ──────────────────────────────────────────────────────────────────────────────
+
+SESSION_PAGE_SIZE = 20
+SESSION_OPEN_BUCKETS = ("Today", "Yesterday")     # other groups start collapsed
+
+
+def session_date_bucket(updated: float, now: Optional[datetime.datetime] = None) -> str:
+    """Sidebar group for a session last active at `updated` (epoch seconds)."""
+    now = now or datetime.datetime.now()
+    days = (now.date() - datetime.datetime.fromtimestamp(updated).date()).days
+    if days <= 0:
+        return "Today"
+    if days == 1:
+        return "Yesterday"
+    if days < 7:
+        return "Previous 7 days"
+    if days < 30:
+        return "Previous 30 days"
+    return "Older"
+
+
+def _open_session(session_id: int):
+    st.session_state.current_chat = session_id
+
+
+def _turn_session_page(delta: int):
+    st.session_state.session_page = max(0, st.session_state.get("session_page", 0) + delta)
+
+
+def _reset_session_page():
+    st.session_state.session_page = 0
+
+
+def render_session_list(sessions: "StoredSessions", current: int, page_size: int = SESSION_PAGE_SIZE):
+    """
+    Chat history for the sidebar: sessions ordered by last activity, one page
+    at a time, grouped by date and filterable by title prefix. Only the
+    sessions on the current page become widgets; their keys use the session
+    ID, so renaming a chat doesn't reset its button. `current` is the open
+    session's id.
+    """
+    prefix = st.text_input("Filter chats", key="session_filter", placeholder="Title starts with…",
+                           label_visibility="collapsed", on_change=_reset_session_page).strip()
+    page = st.session_state.get("session_page", 0)
+    total, rows = sessions.store.recent_sessions(sessions.owner, prefix, page_size, page * page_size)
+    if not rows and page:
+        st.session_state.session_page = page = 0
+        total, rows = sessions.store.recent_sessions(sessions.owner, prefix, page_size, 0)
+    if not rows:
+        st.caption("No chats match." if prefix else "No chats yet.")
+        return
+
+    groups: Dict[str, List[Tuple[int, str, int, float]]] = {}
+    for row in rows:
+        groups.setdefault(session_date_bucket(row[3]), []).append(row)
+    for bucket, members in groups.items():
+        expanded = bucket in SESSION_OPEN_BUCKETS or any(session_id == current for session_id, *_ in members)
+        with st.expander(f"{bucket} · {len(members)}", expanded=expanded):
+            for session_id, title, count, _ in members:
+                st.button(f"💬 {title}", key=f"session_{session_id}", on_click=_open_session, args=(session_id,),
+                          type="primary" if session_id == current else "secondary",
+                          help=f"{count} messages", use_container_width=True)
+
+    if total > page_size:
+        first = page * page_size + 1
+        col1, col2, col3 = st.columns([1, 2, 1])
+        col1.button("‹", key="session_page_newer", disabled=page == 0,
+                    on_click=_turn_session_page, args=(-1,), help="Newer chats")
+        col2.caption(f"{first}–{first + len(rows) - 1} of {total}")
+        col3.button("›", key="session_page_older", disabled=first + len(rows) > total,
+                    on_click=_turn_session_page, args=(1,), help="Older chats")
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# FEATURE MODULE 26: REQUEST SCHEDULER (token buckets, fair queue, retries)
+# ──────────────────────────────────────────────────────────────────────────────
+
+# Per-model quotas in requests and tokens (prompt + completion) per minute;
+# an optional "burst" caps how many seconds of quota can be saved up
+# (default: a full minute). HEXALOY_QUOTA_SCALE multiplies rpm and tpm,
+# e.g. for a paid tier.
+MODEL_QUOTAS = {
+    "llama-3.3-70b-versatile":      {"rpm": 30, "tpm": 12000},
+    "llama-3.2-11b-vision-preview": {"rpm": 30, "tpm": 7000},
+    "llama-3.1-8b-instant":         {"rpm": 30, "tpm": 6000},
+}
+DEFAULT_MODEL_QUOTA = {"rpm": 30, "tpm": 6000}
+QUOTA_SCALE = float(os.environ.get("HEXALOY_QUOTA_SCALE", "1"))
+
+SCHEDULER_REPLY_ESTIMATE = 512      # completion tokens reserved up front; the unused part is refunded
+SCHEDULER_MAX_RETRIES = 4
+SCHEDULER_BACKOFF_BASE = 0.5        # seconds; doubled per attempt, full jitter
+SCHEDULER_BACKOFF_CAP = 20.0
+SCHEDULER_BACKGROUND_HEADROOM = 0.25    # share of each bucket a background request must leave untouched
+
+_RETRYABLE_ERRORS = (groq.RateLimitError, groq.InternalServerError, groq.APIConnectionError)
+
+
+class TokenBucket:
+    """Refills continuously at `per_minute` / 60 units per second, holding up to `burst` seconds' worth."""
+
+    def __init__(self, per_minute: float, burst: float = 60.0):
+        self.rate = per_minute / 60.0
+        self.capacity = self.rate * burst
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float, now: Optional[float] = None) -> float:
+        """Seconds until `amount` more units have accrued (0 if available now). Doesn't change the bucket."""
+        level = min(self.capacity, self.level + ((now or time.monotonic()) - self.updated) * self.rate)
+        return max(0.0, (amount - level) / self.rate)
+
+    def take(self, amount: float):
+        self._refill(time.monotonic())
+        self.level -= min(amount, self.capacity)
+
+    def give(self, amount: float):
+        self._refill(time.monotonic())
+        self.level = min(self.capacity, self.level + amount)
+
+    def drain(self):
+        """After a 429 the provider's view wins: start refilling from empty."""
+        self._refill(time.monotonic())
+        self.level = min(self.level, 0.0)
+
+
+class ScheduledRequest:
+    """One completion waiting for, or holding, its share of a model's quota."""
+
+    def __init__(self, owner: str, model: str, prompt_tokens: int,
+                 reply_tokens: int = SCHEDULER_REPLY_ESTIMATE, max_retries: Optional[int] = None,
+                 background: bool = False):
+        self.owner = owner
+        self.model = model
+        self.max_retries = max_retries          # None = the scheduler's default
+        self.background = background            # speculative work: served only from spare quota
+        self.prompt_tokens = prompt_tokens
+        self.cost = prompt_tokens + reply_tokens
+        self.charged = 0                        # tokens taken from the bucket so far, one `cost` per attempt
+        self.enqueued = time.perf_counter()
+        self.granted_at: Optional[float] = None
+        self.attempts = 0
+        self.retry_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._granted: Optional[asyncio.Future] = None
+
+
+class _ModelLane:
+    def __init__(self, quota: Dict[str, float]):
+        self.requests = TokenBucket(quota["rpm"], quota.get("burst", 60.0))
+        self.tokens = TokenBucket(quota["tpm"], quota.get("burst", 60.0))
+        self.queues: "OrderedDict[str, deque]" = OrderedDict()     # owner -> waiting requests, serving order
+        self.wakeup = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def delay(self, requests: int, tokens: float) -> float:
+        now = time.monotonic()
+        return max(self.requests.delay(requests, now), self.tokens.delay(tokens, now))
+
+    def wait_for(self, req: "ScheduledRequest") -> float:
+        """
+        Seconds until `req` fits; a request larger than the bucket only needs
+        a full one. Background requests also wait for SCHEDULER_BACKGROUND_HEADROOM
+        of each bucket to be left over for interactive ones.
+        """
+        if req.background:
+            headroom = SCHEDULER_BACKGROUND_HEADROOM
+            return self.delay(1 + self.requests.capacity * headroom,
+                              min(req.cost + self.tokens.capacity * headroom, self.tokens.capacity))
+        return self.delay(1, min(req.cost, self.tokens.capacity))
+
+
+class RequestScheduler:
+    """
+    Process-wide gate in front of the Groq client. Each model has a request
+    and a token bucket sized from MODEL_QUOTAS; waiting requests are queued
+    per owner and granted round-robin across owners, so one busy user can't
+    starve the others. Background requests go after every interactive one
+    and only from spare quota. 429/5xx/connection errors that arrive before the
+    first token are retried with jittered exponential backoff (honouring
+    Retry-After). Runs on the StreamingEngine's event loop.
+    """
+
+    def __init__(self, quotas: Dict[str, Dict[str, float]] = MODEL_QUOTAS, scale: float = QUOTA_SCALE,
+                 max_retries: int = SCHEDULER_MAX_RETRIES):
+        self.quotas = quotas
+        self.scale = scale
+        self.max_retries = max_retries
+        self._lock = threading.Lock()       # queues are read from script threads for positions
+        self._lanes: Dict[str, _ModelLane] = {}
+        self.granted = self.retried = self.failed = 0
+
+    def _lane(self, model: str) -> _ModelLane:
+        lane = self._lanes.get(model)
+        if lane is None:
+            quota = self.quotas.get(model, DEFAULT_MODEL_QUOTA)
+            lane = _ModelLane({**quota, "rpm": quota["rpm"] * self.scale, "tpm": quota["tpm"] * self.scale})
+            lane.task = asyncio.ensure_future(self._dispatch(lane))
+            self._lanes[model] = lane
+        return lane
+
+    async def _dispatch(self, lane: _ModelLane):
+        while True:
+            with self._lock:
+                head = next(((o, q) for o, q in lane.queues.items() if not q[0].background), None) \
+                    or next(iter(lane.queues.items()), None)
+            if head is None:
+                lane.wakeup.clear()
+                await lane.wakeup.wait()
+                continue
+            owner, queue = head
+            req = queue[0]
+            wait = lane.wait_for(req)
+            if wait > 0 and not req._granted.done():
+                if req.background:
+                    # An interactive request arriving meanwhile goes first
+                    lane.wakeup.clear()
+                    with contextlib.suppress(asyncio.TimeoutError):
+                        await asyncio.wait_for(lane.wakeup.wait(), wait)
+                else:
+                    await asyncio.sleep(wait)
+                continue
+            with self._lock:
+                queue.popleft()
+                del lane.queues[owner]
+                if queue:
+                    lane.queues[owner] = queue          # back of the line for this owner's next one
+            if not req._granted.done():             # skip requests cancelled while queued
+                lane.requests.take(1)
+                lane.tokens.take(req.cost)
+                req.charged += req.cost
+                req.granted_at = time.perf_counter()
+                self.granted += 1
+                req._granted.set_result(None)
+
+    async def _acquire(self, req: ScheduledRequest):
+        lane = self._lane(req.model)
+        req._granted = asyncio.get_running_loop().create_future()
+        with self._lock:
+            lane.queues.setdefault(req.owner, deque()).append(req)
+        lane.wakeup.set()
+        try:
+            await req._granted
+        except asyncio.CancelledError:
+            with self._lock:
+                queue = lane.queues.get(req.owner)
+                if queue is not None and req in queue:
+                    queue.remove(req)
+                    if not queue:
+                        del lane.queues[req.owner]
+            if req.granted_at is not None:
+                # Granted just before the cancel landed: nothing will stream, so give the reservation back
+                lane.requests.give(1)
+                lane.tokens.give(req.charged)
+                req.charged = 0
+            raise
+
+    async def _backoff(self, req: ScheduledRequest, error: Exception):
+        lane = self._lanes[req.model]
+        retry_after = None
+        response = getattr(error, "response", None)
+        if response is not None:
+            try:
+                retry_after = float(response.headers.get("retry-after", ""))
+            except ValueError:
+                pass
+        if isinstance(error, groq.RateLimitError):
+            lane.requests.drain()
+            lane.tokens.drain()
+        delay = retry_after if retry_after is not None else random.uniform(
+            0, min(SCHEDULER_BACKOFF_CAP, SCHEDULER_BACKOFF_BASE * 2 ** req.attempts))
+        req.retry_at = time.perf_counter() + delay
+        req.last_error = type(error).__name__
+        self.retried += 1
+        await asyncio.sleep(delay)
+        req.retry_at = None
+        while (wait := lane.wait_for(req)) > 0:
+            await asyncio.sleep(wait)
+        lane.requests.take(1)
+        lane.tokens.take(req.cost)
+        req.charged += req.cost
+
+    async def run(self, req: ScheduledRequest,
+                  open_stream: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """Wait for `req`'s turn, then yield `open_stream()`, retrying it until the first token arrives."""
+        await self._acquire(req)
+        pieces: List[str] = []
+        try:
+            while True:
+                req.attempts += 1
+                try:
+                    async for piece in open_stream():
+                        pieces.append(piece)
+                        yield piece
+                    return
+                except _RETRYABLE_ERRORS as e:
+                    limit = self.max_retries if req.max_retries is None else req.max_retries
+                    if pieces or req.attempts > limit:
+                        self.failed += 1
+                        raise
+                    await self._backoff(req, e)
+        finally:
+            # Every attempt reserved the full cost; only the one that streamed used any of it
+            used = req.prompt_tokens + count_tokens("".join(pieces))
+            if used < req.charged:
+                self._lanes[req.model].tokens.give(req.charged - used)
+
+    def promote(self, req: ScheduledRequest):
+        """Serve a background request as an interactive one from now on (someone is waiting for it)."""
+        req.background = False
+        lane = self._lanes.get(req.model)
+        if lane is not None:
+            lane.task.get_loop().call_soon_threadsafe(lane.wakeup.set)
+
+    def position(self, req: ScheduledRequest) -> Optional[Tuple[int, float]]:
+        """(requests ahead, estimated seconds) while `req` is queued, else None."""
+        lane = self._lanes.get(req.model)
+        if lane is None or req.granted_at is not None:
+            return None
+        with self._lock:
+            # Background requests are never ahead of an interactive one
+            queues = [[r for r in q if req.background or not r.background] for q in lane.queues.values()]
+        mine = next((i for i, q in enumerate(queues) if req in q), None)
+        if mine is None:
+            return None
+        k = queues[mine].index(req)
+        ahead: List[ScheduledRequest] = queues[mine][:k]
+        for j, queue in enumerate(queues):
+            if j != mine:                     # round-robin: each owner before us in line gets one more turn
+                ahead += queue[:k + (1 if j < mine else 0)]
+        return len(ahead), lane.delay(len(ahead) + 1, sum(r.cost for r in ahead) + req.cost)
+
+    def describe(self, req: ScheduledRequest) -> Optional[str]:
+        """Status line for a request that hasn't started streaming, or None."""
+        if req.retry_at is not None:
+            return (f"⏳ Model busy ({req.last_error}), retrying in "
+                    f"{max(0.0, req.retry_at - time.perf_counter()):.0f}s · attempt {req.attempts + 1}")
+        queued = self.position(req)
+        if queued is not None:
+            ahead, eta = queued
+            return f"⏳ In queue: {ahead} request{'s' if ahead != 1 else ''} ahead · about {eta:.0f}s"
+        return None
+
+    async def close(self):
+        """Stop the per-model dispatchers. Call on the scheduler's loop before it shuts down."""
+        tasks = [lane.task for lane in self._lanes.values() if lane.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._lanes.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            queued = {model: sum(map(len, lane.queues.values())) for model, lane in self._lanes.items()}
+        return {"queued": queued, "granted": self.granted, "retried": self.retried, "failed": self.failed}
+
+
+@st.cache_resource
+def get_request_scheduler() -> RequestScheduler:
+    """One scheduler per process, living on the streaming engine's loop."""
+    return RequestScheduler()
+
+
+def describe_upstream_error(error: Exception) -> str:
+    """User-facing text for an error from the model API."""
+    if isinstance(error, groq.RateLimitError):
+        return "⚠️ HEXALOY is over its model rate limit right now. Please try again in a minute."
+    if isinstance(error, (groq.InternalServerError, groq.APIConnectionError, CircuitOpenError)):
+        return "⚠️ The model service is unavailable right now. Please try again shortly."
+    if isinstance(error, UpstreamTimeout):
+        return "⚠️ The model is taking too long to respond right now. Please try again shortly."
+    return f"System Fault: {error}"
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# FEATURE MODULE 27: SINGLE-FLIGHT STREAMS (identical requests share one upstream)
+# ──────────────────────────────────────────────────────────────────────────────
+
+class _Flight:
+    """One upstream stream and everything it has produced so far."""
+
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.fan_out = 0
+        self.changed = asyncio.Condition()
+        self.task: Optional[asyncio.Task] = None
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight completions. The first caller for a key
+    (response_cache_key() of the request) opens the upstream stream; callers
+    with the same key while it is still streaming subscribe to it instead,
+    get the chunks produced so far replayed at once, then follow live. The
+    upstream is cancelled only when every subscriber has gone. Runs on the
+    StreamingEngine's event loop.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self.flights = self.subscribers = self.joined = self.replayed_chunks = 0
+        self.max_fan_out = 0
+
+    async def _pump(self, key: str, flight: _Flight, open_stream: Callable[[], AsyncIterator[str]]):
+        try:
+            async for piece in open_stream():
+                flight.chunks.append(piece)
+                async with flight.changed:
+                    flight.changed.notify_all()
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            async with flight.changed:
+                flight.changed.notify_all()
+
+    async def subscribe(self, key: str, open_stream: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """Yield the answer for `key`, from the stream already in flight if there is one."""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.ensure_future(self._pump(key, flight, open_stream))
+            self.flights += 1
+        else:
+            self.joined += 1
+            self.replayed_chunks += len(flight.chunks)
+        flight.subscribers += 1
+        flight.fan_out += 1
+        self.subscribers += 1
+        self.max_fan_out = max(self.max_fan_out, flight.fan_out)
+        sent = 0
+        try:
+            while True:
+                while sent < len(flight.chunks):
+                    sent += 1
+                    yield flight.chunks[sent - 1]
+                if flight.done:
+                    break
+                async with flight.changed:
+                    await flight.changed.wait_for(lambda: flight.done or len(flight.chunks) > sent)
+            if flight.error is not None:
+                raise flight.error
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                # Nobody is listening any more; a later request for the key starts afresh
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._flights),
+            "upstream_streams": self.flights,
+            "subscribers": self.subscribers,
+            "joined": self.joined,
+            "fan_out": round(self.subscribers / self.flights, 2) if self.flights else 0.0,
+            "max_fan_out": self.max_fan_out,
+            "replayed_chunks": self.replayed_chunks,
+        }
+
+
+@st.cache_resource
+def get_single_flight() -> SingleFlight:
+    """One in-flight registry per process, on the streaming engine's loop."""
+    return SingleFlight()
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# FEATURE MODULE 28: SEMANTIC RESPONSE CACHE (paraphrases share an answer)
+# ──────────────────────────────────────────────────────────────────────────────
+
+SEMANTIC_CACHE_DIM = 256
+SEMANTIC_CACHE_MAX_ENTRIES = 20_000
+SEMANTIC_CACHE_PATH = os.environ.get("HEXALOY_SEMANTIC_CACHE_PATH")       # unset = memory only
+SEMANTIC_CACHE_SAVE_EVERY = 50          # new answers between writes to disk
+# Cosine similarity needed to reuse an answer. Calibrated on bench/paraphrase_corpus.py: the highest
+# near miss (swapped operands, "World War I"/"II", ...) scores about 0.7, paraphrases mostly 0.9-1.0.
+SEMANTIC_THRESHOLD = 0.9
+SEMANTIC_BIGRAM_WEIGHT = 1.0            # weight of adjacent word pairs, which carry the word order
+SEMANTIC_EMBEDDING_VERSION = 2          # bump when embed_prompt() changes; older cache files are ignored
+# Personas whose answers hinge on small wording differences need a closer match
+SEMANTIC_PERSONA_THRESHOLDS = {
+    "👨‍💻 Senior Dev": 0.95,
+    "🧑‍🔬 Research Scientist": 0.95,
+    "🌍 Language Tutor": 0.97,
+}
+
+# Words that change how a question is phrased but not what it asks. "a" and "i" only as the article
+# and the pronoun: "vitamin A" and "World War I" keep them (see _semantic_letter()).
+_SEMANTIC_STOPWORDS = frozenset("""
+    a an the of in on for to and or is are was were be been it its this that these those i me my you your
+    we our can could would should please give tell show explain explained explaining describe what whats
+    how do does did why when where which who some any about with using use into from by as at so simply
+    simple terms term just let lets need want know beginner beginners basics
+""".split())
+_SEMANTIC_WORD_RE = re.compile(r"[a-z0-9]+(?:[+#]+)?", re.IGNORECASE)
+_SEMANTIC_LOWER_WORD_RE = re.compile(r"\s+[a-z]")
+_SEMANTIC_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+_SEMANTIC_SUFFIXES = ("ational", "ations", "ation", "ating", "ated", "ates", "ings", "ing",
+                      "ies", "ied", "ed", "es", "ly", "s", "e")
+
+
+def _semantic_stem(word: str) -> str:
+    if word.isdigit() or len(word) <= 4:
+        return word
+    for suffix in _SEMANTIC_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[:-len(suffix)]
+    return word
+
+
+def _semantic_letter(text: str, match: "re.Match") -> bool:
+    """A capital "A" or "I" that names something ("vitamin A", "World War I") rather than the article or pronoun."""
+    letter = match.group()
+    if letter == "A":
+        before = text[:match.start()].rstrip()
+        return bool(before) and before[-1] not in ".!?"
+    return letter == "I" and not _SEMANTIC_LOWER_WORD_RE.match(text, match.end())
+
+
+def _semantic_words(text: str) -> List[str]:
+    """The prompt's words minus filler, lowercased and crudely stemmed, in order."""
+    text = text.replace("'", "")
+    words = []
+    for m in _SEMANTIC_WORD_RE.finditer(text):
+        word = m.group().lower()
+        if word not in _SEMANTIC_STOPWORDS or _semantic_letter(text, m):
+            words.append(_semantic_stem(word))
+    return words
+
+
+def embed_prompt(text: str, dim: int = SEMANTIC_CACHE_DIM) -> "np.ndarray":
+    """
+    Unit-length hashing-vectorizer embedding of a prompt, computed locally:
+    the words of _semantic_words() and each adjacent pair of them, hashed
+    (signed crc32) into one of `dim` buckets. The pairs keep the word order,
+    so "Celsius to Fahrenheit" is not "Fahrenheit to Celsius". Catches
+    inflection and phrasing ("explain X simply" / "X in simple terms"),
+    not synonyms.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    previous = None
+    for word in _semantic_words(text):
+        for feature, weight in ((word, 1.0), (previous and f"{previous} {word}", SEMANTIC_BIGRAM_WEIGHT)):
+            if feature:
+                h = zlib.crc32(feature.encode("utf-8"))
+                vector[h % dim] += -weight if h & 0x80000000 else weight
+        previous = word
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+def semantic_scope(model: str, context: List[dict], owner: Optional[str] = None) -> int:
+    """
+    64-bit ID of everything besides the prompt that shapes an answer: the
+    model and the preceding messages (system prompt/persona included), and
+    the owner, so a near match never serves one user's answer to another.
+    Only prompts with the same scope can share an answer.
+    """
+    payload = json.dumps([model, owner, [[m.get("role"), _normalize_for_key(m.get("content"))] for m in context]],
+                         ensure_ascii=False, separators=(",", ":"))
+    return int.from_bytes(hashlib.sha256(payload.encode("utf-8")).digest()[:8], "little", signed=True)
+
+
+class SemanticCache:
+    """
+    Finished answers looked up by prompt meaning rather than exact text.
+    Embeddings live in one preallocated float32 matrix (grown by doubling)
+    so a lookup is a single matrix-vector product: cosine similarity against
+    every entry, masked to the request's scope (one owner's chat context).
+    A candidate is reused only above the persona's threshold and when both
+    prompts mention the same numbers ("5 tips" is not "10 tips"). Full
+    caches evict the least recently used entry. Optionally persisted to an
+    .npz file. Thread-safe; one instance is shared by all sessions.
+    """
+
+    def __init__(self, max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES, dim: int = SEMANTIC_CACHE_DIM,
+                 path: Optional[str] = SEMANTIC_CACHE_PATH, threshold: float = SEMANTIC_THRESHOLD,
+                 persona_thresholds: Dict[str, float] = SEMANTIC_PERSONA_THRESHOLDS,
+                 save_every: int = SEMANTIC_CACHE_SAVE_EVERY):
+        self.max_entries = max_entries
+        self.dim = dim
+        self.path = path
+        self.threshold = threshold
+        self.persona_thresholds = persona_thresholds
+        self.save_every = save_every
+        self._lock = threading.Lock()
+        self._size = 0
+        self._allocate(min(max_entries, 1024))
+        self._prompts: List[str] = []
+        self._answers: List[str] = []
+        self._numbers: List[Tuple[str, ...]] = []
+        self._clock = 0
+        self._unsaved = 0
+        self.hits = self.misses = self.evictions = 0
+        self.lookup_seconds = 0.0
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _allocate(self, capacity: int):
+        vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        scopes = np.zeros(capacity, dtype=np.int64)
+        used = np.zeros(capacity, dtype=np.int64)           # LRU clock of each entry's last hit or write
+        n = self._size
+        if n:
+            vectors[:n], scopes[:n], used[:n] = self._vectors[:n], self._scopes[:n], self._used[:n]
+        self._vectors, self._scopes, self._used = vectors, scopes, used
+
+    def _tick(self) -> int:
+        self._clock += 1
+        return self._clock
+
+    def threshold_for(self, persona: Optional[str]) -> float:
+        return self.persona_thresholds.get(persona, self.threshold)
+
+    def _nearest(self, query: "np.ndarray", scope: int, numbers: Tuple[str, ...],
+                 threshold: float) -> Optional[Tuple[int, float]]:
+        n = self._size
+        if not n:
+            return None
+        sims = self._vectors[:n] @ query
+        sims[self._scopes[:n] != scope] = -1.0
+        candidates = np.flatnonzero(sims >= threshold)
+        for i in candidates[np.argsort(-sims[candidates])]:
+            if self._numbers[i] == numbers:
+                return int(i), float(sims[i])
+        return None
+
+    def lookup(self, prompt: str, scope: int, persona: Optional[str] = None) -> Optional[Tuple[str, float]]:
+        """(answer, similarity) of the closest cached prompt in `scope`, or None. Counts a hit or a miss."""
+        t0 = time.perf_counter()
+        query = embed_prompt(prompt, self.dim)
+        numbers = tuple(sorted(set(_SEMANTIC_NUMBER_RE.findall(prompt))))
+        with self._lock:
+            found = self._nearest(query, scope, numbers, self.threshold_for(persona)) if query.any() else None
+            if found is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._used[found[0]] = self._tick()
+            self.lookup_seconds += time.perf_counter() - t0
+            return (self._answers[found[0]], found[1]) if found else None
+
+    def put(self, prompt: str, scope: int, answer: str):
+        """Cache `answer` for `prompt`; replaces the entry for a (near-)identical prompt in the same scope."""
+        query = embed_prompt(prompt, self.dim)
+        if not answer or not query.any():
+            return
+        numbers = tuple(sorted(set(_SEMANTIC_NUMBER_RE.findall(prompt))))
+        with self._lock:
+            same = self._nearest(query, scope, numbers, 0.999)
+            if same is not None:
+                i = same[0]
+            elif self._size < self.max_entries:
+                if self._size == len(self._vectors):
+                    self._allocate(min(self.max_entries, 2 * len(self._vectors)))
+                i = self._size
+                self._size += 1
+                self._prompts.append("")
+                self._answers.append("")
+                self._numbers.append(())
+            else:
+                i = int(np.argmin(self._used[:self._size]))
+                self.evictions += 1
+            self._vectors[i], self._scopes[i], self._used[i] = query, scope, self._tick()
+            self._prompts[i], self._answers[i], self._numbers[i] = prompt, answer, numbers
+            self._unsaved += 1
+            save = self.path and self._unsaved >= self.save_every
+        if save:
+            self.save()
+
+    def save(self, path: Optional[str] = None):
+        """Write the cache to `path` (default: the configured path) atomically."""
+        path = path or self.path
+        if not path:
+            return
+        with self._lock:
+            n = self._size
+            arrays = {
+                "vectors": self._vectors[:n].copy(),
+                "scopes": self._scopes[:n].copy(),
+                "used": self._used[:n].copy(),
+                "version": np.array(SEMANTIC_EMBEDDING_VERSION),
+                "texts": np.array(json.dumps({"prompts": self._prompts, "answers": self._answers},
+                                             ensure_ascii=False)),
+            }
+            self._unsaved = 0
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
+
+    def load(self, path: str):
+        """Replace the cache's contents with a file written by save(). Unreadable or mismatched files are ignored."""
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if "version" not in data.files or int(data["version"]) != SEMANTIC_EMBEDDING_VERSION:
+                    return          # embedded by an older embed_prompt(); its vectors wouldn't compare
+                vectors, scopes, used = data["vectors"], data["scopes"], data["used"]
+                texts = json.loads(str(data["texts"]))
+        except (OSError, ValueError, KeyError):
+            return
+        if vectors.ndim != 2 or vectors.shape[1] != self.dim:
+            return
+        keep = np.argsort(-used, kind="stable")[:self.max_entries]       # most recently used first
+        with self._lock:
+            self._size = 0
+            self._allocate(min(self.max_entries, max(1024, len(keep))))
+            self._size = len(keep)
+            self._vectors[:self._size] = vectors[keep]
+            self._scopes[:self._size] = scopes[keep]
+            self._used[:self._size] = used[keep]
+            self._prompts = [texts["prompts"][i] for i in keep]
+            self._answers = [texts["answers"][i] for i in keep]
+            self._numbers = [tuple(sorted(set(_SEMANTIC_NUMBER_RE.findall(p)))) for p in self._prompts]
+            self._clock = int(used.max()) if len(used) else 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries":      self._size,
+            "hits":         self.hits,
+            "misses":       self.misses,
+            "evictions":    self.evictions,
+            "hit_rate":     round(self.hits / lookups, 3) if lookups else 0.0,
+            "lookup_ms":    round(1000 * self.lookup_seconds / lookups, 3) if lookups else 0.0,
+        }
+
+
+@st.cache_resource
+def get_semantic_cache() -> SemanticCache:
+    """One SemanticCache per process, shared by every browser session."""
+    return SemanticCache()
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# FEATURE MODULE 29: CROSS-SESSION RETRIEVAL MEMORY (earlier chats as context)
+# ──────────────────────────────────────────────────────────────────────────────
+
+RETRIEVAL_DIM = 256
+RETRIEVAL_CHUNK_WORDS = 48              # words per indexed chunk of a message
+RETRIEVAL_TOP_K = 4
+RETRIEVAL_TOKEN_BUDGET = 400            # system-prompt tokens spent on recalled snippets
+RETRIEVAL_MIN_SIMILARITY = 0.2          # below this a chunk shares a word or two by chance
+
+
+class RetrievalMemory:
+    """
+    Embedding index over every message of a user's chats, so a new session
+    can draw on earlier ones. Messages are split into RETRIEVAL_CHUNK_WORDS
+    word chunks and embedded with embed_prompt(). Vectors are stored as
+    columns of a float32 (dim x chunks) matrix, grown by doubling: a prompt
+    embedding has only a handful of non-zero dimensions, so scoring every
+    chunk reads just those rows. A chunk is only (session, msg_index,
+    character offsets) in parallel int arrays; `fetch(session, msg_index)`
+    reads the text back for the hits returned. Same incremental, thread-safe
+    API as ConversationIndex (add_message / sync / remove_session).
+    """
+
+    def __init__(self, fetch: Callable[[Any, int], Optional[Mapping]], dim: int = RETRIEVAL_DIM,
+                 chunk_words: int = RETRIEVAL_CHUNK_WORDS, title: Callable[[Any], str] = str):
+        self.fetch = fetch
+        self.dim = dim
+        self.chunk_words = chunk_words
+        self.title = title                                      # session -> title shown in recall()
+        self._lock = threading.RLock()
+        self._vectors = np.zeros((dim, 1024), dtype=np.float32)
+        self._owners = np.full(1024, -1, dtype=np.int32)      # session number per chunk, -1 once removed
+        self._refs = np.zeros((1024, 3), dtype=np.int32)        # (msg_index, start, end) per chunk
+        self._session_ids: Dict[Any, int] = {}                  # session -> session number
+        self._names: Dict[int, Any] = {}
+        self._indexed: Dict[Any, int] = {}                      # session -> messages seen
+        self._size = 0
+
+    @classmethod
+    def from_sessions(cls, sessions: Mapping) -> "RetrievalMemory":
+        memory = cls(lambda session, i: sessions[session][i], title=functools.partial(session_title, sessions))
+        memory.sync(sessions)
+        return memory
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self._owners[:self._size] >= 0))
+
+    def _session_id(self, session: Any) -> int:
+        number = self._session_ids.get(session)
+        if number is None:
+            number = self._session_ids[session] = len(self._names)
+            self._names[number] = session
+        return number
+
+    def _grow(self):
+        capacity = 2 * self._size
+        grown = np.zeros((self.dim, capacity), dtype=np.float32)
+        grown[:, :self._size] = self._vectors
+        owners = np.full(capacity, -1, dtype=np.int32)
+        owners[:self._size] = self._owners
+        refs = np.zeros((capacity, 3), dtype=np.int32)
+        refs[:self._size] = self._refs
+        self._vectors, self._owners, self._refs = grown, owners, refs
+
+    def add_message(self, session: Any, msg_index: int, msg: Mapping):
+        """Index one message. Call this whenever a message is appended; already indexed ones are skipped."""
+        with self._lock:
+            if msg_index < self._indexed.get(session, 0):
+                return
+            self._indexed[session] = msg_index + 1
+            content = msg.get("content", "")
+            if not isinstance(content, str) or msg.get("image_key"):
+                return
+            words = [m.span() for m in re.finditer(r"\S+", content)]
+            number = self._session_id(session)
+            for i in range(0, len(words), self.chunk_words):
+                start, end = words[i][0], words[min(i + self.chunk_words, len(words)) - 1][1]
+                vector = embed_prompt(content[start:end], self.dim)
+                if not vector.any():
+                    continue
+                if self._size == self._vectors.shape[1]:
+                    self._grow()
+                self._vectors[:, self._size] = vector
+                self._owners[self._size] = number
+                self._refs[self._size] = (msg_index, start, end)
+                self._size += 1
+
+    def add_messages(self, messages):
+        """Index (session, msg_index, msg) triples, e.g. SessionStore.iter_messages(), under one lock."""
+        with self._lock:
+            for session, msg_index, msg in messages:
+                self.add_message(session, msg_index, msg)
+
+    def sync(self, sessions: Mapping):
+        """Index any messages not seen yet and drop sessions that no longer exist."""
+        with self._lock:
+            for session in [s for s in self._indexed if s not in sessions]:
+                self.remove_session(session)
+            for session, history in sessions.items():
+                for i in range(self._indexed.get(session, 0), len(history)):
+                    self.add_message(session, i, history[i])
+
+    def remove_session(self, session: Any):
+        """Forget a session; its chunks stay allocated but never match again."""
+        with self._lock:
+            self._indexed.pop(session, None)
+            number = self._session_ids.pop(session, None)
+            if number is not None:
+                self._owners[:self._size][self._owners[:self._size] == number] = -1
+                del self._names[number]
+
+    def search(self, query: str, k: int = RETRIEVAL_TOP_K, exclude: Any = None,
+               min_similarity: float = RETRIEVAL_MIN_SIMILARITY) -> List[Dict[str, Any]]:
+        """Up to `k` chunks most similar to `query`, best first, skipping session `exclude`."""
+        q = embed_prompt(query, self.dim)
+        dims = np.flatnonzero(q)
+        with self._lock:
+            n = self._size
+            if not n or not dims.size:
+                return []
+            scores = q[dims] @ self._vectors[dims, :n]
+            owners = self._owners[:n]
+            scores[owners < 0] = -1.0
+            if exclude in self._session_ids:
+                scores[owners == self._session_ids[exclude]] = -1.0
+            top = np.argpartition(-scores, k - 1)[:k] if n > k else np.arange(n)
+            ranked = [(float(scores[i]), self._names[int(owners[i])], *map(int, self._refs[i]))
+                      for i in top[np.argsort(-scores[top])] if scores[i] >= min_similarity]
+
+        # Text is read back only for these few hits, outside the lock
+        hits, messages = [], {}
+        for score, session, msg_index, start, end in ranked:
+            if (session, msg_index) not in messages:
+                messages[session, msg_index] = self.fetch(session, msg_index)
+            msg = messages[session, msg_index]
+            if msg is None:
+                continue
+            hits.append({
+                "session": session,
+                "role": msg.get("role", "user"),
+                "text": msg.get("content", "")[start:end],
+                "score": round(score, 3),
+            })
+        return hits
+
+    def recall(self, query: str, exclude: Any = None, budget: int = RETRIEVAL_TOKEN_BUDGET,
+               k: int = RETRIEVAL_TOP_K, model: str = "llama-3.3-70b-versatile") -> str:
+        """
+        System-prompt block of the best snippets from other sessions for
+        `query`, highest scoring first, within `budget` tokens ("" if none).
+        """
+        header = "Possibly relevant excerpts from the user's earlier chats (use them only if they help):"
+        used = count_tokens(header, model)
+        lines, seen = [], set()
+        for hit in self.search(query, k, exclude):
+            if hit["text"] in seen:
+                continue
+            who = "User" if hit["role"] == "user" else "HEXALOY"
+            line = f"- [{who}, in “{self.title(hit['session'])}”] {' '.join(hit['text'].split())}"
+            cost = count_tokens(line, model)
+            if used + cost > budget:
+                continue
+            lines.append(line)
+            seen.add(hit["text"])
+            used += cost
+        return "\n".join([header] + lines) if lines else ""
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# FEATURE MODULE 30: MODEL CASCADE (easy prompts to a smaller, faster model)
+# ──────────────────────────────────────────────────────────────────────────────
+
+CASCADE_MODELS = {
+    "light": ["llama-3.1-8b-instant", "llama-3.3-70b-versatile"],     # escalate on failure
+    "full":  ["llama-3.3-70b-versatile"],
+}
+CASCADE_THRESHOLD = int(os.environ.get("HEXALOY_CASCADE_THRESHOLD", "3"))  # score from which the full model answers
+CASCADE_SAMPLES = 2000                  # recent routed answers kept for tuning the threshold
+CASCADE_RETRIES = 1                     # retries on a model before escalating to the next one
+
+# Quick actions that only reshape the last answer vs. ones that need new reasoning
+LIGHT_ACTIONS = {"📋 Summarize", "💡 Simplify", "🌐 Translate", "🎯 Key Points", "⚡ Shorter"}
+RESPONSE_ACTION_LABELS = {prompt: label for label, prompt in RESPONSE_ACTIONS}
+HEAVY_PERSONAS = {"👨‍💻 Senior Dev", "🧑‍🔬 Research Scientist", "📈 Business Strategist"}
+HEAVY_TEMPLATES = {"💻 Code Review", "🐛 Debug Code", "📊 Data Analysis", "🔍 Research Summary"}
+
+_CODE_RE = re.compile(
+    r"```|=>|\w\(.*\)|[{};]\s*$|\b(?:def|class|import|return|function|const|select|traceback|exception|"
+    r"stack trace|regex|sql|api|compile[rd]?|bug|script)\b", re.MULTILINE)
+_MATH_RE = re.compile(
+    r"\d\s*[-+*/^=]\s*\d|\\[a-z]+\{|\b(?:prove|proof|derive|derivative|integral|equation|theorem|"
+    r"probability|matrix|calculate|solve)\b")
+_TECHNICAL_RE = re.compile(
+    r"\b(?:algorithms?|data structures?|threads?|mutex|concurrency|async|database|postgres(?:ql)?|mysql|"
+    r"mongodb|redis|kubernetes|docker|compiler|kernel|latency|big-o|recursion|encryption|machine learning)\b")
+_REASONING_RE = re.compile(
+    r"\b(?:why|compare|difference between|analy[sz]e|design|architect\w*|trade-?offs?|pros and cons|"
+    r"step[- ]by[- ]step|in detail|strategy|evaluate|optimi[sz]e|plan)\b")
+
+
+def score_prompt_complexity(prompt: str, route: Dict[str, Any], persona: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Local estimate of how much model a prompt needs: {"score", "signals",
+    "tier"}. Points for length, code, maths and technical markers, each
+    distinct reasoning word (up to 3), a demanding persona or template, and
+    quick actions that need new content; reshaping actions ("Shorter",
+    "Translate", ...) always go light.
+    """
+    text = prompt.strip()
+    action = RESPONSE_ACTION_LABELS.get(text)
+    signals: List[str] = []
+    score = 0
+    if action in LIGHT_ACTIONS:
+        signals.append(f"action {action}")
+    else:
+        lowered = text.lower()
+        tokens = count_tokens(text)
+        checks = [
+            (action is not None, 3, f"action {action}"),
+            (tokens >= 200, 3, "long"),
+            (60 <= tokens < 200, 1, "medium length"),
+            (_CODE_RE.search(lowered) is not None, 3, "code"),
+            (_MATH_RE.search(lowered) is not None, 3, "maths"),
+            (_TECHNICAL_RE.search(lowered) is not None, 2, "technical"),
+            (effective_persona(route, persona) in HEAVY_PERSONAS, 3, "persona"),
+            (route.get("template") in HEAVY_TEMPLATES, 2, "template"),
+        ]
+        for hit, points, signal in checks:
+            if hit:
+                score += points
+                signals.append(signal)
+        reasoning = len(set(_REASONING_RE.findall(lowered)))
+        if reasoning:
+            score += min(reasoning, 3)
+            signals.append(f"reasoning x{reasoning}")
+    return {"score": score, "signals": signals, "tier": "full" if score >= CASCADE_THRESHOLD else "light"}
+
+
+class CascadeRun:
+    """
+    One answer through the cascade: streams from the first model of the
+    tier and, if that model fails before its first token (after
+    CASCADE_RETRIES retries), starts over on the next one, ending with the
+    tier's FALLBACK_MODELS alternate. Models whose circuit breaker is open
+    are skipped. Each model's request is hedged: if the first token is later
+    than that model's usual TTFT, a duplicate is sent and the first to
+    answer wins (see UpstreamHealth). `request` and `model` always describe
+    the attempt in progress.
+    """
+
+    def __init__(self, scheduler: "RequestScheduler", owner: str, models: List[str], prompt_tokens: int,
+                 open_stream: Callable[[str], AsyncIterator[str]], background: bool = False,
+                 health: Optional["UpstreamHealth"] = None, hedge: bool = True, fallback: bool = True):
+        alternate = FALLBACK_MODELS.get(models[-1]) if fallback else None
+        self.scheduler = scheduler
+        self.owner = owner
+        self.models = models + [alternate] if alternate and alternate not in models else models
+        self.prompt_tokens = prompt_tokens
+        self.open_stream = open_stream
+        self.background = background
+        self.health = health or UPSTREAM_HEALTH
+        self.hedge = hedge and not background           # speculative work isn't worth a second request
+        self.model = models[0]
+        self.request = self._request(0)
+        self.escalated = False
+        self.hedged = False
+
+    def _request(self, i: int) -> ScheduledRequest:
+        last = i == len(self.models) - 1
+        return ScheduledRequest(self.owner, self.models[i], self.prompt_tokens,
+                                max_retries=None if last else CASCADE_RETRIES, background=self.background)
+
+    async def stream(self) -> AsyncIterator[str]:
+        for i, model in enumerate(self.models):
+            last = i == len(self.models) - 1
+            if i:
+                self.model, self.escalated = model, True
+                self.request = self._request(i)
+            if not last and self.health.breaker(model).is_open():
+                continue
+            started = False
+            try:
+                async for piece in self._attempt(i):
+                    started = True
+                    yield piece
+                return
+            except _FALLBACK_ERRORS:
+                if started or last:
+                    raise
+
+    async def _attempt(self, i: int) -> AsyncIterator[str]:
+        """Stream model `i`, sending one duplicate request if its first token is late."""
+        model, health = self.models[i], self.health
+        hedge_after = health.hedge_after(model) if self.hedge else None
+        queue: asyncio.Queue = asyncio.Queue()
+        requests: List[ScheduledRequest] = []
+        opened: Dict[int, float] = {}           # attempt -> when its current HTTP request was sent
+        tasks: List[asyncio.Task] = []
+
+        async def pump(n: int, req: ScheduledRequest):
+            def open_stream():
+                opened[n] = time.perf_counter()
+                return health.watch(model, self.open_stream(model))
+            try:
+                async for piece in self.scheduler.run(req, open_stream):
+                    await queue.put((n, piece))
+                await queue.put((n, _STREAM_END))
+            except Exception as e:
+                await queue.put((n, e))
+
+        def launch():
+            req = self._request(i) if requests else self.request
+            requests.append(req)
+            tasks.append(asyncio.ensure_future(pump(len(tasks), req)))
+
+        launch()
+        winner, failed = None, 0
+        try:
+            while True:
+                timeout = None
+                if winner is None:
+                    timeout = HEDGE_POLL             # still queued for quota: nothing to time yet
+                    if opened:
+                        waited = time.perf_counter() - min(opened.values())
+                        if waited >= FIRST_TOKEN_TIMEOUT:
+                            health.breaker(model).failure()
+                            health.timeouts += 1
+                            raise UpstreamTimeout(f"{model} sent no first token in {waited:.0f}s")
+                        if hedge_after is not None and len(tasks) == 1 and waited >= hedge_after:
+                            launch()
+                            self.hedged = True
+                            health.hedges += 1
+                            continue
+                        timeout = (hedge_after if len(tasks) == 1 and hedge_after is not None
+                                   else FIRST_TOKEN_TIMEOUT) - waited
+                try:
+                    n, item = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    continue
+                if winner is not None and n != winner:
+                    continue
+                if isinstance(item, BaseException):
+                    if winner is not None:
+                        raise item
+                    failed += 1
+                    if failed == len(tasks):
+                        raise item
+                    continue
+                if winner is None:
+                    winner, self.request = n, requests[n]
+                    health.hedge_wins += n > 0
+                    for j, task in enumerate(tasks):
+                        if j != n:
+                            task.cancel()
+                if item is _STREAM_END:
+                    return
+                yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def promote(self):
+        """Run at interactive priority from now on, including any escalation."""
+        self.background = False
+        self.scheduler.promote(self.request)
+
+
+class CascadeStats:
+    """
+    Latency per route for tuning CASCADE_THRESHOLD from real traffic: the
+    last CASCADE_SAMPLES answers with their complexity score, tier, model
+    and timings. TTFT and total time also go to PROFILER as cascade.<tier>.*
+    spans, so they show in the debug panel and the metrics dump.
+    """
+
+    def __init__(self, max_samples: int = CASCADE_SAMPLES, profiler: Profiler = PROFILER):
+        self.profiler = profiler
+        self._lock = threading.Lock()
+        self.samples: deque = deque(maxlen=max_samples)
+        self.escalations = 0
+
+    def record(self, complexity: Dict[str, Any], run: CascadeRun, metrics: Dict[str, Any]):
+        self.profiler.record_stream(metrics, prefix=f"cascade.{complexity['tier']}")
+        with self._lock:
+            self.escalations += run.escalated
+            self.samples.append({
+                "score": complexity["score"], "tier": complexity["tier"], "model": run.model,
+                "escalated": run.escalated, "hedged": run.hedged, "ttft": metrics.get("ttft"), "total": metrics.get("total_seconds"),
+                "tokens": metrics.get("tokens"),
+            })
+
+    def by_score(self) -> List[Dict[str, Any]]:
+        """Median TTFT and total seconds per complexity score (the threshold's input)."""
+        with self._lock:
+            samples = list(self.samples)
+        groups: Dict[int, List[Dict[str, Any]]] = {}
+        for s in samples:
+            groups.setdefault(s["score"], []).append(s)
+        rows = []
+        for score, group in sorted(groups.items()):
+            ttfts = [s["ttft"] for s in group if s["ttft"] is not None]
+            totals = [s["total"] for s in group if s["total"] is not None]
+            rows.append({
+                "score": score, "answers": len(group),
+                "light": sum(s["tier"] == "light" for s in group),
+                "escalated": sum(s["escalated"] for s in group),
+                "ttft p50 s": round(statistics.median(ttfts), 3) if ttfts else None,
+                "total p50 s": round(statistics.median(totals), 3) if totals else None,
+            })
+        return rows
+
+
+@st.cache_resource
+def get_cascade_stats() -> CascadeStats:
+    """One per process, shared by every browser session."""
+    return CascadeStats()
+
+
+def render_cascade_stats(stats: Optional[CascadeStats] = None):
+    """Debug view of routed answers per complexity score, for picking CASCADE_THRESHOLD."""
+    stats = stats or get_cascade_stats()
+    with st.expander("🛠 Debug: model routes", expanded=False):
+        st.caption(f"Threshold {CASCADE_THRESHOLD} · {len(stats.samples)} answers · {stats.escalations} escalated")
+        rows = stats.by_score()
+        if rows:
+            st.dataframe(rows, use_container_width=True, hide_index=True)
+            st.download_button("Download samples (JSON)", json.dumps(list(stats.samples)),
+                               file_name="hexaloy_routes.json", mime="application/json", key="debug_routes")
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# FEATURE MODULE 31: MODEL COMPARE (one prompt, several models, side by side)
+# ──────────────────────────────────────────────────────────────────────────────
+
+COMPARE_MODELS = ["llama-3.3-70b-versatile", "llama-3.1-8b-instant"]
+COMPARE_MAX_MODELS = 4
+
+
+def render_compare_selector() -> List[str]:
+    """Sidebar switch for compare mode. Returns the models to ask, or [] when it's off."""
+    enabled = st.toggle("Answer with several models", key="compare_mode")
+    models = st.multiselect(
+        "Models", COMPARE_MODELS, default=COMPARE_MODELS, key="compare_models",
+        max_selections=COMPARE_MAX_MODELS, disabled=not enabled, label_visibility="collapsed",
+    )
+    return list(models) if enabled and len(models) >= 2 else []
+
+
+class CompareRun:
+    """
+    One prompt answered by several models at once. Each model gets the same
+    system prompt and the history compressed by build_context_window() for
+    its own context size (plus any `recalled` snippets in the user turn, as
+    in prepare_chat()), and its own scheduled request; all of them stream
+    concurrently on the StreamingEngine loop, so the whole comparison takes
+    as long as the slowest model rather than the sum of all of them.
+    Identical requests already in flight are joined through SingleFlight;
+    the response cache is skipped so every column shows live timings.
+    """
+
+    def __init__(self, client: groq.AsyncGroq, owner: str, models: List[str], history: Sequence,
+                 instructions: str, engine: "StreamingEngine", scheduler: "RequestScheduler",
+                 flights: "SingleFlight", temperature: float = 0.7, recalled: str = ""):
+        self.models = models
+        self.requests: List[ScheduledRequest] = []
+        self.handles: List[ResponseStream] = []
+        self.started = time.perf_counter()
+        for model in models:
+            messages, prompt_tokens = build_context_window(history, instructions, model,
+                                                           extra_tokens=count_tokens(recalled, model) if recalled else 0)
+            key = response_cache_key(model, messages, temperature)
+            req = ScheduledRequest(owner, model, prompt_tokens)
+            self.requests.append(req)
+            self.handles.append(engine.submit(self._opener(
+                client, scheduler, flights, req, with_recalled(messages, recalled), key, temperature,
+            )))
+
+    @staticmethod
+    def _opener(client, scheduler, flights, req, messages, key, temperature) -> Callable[[], AsyncIterator[str]]:
+        def open_stream():
+            return flights.subscribe(key, lambda: scheduler.run(req, lambda: groq_text_stream(
+                client, messages=messages, model=req.model, temperature=temperature)))
+        return open_stream
+
+    async def _drain(self, live: List[ResponseStream], interval: float, idle: float):
+        # Wake up as soon as any model has something, then give each the same short window to catch up
+        getters = []
+        for h in live:
+            if h._getter is None:
+                h._getter = asyncio.ensure_future(h._queue.get())
+            getters.append(h._getter)
+        await asyncio.wait(getters, timeout=idle, return_when=asyncio.FIRST_COMPLETED)
+        return await asyncio.gather(*(h._drain(interval, 0) for h in live))
+
+    def batches(self, interval: float = STREAM_FLUSH_INTERVAL,
+                idle: float = STREAM_IDLE_POLL) -> Generator[List[str], None, None]:
+        """
+        Yield one batch per model ("" where nothing arrived) until every
+        stream has ended. A model's error is left on its handle instead of
+        being raised, so the other columns keep going.
+        """
+        loop = self.handles[0]._loop
+        try:
+            while not self.done:
+                live = [h for h in self.handles if not h.done]
+                drained = dict(zip(map(id, live), asyncio.run_coroutine_threadsafe(
+                    self._drain(live, interval, idle), loop).result()))
+                batches = []
+                for h in self.handles:
+                    pieces, ended = drained.get(id(h), ([], h.done))
+                    batch = "".join(pieces)
+                    h.text += batch
+                    h.done = h.done or ended
+                    batches.append(batch)
+                yield batches
+        finally:
+            self.cancel()
+
+    @property
+    def done(self) -> bool:
+        return all(h.done for h in self.handles)
+
+    def cancel(self):
+        for h in self.handles:
+            h.cancel()
+
+    def wall_seconds(self) -> float:
+        ends = [h.finished_at or time.perf_counter() for h in self.handles]
+        return round(max(ends) - self.started, 3)
+
+    def results(self) -> List[Dict[str, Any]]:
+        """Per model: its answer so far, streaming metrics and error (None if it succeeded)."""
+        return [
+            {"model": m, "content": h.text, "metrics": h.metrics(), "error": h.error}
+            for m, h in zip(self.models, self.handles)
+        ]
+
+
+def compare_summary(results: List[Dict[str, Any]], wall_seconds: float) -> str:
+    """Caption under a comparison: wall time against running the models one after another."""
+    sequential = sum(r["metrics"].get("total_seconds") or 0 for r in results)
+    return f"⚖️ {len(results)} models in {wall_seconds:.2f}s · one after another ≈ {sequential:.2f}s"
+
+
+def _compare_column_caption(result: Dict[str, Any]) -> str:
+    metrics = result["metrics"]
+    parts = [format_stream_metrics(metrics)]
+    if metrics.get("total_seconds") is not None:
+        parts.append(f"total {metrics['total_seconds']:.2f}s")
+    return " · ".join(p for p in parts if p)
+
+
+def render_compare_stream(run: CompareRun, scheduler: "RequestScheduler") -> List[Dict[str, Any]]:
+    """Stream a CompareRun into one column per model, then caption each with its timings."""
+    columns = st.columns(len(run.models))
+    bodies, captions = [], []
+    for col, model in zip(columns, run.models):
+        with col:
+            st.markdown(f"**{model}**")
+            bodies.append(st.empty())
+            captions.append(st.empty())
+    for batches in run.batches():
+        for i, (h, batch) in enumerate(zip(run.handles, batches)):
+            if batch:
+                bodies[i].markdown(h.text + ("" if h.done else " ▌"))
+            if h.text or h.done:
+                captions[i].empty()
+            else:
+                captions[i].caption(scheduler.describe(run.requests[i]) or
+                                    f"⏳ Waiting for the first token… {time.perf_counter() - h.started:.1f}s")
+    results = run.results()
+    for i, result in enumerate(results):
+        bodies[i].markdown(result["content"])
+        if result["error"] is not None:
+            captions[i].error(describe_upstream_error(result["error"]))
+        else:
+            captions[i].caption(_compare_column_caption(result))
+    st.caption(compare_summary(results, run.wall_seconds()))
+    return results
+
+
+def compare_message(results: List[Dict[str, Any]], wall_seconds: float) -> Dict[str, Any]:
+    """
+    History entry for a comparison. The first model's answer is the message
+    content, so follow-up prompts see one reply; every column is kept under
+    "compare" for display.
+    """
+    answered = [r for r in results if r["content"]] or results
+    return {
+        "role": "assistant", "content": answered[0]["content"], "model": answered[0]["model"],
+        "compare": [{"model": r["model"], "content": r["content"], "metrics": r["metrics"]} for r in results],
+        "compare_seconds": wall_seconds,
+    }
+
+
+def render_compare_message(message: Mapping):
+    """A stored comparison, one column per model."""
+    results = message["compare"]
+    for col, result in zip(st.columns(len(results)), results):
+        with col:
+            st.markdown(f"**{result['model']}**")
+            st.markdown(result["content"])
+            st.caption(_compare_column_caption(result))
+    if message.get("compare_seconds") is not None:
+        st.caption(compare_summary(results, message["compare_seconds"]))
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# FEATURE MODULE 32: SPECULATIVE QUICK ACTIONS (prefetch likely follow-ups)
+# ──────────────────────────────────────────────────────────────────────────────
+
+PREFETCH_ACTIONS = 2                    # quick actions prepared after each answer
+PREFETCH_DEFAULT_ACTIONS = ["📋 Summarize", "⚡ Shorter"]      # until there are clicks to go by
+PREFETCH_TOKEN_BUDGET = int(os.environ.get("HEXALOY_PREFETCH_TOKENS", "8000"))  # per user per window
+PREFETCH_BUDGET_WINDOW = 3600.0         # seconds
+PREFETCH_REPLY_ESTIMATE = 300           # tokens assumed for an action's answer when checking the budget
+
+
+class PrefetchEntry:
+    """One quick action prepared for a given point of a chat: (owner, chat, message count, prompt)."""
+
+    def __init__(self, owner: str, chat: Any, position: int, label: str, prompt: str, key: str,
+                 run: CascadeRun):
+        self.owner = owner
+        self.chat = chat
+        self.position = position
+        self.label = label
+        self.prompt = prompt
+        self.key = key                  # response_cache_key() the click will compute
+        self.run = run
+        self.parts: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.used = False
+        self.future = None              # concurrent.futures.Future of the collecting coroutine
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+    def tokens(self) -> int:
+        """Tokens spent upstream so far (none while the request is still queued)."""
+        if self.run.request.granted_at is None:
+            return 0
+        return self.run.prompt_tokens + count_tokens(self.text)
+
+
+class SpeculativePrefetcher:
+    """
+    Prepares the most-clicked quick actions for the answer just shown, while
+    the user reads it. Requests run at background priority in the
+    RequestScheduler and within PREFETCH_TOKEN_BUDGET tokens per user per
+    PREFETCH_BUDGET_WINDOW. Clicking a finished entry replays it at once.
+    Clicking one still streaming promotes it to normal priority, and the
+    click's own request joins it through SingleFlight (same cache key).
+    Whatever the user sends next drops the rest. Process-wide; the
+    collectors run on the StreamingEngine loop.
+    """
+
+    def __init__(self, engine: "StreamingEngine", scheduler: "RequestScheduler", flights: "SingleFlight",
+                 budget: int = PREFETCH_TOKEN_BUDGET, window: float = PREFETCH_BUDGET_WINDOW):
+        self.engine = engine
+        self.scheduler = scheduler
+        self.flights = flights
+        self.budget = budget
+        self.window = window
+        self._lock = threading.Lock()
+        self._entries: Dict[str, List[PrefetchEntry]] = {}     # owner -> live entries
+        self._spent: Dict[str, deque] = {}                      # owner -> (time, tokens) per finished entry
+        self.clicks: Counter = Counter()
+        self.prefetched = self.hits = self.joined = self.wasted = self.over_budget = 0
+        self.wasted_tokens = 0
+
+    def record_click(self, label: str):
+        with self._lock:
+            self.clicks[label] += 1
+
+    def top_actions(self, n: int = PREFETCH_ACTIONS) -> List[str]:
+        """The `n` most-clicked action labels, PREFETCH_DEFAULT_ACTIONS first among ties."""
+        with self._lock:
+            clicks = dict(self.clicks)
+        preferred = {label: i for i, label in enumerate(PREFETCH_DEFAULT_ACTIONS)}
+        labels = [label for label, _ in RESPONSE_ACTIONS]
+        labels.sort(key=lambda label: (-clicks.get(label, 0), preferred.get(label, len(preferred))))
+        return labels[:n]
+
+    def spent(self, owner: str) -> int:
+        """Tokens `owner`'s prefetches used in the last `window` seconds."""
+        cutoff = time.time() - self.window
+        with self._lock:
+            spent = self._spent.get(owner)
+            if not spent:
+                return 0
+            while spent and spent[0][0] < cutoff:
+                spent.popleft()
+            return sum(tokens for _, tokens in spent)
+
+    def schedule(self, owner: str, chat: Any, position: int,
+                 prepare: Callable[[str], Tuple[List[str], List[dict], int, str]],
+                 open_stream: Callable[[str, List[dict]], AsyncIterator[str]]) -> List[PrefetchEntry]:
+        """
+        Drop `owner`'s earlier entries and start the top actions for message
+        `position` of `chat`. `prepare(prompt)` returns (cascade models,
+        messages, prompt tokens, cache key) exactly as the click would build
+        them (prepare_chat());
+        `open_stream(model, messages)` opens the upstream stream.
+        """
+        self.drop(owner)
+        entries: List[PrefetchEntry] = []
+        committed = self.spent(owner)
+        actions = dict(RESPONSE_ACTIONS)
+        for label in self.top_actions():
+            models, messages, prompt_tokens, key = prepare(actions[label])
+            committed += prompt_tokens + PREFETCH_REPLY_ESTIMATE
+            if committed > self.budget:
+                self.over_budget += 1
+                break
+            run = CascadeRun(self.scheduler, owner, models, prompt_tokens,
+                             functools.partial(open_stream, messages=messages), background=True)
+            entry = PrefetchEntry(owner, chat, position, label, actions[label], key, run)
+            entry.future = asyncio.run_coroutine_threadsafe(self._collect(entry), self.engine.loop)
+            entries.append(entry)
+        with self._lock:
+            self._entries[owner] = entries
+            self.prefetched += len(entries)
+        return entries
+
+    async def _collect(self, entry: PrefetchEntry):
+        try:
+            async for piece in self.flights.subscribe(entry.key, entry.run.stream):
+                entry.parts.append(piece)
+            entry.done = True
+        except Exception as e:
+            entry.error = e
+        finally:
+            with self._lock:
+                self._spent.setdefault(entry.owner, deque()).append((time.time(), entry.tokens()))
+
+    def claim(self, owner: str, chat: Any, position: int, prompt: str) -> Optional[PrefetchEntry]:
+        """
+        Call when `owner` sends `prompt` as message `position` of `chat`:
+        returns the entry prepared for exactly that, if any, and drops the rest.
+        """
+        with self._lock:
+            entries = self._entries.pop(owner, [])
+        match = next((e for e in entries if (e.chat, e.position, e.prompt) == (chat, position, prompt)), None)
+        for entry in entries:
+            if entry is not match:
+                self._discard(entry)
+        if match is not None:
+            with self._lock:
+                self._entries[owner] = [match]
+        return match
+
+    def use(self, entry: PrefetchEntry, key: str) -> Optional[str]:
+        """
+        The prepared answer if `entry` finished and matches the request about
+        to be made (cache `key`), else None. A matching entry still streaming
+        is promoted and left running for the request to join.
+        """
+        with self._lock:
+            live = self._entries.get(entry.owner, [])
+            if entry in live:
+                live.remove(entry)
+        if entry.key != key or entry.error is not None or entry.future.cancelled():
+            self._discard(entry)
+            return None
+        entry.used = True
+        if not entry.done:
+            entry.run.promote()
+            if not entry.done:
+                self.joined += 1
+                return None
+        self.hits += 1
+        return entry.text
+
+    def abandon(self, entry: PrefetchEntry):
+        """
+        Stop `entry` when the click it was claimed for got its answer some
+        other way (semantic or response cache), promoted or not.
+        """
+        with self._lock:
+            live = self._entries.get(entry.owner, [])
+            if entry in live:
+                live.remove(entry)
+        if not entry.used:
+            self._discard(entry)
+        elif not entry.done and not entry.future.done():
+            entry.future.cancel()
+            self.joined -= 1
+            self.wasted += 1
+            self.wasted_tokens += entry.tokens()
+
+    def _discard(self, entry: PrefetchEntry):
+        if entry.used:
+            return
+        entry.used = True
+        if not entry.done:
+            entry.future.cancel()
+        self.wasted += 1
+        self.wasted_tokens += entry.tokens()
+
+    def drop(self, owner: str):
+        """Discard every live entry of `owner`."""
+        with self._lock:
+            entries = self._entries.pop(owner, [])
+        for entry in entries:
+            self._discard(entry)
+
+    def stats(self) -> Dict[str, Any]:
+        used = self.hits + self.joined
+        return {
+            "prefetched": self.prefetched, "hits": self.hits, "joined": self.joined,
+            "hit_rate": round(used / self.prefetched, 3) if self.prefetched else 0.0,
+            "wasted": self.wasted, "wasted_tokens": self.wasted_tokens, "over_budget": self.over_budget,
+        }
+
+
+@st.cache_resource
+def get_prefetcher() -> SpeculativePrefetcher:
+    """One per process, shared by every browser session."""
+    return SpeculativePrefetcher(get_stream_engine(), get_request_scheduler(), get_single_flight())
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# FEATURE MODULE 33: UPSTREAM RESILIENCE (hedged requests, circuit breakers)
+# ──────────────────────────────────────────────────────────────────────────────
+
+# Alternate model a cascade ends with, so answers still arrive when a model is down
+FALLBACK_MODELS = {
+    "llama-3.3-70b-versatile": "llama-3.1-8b-instant",
+    "llama-3.1-8b-instant":    "llama-3.3-70b-versatile",
+}
+HEDGE_PERCENTILE = 0.95             # hedge once the first token is later than this share of recent ones
+HEDGE_MIN_SAMPLES = 20              # TTFTs needed before trusting the percentile
+HEDGE_DEFAULT_AFTER = 2.0           # seconds, until then
+HEDGE_MIN_AFTER = 0.3               # never hedge sooner than this
+HEDGE_SAMPLES = 500                 # recent TTFTs kept per model
+HEDGE_POLL = 0.05                   # seconds between checks while a request waits for quota
+FIRST_TOKEN_TIMEOUT = float(os.environ.get("HEXALOY_FIRST_TOKEN_TIMEOUT", "20"))
+BREAKER_FAILURES = 5                # consecutive upstream errors that open a model's breaker
+BREAKER_COOLDOWN = 30.0             # seconds open before one probe request is let through
+BREAKER_PROBE_TIMEOUT = FIRST_TOKEN_TIMEOUT    # seconds a probe may go without a verdict before another is let through
+
+
+class CircuitOpenError(Exception):
+    """The model's circuit breaker is open: fail fast instead of calling it."""
+
+
+class UpstreamTimeout(Exception):
+    """No first token within FIRST_TOKEN_TIMEOUT seconds (hedge included)."""
+
+
+_FALLBACK_ERRORS = _RETRYABLE_ERRORS + (CircuitOpenError, UpstreamTimeout)
+
+
+class CircuitBreaker:
+    """
+    Closed: calls go through. After `failures` consecutive errors it opens
+    and rejects calls for `cooldown` seconds, then lets a single probe
+    through (half-open): success closes it, another error re-opens it.
+    A probe that ends without a verdict (cancelled) is released, and one
+    silent for `probe_timeout` seconds is given up on, so a lost probe
+    can't keep the breaker refusing calls.
+    """
+
+    def __init__(self, failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN,
+                 probe_timeout: float = BREAKER_PROBE_TIMEOUT):
+        self.threshold = failures
+        self.cooldown = cooldown
+        self.probe_timeout = probe_timeout
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.probe_started = 0.0
+        self.trips = 0
+
+    def _probe_busy(self) -> bool:
+        return self.probing and time.monotonic() - self.probe_started < self.probe_timeout
+
+    def is_open(self) -> bool:
+        """Whether a call now would be rejected (read-only; allow() is what takes the probe)."""
+        with self._lock:
+            if self.state == "open":
+                return time.monotonic() - self.opened_at < self.cooldown
+            return self.state == "half_open" and self._probe_busy()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.cooldown:
+                    return False
+                self.state, self.probing = "half_open", False
+            if self._probe_busy():
+                return False
+            self.probing, self.probe_started = True, time.monotonic()
+            return True
+
+    def release(self):
+        """The call allow() let through ended without a verdict; a half-open breaker takes a new probe."""
+        with self._lock:
+            self.probing = False
+
+    def success(self):
+        with self._lock:
+            self.state, self.failures, self.probing = "closed", 0, False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.threshold):
+                self.state, self.opened_at, self.probing = "open", time.monotonic(), False
+                self.trips += 1
+
+
+class UpstreamHealth:
+    """
+    Per-model breakers and recent TTFTs, shared by every request of the
+    process. watch() wraps each HTTP stream to feed both; hedge_after()
+    turns the TTFTs into the delay after which CascadeRun sends a duplicate.
+    """
+
+    def __init__(self, failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN,
+                 probe_timeout: float = BREAKER_PROBE_TIMEOUT):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.probe_timeout = probe_timeout
+        self._lock = threading.Lock()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._ttfts: Dict[str, deque] = {}
+        self.hedges = self.hedge_wins = self.timeouts = self.rejected = 0
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(model)
+            if breaker is None:
+                breaker = self._breakers[model] = CircuitBreaker(self.failures, self.cooldown, self.probe_timeout)
+            return breaker
+
+    def observe_ttft(self, model: str, seconds: float):
+        with self._lock:
+            self._ttfts.setdefault(model, deque(maxlen=HEDGE_SAMPLES)).append(seconds)
+
+    def hedge_after(self, model: str) -> float:
+        """Seconds without a first token after which a request to `model` is hedged."""
+        with self._lock:
+            samples = sorted(self._ttfts.get(model, ()))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_AFTER
+        return max(HEDGE_MIN_AFTER, samples[int(HEDGE_PERCENTILE * (len(samples) - 1))])
+
+    async def watch(self, model: str, stream: AsyncIterator[str]) -> AsyncIterator[str]:
+        """Pass `stream` through, recording its TTFT and any error against `model`'s breaker."""
+        breaker = self.breaker(model)
+        if not breaker.allow():
+            self.rejected += 1
+            raise CircuitOpenError(f"{model} is failing; its circuit breaker is open")
+        probe = breaker.state == "half_open"        # this call is the breaker's one probe
+        t0 = time.perf_counter()
+        first = True
+        settled = False
+        try:
+            async for piece in stream:
+                if first:
+                    first = False
+                    self.observe_ttft(model, time.perf_counter() - t0)
+                    breaker.success()
+                    settled = True
+                yield piece
+            if first:
+                breaker.success()
+                settled = True
+        except _RETRYABLE_ERRORS:
+            breaker.failure()
+            settled = True
+            raise
+        finally:
+            # Cancelled (Stop, lost hedge, dropped prefetch) or a non-upstream error before the first token
+            if probe and not settled:
+                breaker.release()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            models = sorted(set(self._breakers) | set(self._ttfts))
+            ttfts = {m: sorted(self._ttfts.get(m, ())) for m in models}
+        rows = []
+        for model in models:
+            breaker, samples = self.breaker(model), ttfts[model]
+            rows.append({
+                "model": model, "breaker": breaker.state, "errors in a row": breaker.failures,
+                "trips": breaker.trips,
+                "ttft p50 s": round(samples[len(samples) // 2], 3) if samples else None,
+                "ttft p99 s": round(samples[int(0.99 * (len(samples) - 1))], 3) if samples else None,
+                "hedge after s": round(self.hedge_after(model), 3),
+            })
+        return rows
+
+
+UPSTREAM_HEALTH = UpstreamHealth()
+
+
+def render_upstream_health(health: UpstreamHealth = UPSTREAM_HEALTH):
+    """Debug view of breakers, TTFT percentiles and hedging per model."""
+    with st.expander("🛠 Debug: upstream health", expanded=False):
+        st.caption(f"{health.hedges} hedged requests ({health.hedge_wins} won by the duplicate) · "
+                   f"{health.timeouts} first-token timeouts · {health.rejected} calls refused by open breakers")
+        rows = health.stats()
+        if rows:
+            st.dataframe(rows, use_container_width=True, hide_index=True)
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# FEATURE MODULE 34: CHAT PIPELINE (shared by the app and the batch runner)
+# ──────────────────────────────────────────────────────────────────────────────
+
+HEXALOY_INSTRUCTIONS = """\
+You are 'HEXALOY', an exceptionally intelligent and professional AI assistant.
+1. You possess universal knowledge. You can answer ANY question about coding, science, history, daily life, or business perfectly.
+2. Keep your tone professional, highly accurate, and helpful. Use clear formatting.
+3. YOU ARE AN AI. Do not claim to be human.
+4. IF AND ONLY IF asked about your creator, owner, or who made you, reply exactly with: "I was architected and developed by VINIT MAAN."
+"""
+CHAT_TEMPERATURE = 0.7
+
+
+def chat_system_prompt(prompt: str, route: Dict[str, Any], persona: Optional[str] = None) -> str:
+    """The system prompt for `prompt`: HEXALOY_INSTRUCTIONS with the persona and template from build_system_prompt()."""
+    return build_system_prompt(HEXALOY_INSTRUCTIONS, route, persona)
+
+
+def with_recalled(messages: List[dict], recalled: str) -> List[dict]:
+    """`messages` with `recalled` (RetrievalMemory.recall()) put before the text of the final user turn."""
+    if not recalled:
+        return messages
+    last = dict(messages[-1])
+    last["content"] = f"{recalled}\n\n{last['content']}"
+    return [*messages[:-1], last]
+
+
+def prepare_chat(prompt: str, history: Sequence, route: Dict[str, Any], system_prompt: str,
+                 persona: Optional[str] = None, complexity: Optional[Dict[str, Any]] = None,
+                 temperature: float = CHAT_TEMPERATURE, recalled: str = "") -> Dict[str, Any]:
+    """
+    Everything needed to answer a text prompt whose user turn ends `history`:
+    {"complexity", "models" (the cascade), "messages", "prompt_tokens", "key"}.
+    `recalled` snippets depend on the prompt's wording, so they go into the
+    user turn only after the key is taken: the response-cache key, the
+    semantic-cache scope (messages[:-1]) and prefetch keys stay the same
+    for paraphrases that recall different snippets.
+    """
+    complexity = complexity or score_prompt_complexity(prompt, route, persona)
+    models = CASCADE_MODELS[complexity["tier"]]
+    messages, prompt_tokens = build_context_window(history, system_prompt, models[0],
+                                                   extra_tokens=count_tokens(recalled, models[0]) if recalled else 0)
+    return {
+        "complexity": complexity, "models": models, "messages": with_recalled(messages, recalled),
+        "prompt_tokens": prompt_tokens, "key": response_cache_key(models[0], messages, temperature),
+    }
+
+
+async def run_chat(client: groq.AsyncGroq, scheduler: "RequestScheduler", owner: str, prompt: str,
+                   history: Sequence = (), persona: Optional[str] = None, route: Optional[Dict[str, Any]] = None,
+                   temperature: float = CHAT_TEMPERATURE) -> Dict[str, Any]:
+    """
+    Answer one text prompt without the UI, through the same routing, system
+    prompt, context window, cascade and scheduler as the app. Returns the
+    answer with what it was routed to and its timings.
+    """
+    route = route or route_prompt(prompt)
+    request = prepare_chat(prompt, [*history, {"role": "user", "content": prompt}], route,
+                           chat_system_prompt(prompt, route, persona), persona, temperature=temperature)
+    run = CascadeRun(scheduler, owner, request["models"], request["prompt_tokens"],
+                     lambda m: groq_text_stream(client, messages=request["messages"], model=m, temperature=temperature))
+    started = time.perf_counter()
+    first_token_at = None
+    parts: List[str] = []
+    async for piece in run.stream():
+        if first_token_at is None:
+            first_token_at = time.perf_counter()
+        parts.append(piece)
+    end = time.perf_counter()
+    answer = "".join(parts)
+    tokens = count_tokens(answer)
+    gen_time = end - first_token_at if first_token_at else 0.0
+    return {
+        "answer": answer,
+        "persona": effective_persona(route, persona),
+        "template": route.get("template"),
+        "tier": request["complexity"]["tier"],
+        "score": request["complexity"]["score"],
+        "model": run.model,
+        "escalated": run.escalated,
+        "hedged": run.hedged,
+        "prompt_tokens": request["prompt_tokens"],
+        "tokens": tokens,
+        "queued_s": round(run.request.granted_at - started, 3) if run.request.granted_at else None,
+        "ttft_s": round(first_token_at - started, 3) if first_token_at else None,
+        "total_s": round(end - started, 3),
+        "tokens_per_s": round(tokens / gen_time, 1) if gen_time > 0 else None,
+    }
+
+
+# ──────────────────────────────────────────────────────────────────────────────
+# MODULE EXPORTS / USAGE REFERENCE
+# ──────────────────────────────────────────────────────────────────────────────
+"""
+INTEGRATION GUIDE — hexaloy_features.py
+==========================================
+
+To integrate these features into your main app.py:
+
+    from hexaloy_features import (
+        inject_keyboard_shortcuts,
+        render_export_panel,
+        render_analytics_panel,
+        render_prompt_templates_panel,
+        render_persona_selector,
+        render_search_panel,
+        get_owner_indexes,
+        render_response_actions,
+        render_image_settings,
+        render_chat_insights,
+        show_toast,
+        render_theme_selector,
+        compress_history,
+        render_safety_warnings,
+        render_inspiration_widget,
+        render_onboarding_tips,
+        build_enhanced_image_prompt,
+    )
+
+Usage examples:
+
+    # At the top of your app, inject JS enhancements:
+    inject_keyboard_shortcuts()
+
+    # In sidebar for theme:
+    theme_css = render_theme_selector()
+    st.markdown(theme_css, unsafe_allow_html=True)
+
+    # In sidebar for persona:
+    system_prompt = render_persona_selector()
+
+    # Chats are keyed by session id (StoredSessions); titles are only for display:
+    sessions = StoredSessions(get_session_store(), owner)
+    chat_id = sessions.create("New Session")
+    history = sessions[chat_id]
+    sessions.rename(chat_id, "Trip ideas")     # the id, and so every per-chat state, stays the same
+
+    # In sidebar for search (one index per owner; report appends and deletes, never sync per query):
+    index = get_owner_indexes().search_index(owner)
+    get_owner_indexes().add_message(owner, chat_id, len(history) - 1, history[-1])
+    get_owner_indexes().remove_session(owner, deleted_id)
+    render_search_panel(st.session_state.sessions, index=index)
+
+    # Before sending a message:
+    render_safety_warnings(user_input)
+
+    # Or route it in one pass (image/vision/chat, template, persona, warnings):
+    route = route_prompt(user_input, has_image=uploaded is not None)
+    system_prompt = build_system_prompt(system_prompt, route)
+
+    # Stream an answer off the script thread (cancel() stops it, text keeps what arrived):
+    handle = get_stream_engine().submit(lambda: groq_text_stream(async_client, messages=msgs, model=model))
+    st.write_stream(handle.batches())
+    st.caption(format_stream_metrics(handle.metrics()))
+
+    # ...through the rate-limit scheduler (fair queue per owner, retries; describe() = queue status):
+    request = ScheduledRequest(owner, model, prompt_tokens)
+    handle = get_stream_engine().submit(lambda: get_request_scheduler().run(request, lambda: groq_text_stream(...)))
+
+    # ...sharing one upstream stream between identical requests in flight:
+    key = response_cache_key(model, messages, temperature)
+    handle = get_stream_engine().submit(lambda: get_single_flight().subscribe(key, lambda: scheduler.run(...)))
+
+    # Reuse the answer to a paraphrase of the prompt (same model, system prompt and history):
+    scope = semantic_scope(model, messages[:-1], owner)
+    similar = get_semantic_cache().lookup(prompt, scope, effective_persona(route, persona))
+    ...
+    get_semantic_cache().put(prompt, scope, answer_text)
+
+    # Recall snippets from the user's other chats into the user turn (one memory per owner, fed by the
+    # same get_owner_indexes().add_message() hook as the search index); keys and scope ignore them:
+    recalled = get_owner_indexes().retrieval_memory(owner).recall(user_input, exclude=chat_id)
+    request = prepare_chat(user_input, history, route, system_prompt, persona, recalled=recalled)
+
+    # Send easy prompts to the small model, escalating on failure (?debug=1 shows latency per route):
+    complexity = score_prompt_complexity(user_input, route, persona)
+    run = CascadeRun(get_request_scheduler(), owner, CASCADE_MODELS[complexity["tier"]], prompt_tokens,
+                     lambda model: groq_text_stream(async_client, messages=msgs, model=model))
+    handle = get_stream_engine().submit(run.stream)
+    get_cascade_stats().record(complexity, run, handle.metrics())
+
+    # Ask several models at once, streaming into side-by-side columns (wall time = slowest model):
+    run = CompareRun(async_client, owner, COMPARE_MODELS, history, system_prompt,
+                     get_stream_engine(), get_request_scheduler(), get_single_flight())
+    results = render_compare_stream(run, get_request_scheduler())
+    history.append(compare_message(results, run.wall_seconds()))
+
+    # Prepare the likely quick actions while the user reads (opt-in; dropped by whatever they send next):
+    get_prefetcher().schedule(owner, chat_id, len(history), prepare_action,
+                              lambda model, messages: groq_text_stream(async_client, messages=messages, model=model))
+    entry = get_prefetcher().claim(owner, chat_id, len(history), user_input)
+    text = get_prefetcher().use(entry, key) if entry else None     # None: make the request (joins it if in flight)
+
+    # CascadeRun hedges slow first tokens, skips models whose breaker is open and ends with FALLBACK_MODELS;
+    # ?debug=1 shows breaker states and TTFT percentiles:
+    render_upstream_health()
+
+    # The chat pipeline without the UI (same system prompt, cascade and scheduler); the app's
+    # chat_instructions() and the batch runner are built on it:
+    instructions = chat_system_prompt(prompt, route, persona)
+    request = prepare_chat(prompt, history, route, instructions, persona, recalled=recalled)   # models, messages, key
+    result = await run_chat(async_client, scheduler, owner, prompt, history, persona)
+    # From a shell: GROQ_API_KEY=... python hexaloy_batch.py prompts.jsonl -o results.ndjson --workers 8
+
+    # Generate an image without blocking the script (progress bar, then the cached bytes):
+    job = get_image_jobs().submit(build_enhanced_image_prompt(prompt, style, mood))
+    render_generated_image(get_image_jobs(), job.key, job.url)
+
+    # Sidebar chat list (recent first, date groups, paged, prefix filter):
+    render_session_list(st.session_state.sessions, st.session_state.current_chat)
+
+    # Stored messages are compact read-only Message records that read like dicts:
+    history.append(Message.from_dict({"role": "user", "content": text,
+                                      "ts": datetime.datetime.now().isoformat(" ", "seconds")}))
+    editable = dict(history[-1])
+
+    # Show a long chat as its last CHAT_WINDOW messages plus a "load earlier" button:
+    render_chat_messages(st.session_state.sessions[chat_id], chat_id, load_static_assets())
+
+    # Time a rerun and its hot spots (with HEXALOY_DEBUG_PANEL=1, ?debug=1 shows render_debug_panel()):
+    with PROFILER.rerun(script_session_id()):
+        with span("messages"):
+            ...
 
     # Show analytics in an expander:
     with st.expander("📊 Analytics"):
@@ -1063,7 +5377,7 @@ Usage examples:
 
     # Show export panel:
     with st.expander("📥 Export"):
-        render_export_panel(current_history, session_name)
+        render_export_panel(current_history, sessions.title(chat_id))
 
     # Show onboarding on first visit:
     render_onboarding_tips()
@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# hexaloy_features reads these at import; keep test sessions and profiles out of the working tree.
+os.environ.setdefault("HEXALOY_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="hexaloy-tests-"), "sessions.db"))
+os.environ.setdefault("HEXALOY_PROFILE", "0")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from bench import fake_groq
+
+from hexaloy_batch import combination_records, finished_ids, main, read_prompts, record_id
+from hexaloy_features import AI_PERSONAS, PROMPT_TEMPLATES
+
+
+def _write(path, lines):
+    path.write_text("".join(line + "\n" for line in lines), encoding="utf-8")
+    return str(path)
+
+
+def test_read_prompts_accepts_valid_records_and_skips_blank_lines(tmp_path):
+    path = _write(tmp_path / "prompts.jsonl", [
+        json.dumps({"prompt": "hello"}),
+        "",
+        json.dumps({"prompt": "review this", "persona": next(iter(AI_PERSONAS)),
+                    "template": next(iter(PROMPT_TEMPLATES)),
+                    "history": [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}]}),
+    ])
+    assert [r["prompt"] for r in read_prompts(path)] == ["hello", "review this"]
+
+
+@pytest.mark.parametrize("line, message", [
+    ("{not json", "not valid JSON"),
+    (json.dumps(["prompt"]), 'expected an object with a "prompt" string'),
+    (json.dumps({"prompt": 3}), 'expected an object with a "prompt" string'),
+    (json.dumps({"prompt": "x", "persona": "Pirate"}), "unknown persona 'Pirate'"),
+    (json.dumps({"prompt": "x", "template": "Limerick"}), "unknown template 'Limerick'"),
+    (json.dumps({"prompt": "x", "history": "earlier chat"}), '"history" must be a list'),
+    (json.dumps({"prompt": "x", "history": ["hi"]}), '"history" must be a list'),
+    (json.dumps({"prompt": "x", "history": [{"role": "user"}]}), '"history" must be a list'),
+    (json.dumps({"prompt": "x", "history": [{"role": "bot", "content": "hi"}]}), '"history" must be a list'),
+])
+def test_read_prompts_reports_the_bad_line(tmp_path, line, message):
+    path = _write(tmp_path / "prompts.jsonl", [json.dumps({"prompt": "fine"}), line])
+    with pytest.raises(ValueError, match=f"prompts.jsonl:2: {message}"):
+        list(read_prompts(path))
+
+
+def test_finished_ids_retries_errors_and_skips_a_cut_off_line(tmp_path):
+    path = tmp_path / "results.ndjson"
+    assert finished_ids(str(path)) == set()
+    _write(path, [
+        json.dumps({"id": "a", "status": "ok"}),
+        json.dumps({"id": "b", "status": "error"}),
+        json.dumps({"id": "c", "status": "skipped"}),
+    ])
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"id": "d", "status": "o')
+    assert finished_ids(str(path)) == {"a", "c"}
+
+
+def test_record_id_is_stable_and_prefers_the_given_id():
+    record = {"prompt": "explain photosynthesis", "persona": next(iter(AI_PERSONAS))}
+    assert record_id(record) == record_id(dict(reversed(list(record.items()))))
+    assert record_id(record) == record_id(json.loads(json.dumps(record)))
+    assert record_id(record) != record_id({**record, "prompt": "explain respiration"})
+    assert record_id({**record, "id": 7}) == "7"
+
+
+def test_combinations_run_one_record_per_template_and_persona(tmp_path, monkeypatch):
+    out = tmp_path / "combinations.ndjson"
+    monkeypatch.setenv("GROQ_API_KEY", "fake-batch-combinations")
+    with fake_groq.installed(tokens=["A", " short", " answer."]):
+        assert main(["--combinations", "-o", str(out), "--quota-scale", "1000", "--quiet"]) == 0
+        results = [json.loads(line) for line in out.read_text(encoding="utf-8").splitlines()]
+        expected = {f"{t} × {p}" for t in PROMPT_TEMPLATES for p in AI_PERSONAS}
+        assert len(results) == len(PROMPT_TEMPLATES) * len(AI_PERSONAS) == len(list(combination_records()))
+        assert {r["id"] for r in results} == expected
+        assert all(r["status"] in ("ok", "skipped") for r in results)
+        assert {r["answer"] for r in results if r["status"] == "ok"} == {"A short answer."}
+
+        # A second run resumes and finds nothing left to answer
+        assert main(["--combinations", "-o", str(out), "--quota-scale", "1000", "--quiet"]) == 0
+        assert len(out.read_text(encoding="utf-8").splitlines()) == len(results)
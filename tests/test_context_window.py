@@ -0,0 +1,80 @@
+import random
+
+import pytest
+
+from hexaloy_features import (
+    DEFAULT_CONTEXT_BUDGET, REPLY_TOKEN_RESERVE, TOKEN_ESTIMATE_MARGIN, build_context_window,
+    count_message_tokens, count_tokens, get_model_profile,
+)
+
+TEXT_MODEL = "llama-3.3-70b-versatile"
+VISION_MODEL = "llama-3.2-11b-vision-preview"
+WORDS = "the alloy hexaloy furnace tempered 1200 °C quickly why 日本語 résumé tokenizer".split()
+
+
+def _history(n, rng):
+    return [{"role": "user" if i % 2 == 0 else "assistant",
+             "content": " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 80)))} for i in range(n)]
+
+
+def _cap(model, budget=DEFAULT_CONTEXT_BUDGET, reserve=REPLY_TOKEN_RESERVE):
+    window = int(get_model_profile(model)["context_window"] * (1 - TOKEN_ESTIMATE_MARGIN))
+    return min(budget, window - reserve)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_budget_is_never_exceeded(seed):
+    rng = random.Random(seed)
+    budget = rng.randint(200, 5000)
+    history = _history(rng.randint(1, 200), rng)
+    messages, used = build_context_window(history, "You are HEXALOY.", TEXT_MODEL, budget=budget)
+    assert used == count_message_tokens(messages, TEXT_MODEL)
+    assert used <= budget
+    assert messages[0]["role"] == "system"
+    assert messages[-1]["content"] == history[-1]["content"]
+
+
+def test_extra_tokens_come_out_of_the_budget():
+    history = _history(300, random.Random(1))
+    extra = get_model_profile(VISION_MODEL)["image_tokens"]
+    messages, used = build_context_window(history, "You are HEXALOY.", VISION_MODEL, extra_tokens=extra)
+    assert used == count_message_tokens(messages, VISION_MODEL) + extra
+    assert used <= _cap(VISION_MODEL)
+    without, _ = build_context_window(history, "You are HEXALOY.", VISION_MODEL)
+    assert len(messages) < len(without)
+
+
+def test_reply_reserve_and_margin_cap_a_small_window():
+    # 8192-token window: the estimate may use 85% of it, less the reply reserve, whatever budget is asked for
+    history = _history(400, random.Random(2))
+    _, used = build_context_window(history, "You are HEXALOY.", VISION_MODEL, budget=100_000)
+    assert used <= _cap(VISION_MODEL, budget=100_000) < 8192 - REPLY_TOKEN_RESERVE
+    _, reserved = build_context_window(history, "You are HEXALOY.", VISION_MODEL, budget=100_000,
+                                       reserve_for_reply=4000)
+    assert reserved <= _cap(VISION_MODEL, budget=100_000, reserve=4000) < used
+
+
+def test_budget_too_small_raises():
+    with pytest.raises(ValueError, match="too small"):
+        build_context_window([{"role": "user", "content": "hi"}], "sys", TEXT_MODEL, budget=10)
+    with pytest.raises(ValueError):
+        build_context_window([{"role": "user", "content": "hi"}], "sys", VISION_MODEL,
+                             extra_tokens=_cap(VISION_MODEL))
+
+
+def test_oversized_system_prompt_is_truncated_to_half_the_budget():
+    system = "You are HEXALOY. " * 2000
+    messages, used = build_context_window([{"role": "user", "content": "hello"}], system, TEXT_MODEL, budget=1000)
+    overhead = get_model_profile(TEXT_MODEL)["message_overhead"]
+    assert messages[0]["content"].endswith("…")
+    assert overhead + count_tokens(messages[0]["content"], TEXT_MODEL) <= 500
+    assert messages[-1]["content"] == "hello"
+    assert used <= 1000
+
+
+def test_oversized_new_turn_is_truncated():
+    turn = "tempered alloy " * 5000
+    messages, used = build_context_window([{"role": "user", "content": turn}], "sys", TEXT_MODEL, budget=800)
+    assert len(messages) == 2
+    assert messages[-1]["content"].endswith("…") and turn.startswith(messages[-1]["content"][:-1])
+    assert used == count_message_tokens(messages, TEXT_MODEL) <= 800
@@ -0,0 +1,51 @@
+import io
+import json
+import threading
+import zipfile
+
+from hexaloy_features import SessionStore, StoredSessions, write_chat_export, write_sessions_archive
+
+
+def _sessions(tmp_path):
+    store = SessionStore(str(tmp_path / "sessions.db"))
+    sessions = StoredSessions(store, "alice")
+    for title in ("One", "Two", "Three"):
+        session_id = sessions.create(title)
+        sessions[session_id].extend({"role": "user", "content": f"{title} {i}"} for i in range(5))
+    return store, sessions
+
+
+def test_snapshot_is_detached_from_the_live_caches(tmp_path):
+    store, sessions = _sessions(tmp_path)
+    one = sessions.find("One")
+    snapshot = sessions.snapshot()
+    open_before = dict(sessions._open)
+
+    sessions[one].append({"role": "assistant", "content": "later"})
+    out = io.BytesIO()
+    thread = threading.Thread(target=write_sessions_archive, args=(snapshot, out, "ndjson"))
+    thread.start()
+    thread.join()
+
+    lines = [json.loads(line) for line in out.getvalue().decode().splitlines()]
+    assert [line["session"] for line in lines] == ["One"] * 5 + ["Two"] * 5 + ["Three"] * 5
+    assert all(snapshot[t] is not sessions[sessions.find(t)] for t in snapshot)
+    assert set(sessions._open) == set(open_before) | {one}
+    store.close()
+
+
+def test_archive_from_snapshot_matches_the_live_sessions(tmp_path):
+    store, sessions = _sessions(tmp_path)
+    live, detached = io.BytesIO(), io.BytesIO()
+    write_sessions_archive(sessions, live, "zip")
+    write_sessions_archive(sessions.snapshot(), detached, "zip")
+    with zipfile.ZipFile(live) as a, zipfile.ZipFile(detached) as b:
+        assert a.namelist() == b.namelist() == ["hexaloy_One.md", "hexaloy_Two.md", "hexaloy_Three.md"]
+
+    history = sessions[sessions.find("Two")]
+    copy = history.snapshot()
+    history.append({"role": "assistant", "content": "not in the copy"})
+    out = io.BytesIO()
+    write_chat_export("json", copy, "Two", out)
+    assert len(json.loads(out.getvalue())["messages"]) == 5
+    store.close()
@@ -0,0 +1,38 @@
+from streamlit.testing.v1 import AppTest
+
+
+def _script():
+    import streamlit as st
+
+    from hexaloy_features import render_generated_image
+
+    class Job:
+        def elapsed(self):
+            return 1.0
+
+    class Jobs:
+        def pending(self, key):
+            return Job() if key in st.session_state.get("pending", ()) else None
+
+        def image(self, key):
+            return None
+
+    for key in st.session_state.get("shown", ()):
+        render_generated_image(Jobs(), key, f"https://images.example/{key}")
+
+
+def _run(at, pending, shown):
+    at.session_state["pending"], at.session_state["shown"] = pending, shown
+    at.run()
+    assert not at.exception
+    return dict(at.session_state["_image_polls"])
+
+
+def test_poll_flags_are_dropped_once_images_finish():
+    at = AppTest.from_function(_script, default_timeout=30)
+    assert _run(at, ["a", "b"], ["a", "b"]) == {"a": True, "b": True}
+    assert _run(at, ["b"], ["a", "b"]) == {"b": True}
+    # "b" was left behind on another chat and finished there; the next image prunes it
+    assert _run(at, ["c"], ["c"]) == {"c": True}
+    assert _run(at, [], ["c"]) == {}
+    assert "_image_polled_c" not in at.session_state
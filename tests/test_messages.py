@@ -0,0 +1,57 @@
+import copy
+import pickle
+
+import pytest
+
+from hexaloy_features import Message, SessionStore
+
+MESSAGES = [
+    {"role": "user", "content": "hello", "ts": "2026-03-29 02:30:00"},
+    {"role": "assistant", "content": "hi", "ts": "2026-10-18 09:00:01", "model": "llama-3.1-8b-instant",
+     "metrics": {"tokens": 3, "tokens_per_s": 41.0}},
+    {"role": "user", "content": "no timestamp"},
+    {"role": "user", "content": "odd timestamp", "ts": "yesterday"},
+    {"role": "assistant", "content": {"parts": ["a", "b"]}, "image_key": "k1"},
+]
+
+
+def test_store_round_trip_is_lossless(tmp_path):
+    store = SessionStore(str(tmp_path / "sessions.db"))
+    session_id = store.create_session("alice", "Session 1")
+    store.append_messages(session_id, MESSAGES)
+    loaded = store.load_messages(session_id)
+    store.close()
+    assert all(isinstance(m, Message) for m in loaded)
+    assert [dict(m) for m in loaded] == MESSAGES
+    assert loaded[0].get("ts") is loaded[0].get("ts")
+
+
+def test_messages_are_immutable():
+    msg = Message.from_dict(MESSAGES[1])
+    with pytest.raises(AttributeError):
+        msg.content = "edited"
+    with pytest.raises(AttributeError):
+        msg.extra = {}
+    with pytest.raises(AttributeError):
+        del msg.ts
+    with pytest.raises(TypeError):
+        msg["content"] = "edited"
+    editable = dict(msg)
+    editable["content"] = "edited"
+    assert msg["content"] == "hi"
+
+
+def test_copy_and_pickle():
+    msg = Message.from_dict(MESSAGES[1])
+    for clone in (copy.copy(msg), copy.deepcopy(msg), pickle.loads(pickle.dumps(msg))):
+        assert isinstance(clone, Message)
+        assert dict(clone) == MESSAGES[1]
+
+
+def test_reads_like_a_dict():
+    msg = Message.from_dict(MESSAGES[2])
+    assert msg == MESSAGES[2]
+    assert "ts" not in msg and msg.get("ts", "") == ""
+    assert {**msg} == MESSAGES[2]
+    with pytest.raises(KeyError):
+        msg["model"]
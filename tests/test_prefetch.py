@@ -0,0 +1,67 @@
+import asyncio
+import time
+
+from hexaloy_features import (
+    RequestScheduler, SingleFlight, SpeculativePrefetcher, StreamingEngine, response_cache_key,
+)
+
+MODEL = "llama-3.1-8b-instant"
+
+
+def _prepare(prompt):
+    messages = [{"role": "user", "content": prompt}]
+    return [MODEL], messages, 10, response_cache_key(MODEL, messages, 0.7)
+
+
+async def _slow_stream(model, messages):
+    for _ in range(200):
+        await asyncio.sleep(0.05)
+        yield "tok "
+
+
+def _prefetcher():
+    engine = StreamingEngine()
+    scheduler = RequestScheduler({MODEL: {"rpm": 600, "tpm": 1_000_000, "burst": 100_000}}, scale=1)
+    return engine, SpeculativePrefetcher(engine, scheduler, SingleFlight())
+
+
+def _wait_streaming(entry):
+    deadline = time.monotonic() + 5
+    while not entry.parts and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert entry.parts
+
+
+def test_abandon_stops_a_promoted_entry():
+    engine, prefetcher = _prefetcher()
+    try:
+        entries = prefetcher.schedule("alice", "chat", 2, _prepare, _slow_stream)
+        entry = prefetcher.claim("alice", "chat", 2, entries[0].prompt)
+        _wait_streaming(entry)
+        assert prefetcher.use(entry, entry.key) is None          # promoted, left running to be joined
+        assert prefetcher.stats()["joined"] == 1
+
+        prefetcher.abandon(entry)                                # the semantic cache answered instead
+        deadline = time.monotonic() + 5
+        while not entry.future.done() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert entry.future.cancelled()
+        stats = prefetcher.stats()
+        assert stats["joined"] == 0 and stats["wasted"] == len(entries)
+        assert stats["wasted_tokens"] > 0
+    finally:
+        engine.close()
+
+
+def test_abandon_discards_an_unused_entry():
+    engine, prefetcher = _prefetcher()
+    try:
+        entries = prefetcher.schedule("bob", "chat", 2, _prepare, _slow_stream)
+        entry = prefetcher.claim("bob", "chat", 2, entries[0].prompt)
+        prefetcher.abandon(entry)
+        assert entry.used and prefetcher.stats()["wasted"] == len(entries)
+        assert prefetcher._entries.get("bob") == []
+        prefetcher.abandon(entry)                                # idempotent
+        assert prefetcher.stats()["wasted"] == len(entries)
+    finally:
+        engine.close()
@@ -0,0 +1,50 @@
+import os
+import sys
+
+import pytest
+from streamlit.runtime.scriptrunner import RerunException, StopException
+from streamlit.testing.v1 import AppTest
+
+import hexaloy_features
+from hexaloy_features import Profiler
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+@pytest.mark.parametrize("control", [StopException(), RerunException(None)])
+def test_rerun_is_closed_by_control_exceptions(control, tmp_path, monkeypatch):
+    monkeypatch.setattr(hexaloy_features, "PROFILE_DUMP_DIR", str(tmp_path))
+    profiler = Profiler(enabled=True)
+    profiler.request_cprofile("alice")
+    with pytest.raises(type(control)):
+        with profiler.rerun("alice"):
+            with profiler.span("work"):
+                raise control
+    assert sys.getprofile() is None               # the cProfile capture was stopped
+    assert profiler._local.run is None
+    assert list(profiler.runs[-1]["spans"]) == ["work"]
+    assert profiler.last_cprofile_session == "alice"
+
+
+def test_cprofile_only_captures_the_requesting_session():
+    profiler = Profiler(enabled=True)
+    profiler.request_cprofile("alice")
+    with profiler.rerun("bob") as run:
+        assert run["cprofile"] is None
+    with profiler.rerun("alice") as run:
+        assert run["cprofile"] is not None
+    with profiler.rerun("alice") as run:
+        assert run["cprofile"] is None
+
+
+def test_debug_panel_needs_config(monkeypatch):
+    at = AppTest.from_file(APP, default_timeout=30)
+    at.secrets["GROQ_API_KEY"] = "test"
+    at.query_params["debug"] = "1"
+    monkeypatch.setattr(hexaloy_features, "DEBUG_PANEL_ENABLED", False)
+    at.run()
+    assert not any(e.label.startswith("🛠 Debug") for e in at.expander)
+
+    monkeypatch.setattr(hexaloy_features, "DEBUG_PANEL_ENABLED", True)
+    at.run()
+    assert any(e.label.startswith("🛠 Debug") for e in at.expander)
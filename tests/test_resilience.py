@@ -0,0 +1,101 @@
+import asyncio
+import time
+
+from hexaloy_features import CircuitBreaker, CircuitOpenError, UpstreamHealth
+
+MODEL = "llama-3.3-70b-versatile"
+
+
+async def _hang():
+    await asyncio.Event().wait()
+    yield ""
+
+
+async def _reply():
+    yield "ok"
+
+
+def _half_open(health):
+    breaker = health.breaker(MODEL)
+    breaker.failure()           # failures=1: open, and with cooldown=0 the next call is the probe
+    assert breaker.state == "open"
+    return breaker
+
+
+def test_cancelled_probe_releases_breaker():
+    async def scenario():
+        health = UpstreamHealth(failures=1, cooldown=0.0)
+        breaker = _half_open(health)
+
+        async def consume():
+            async for _ in health.watch(MODEL, _hang()):
+                pass
+
+        probe = asyncio.ensure_future(consume())
+        await asyncio.sleep(0.01)
+        assert breaker.state == "half_open" and breaker.is_open()
+        probe.cancel()
+        await asyncio.gather(probe, return_exceptions=True)
+        assert not breaker.is_open()
+        assert [piece async for piece in health.watch(MODEL, _reply())] == ["ok"]
+        assert breaker.state == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_closed_generator_releases_probe():
+    async def scenario():
+        health = UpstreamHealth(failures=1, cooldown=0.0)
+        breaker = _half_open(health)
+        stream = health.watch(MODEL, _hang())
+        pending = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0.01)
+        pending.cancel()
+        await asyncio.gather(pending, return_exceptions=True)
+        await stream.aclose()
+        assert not breaker.is_open()
+
+    asyncio.run(scenario())
+
+
+def test_only_one_probe_while_half_open():
+    async def scenario():
+        health = UpstreamHealth(failures=1, cooldown=0.0)
+        _half_open(health)
+
+        async def consume():
+            async for _ in health.watch(MODEL, _hang()):
+                pass
+
+        probe = asyncio.ensure_future(consume())
+        await asyncio.sleep(0.01)
+        try:
+            async for _ in health.watch(MODEL, _reply()):
+                pass
+        except CircuitOpenError:
+            rejected = True
+        else:
+            rejected = False
+        probe.cancel()
+        await asyncio.gather(probe, return_exceptions=True)
+        assert rejected and health.rejected == 1
+
+    asyncio.run(scenario())
+
+
+def test_silent_probe_times_out():
+    breaker = CircuitBreaker(failures=1, cooldown=0.0, probe_timeout=0.05)
+    breaker.failure()
+    assert breaker.allow()          # the probe, never settled
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert not breaker.is_open()
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens():
+    breaker = CircuitBreaker(failures=1, cooldown=0.0)
+    breaker.failure()
+    assert breaker.allow()
+    breaker.failure()
+    assert breaker.state == "open" and breaker.trips == 2
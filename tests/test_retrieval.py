@@ -0,0 +1,63 @@
+import gc
+
+from hexaloy_features import Message, OwnerIndexes, RetrievalMemory, SessionStore, StoredSessions
+
+FACTS = [
+    "My dog Biscuit is a three year old beagle who hates thunderstorms.",
+    "The production database is PostgreSQL 15 running on a single replica.",
+    "I'm training for a half marathon in Jaipur this December.",
+]
+
+
+def _store(tmp_path):
+    store = SessionStore(str(tmp_path / "sessions.db"))
+    sessions = StoredSessions(store, "alice")
+    ids = []
+    for i, fact in enumerate(FACTS):
+        ids.append(sessions.create(f"Chat {i}"))
+        sessions[ids[-1]].extend([{"role": "user", "content": fact},
+                                  {"role": "assistant", "content": "Noted. " * 30}])
+    return store, ids
+
+
+def test_memory_keeps_ids_and_reads_text_for_hits_only(tmp_path):
+    store, ids = _store(tmp_path)
+    indexes = OwnerIndexes(store)
+    memory = indexes.retrieval_memory("alice")
+    assert indexes.retrieval_memory("alice") is memory          # built once per owner, not per browser session
+    gc.collect()
+    assert not any(isinstance(r, Message) for r in gc.get_referents(*vars(memory).values()))
+
+    fetched = []
+    fetch = memory.fetch
+    memory.fetch = lambda s, i: fetched.append((s, i)) or fetch(s, i)
+    recalled = memory.recall("How do I back up the PostgreSQL production database?", exclude=ids[0])
+    assert "PostgreSQL 15" in recalled and "“Chat 1”" in recalled
+    assert set(fetched) == {(ids[1], 0)}
+    assert memory.search("Biscuit the beagle in thunderstorms", exclude=ids[0]) == []
+    store.close()
+
+
+def test_appends_and_deletes_reach_a_built_memory(tmp_path):
+    store, ids = _store(tmp_path)
+    indexes = OwnerIndexes(store)
+    memory = indexes.retrieval_memory("alice")
+    sessions = StoredSessions(store, "alice")
+
+    history = sessions[ids[2]]
+    history.append({"role": "user", "content": "My favourite running shoes are the blue Asics Novablast."})
+    indexes.add_message("alice", ids[2], len(history) - 1, history[-1])
+    indexes.add_message("alice", ids[2], len(history) - 1, history[-1])      # repeated hooks are ignored
+    hits = memory.search("which running shoes do I like, the Asics Novablast?")
+    assert [h["session"] for h in hits][:1] == [ids[2]] and len({h["text"] for h in hits}) == len(hits)
+
+    sessions.delete(ids[2])
+    indexes.remove_session("alice", ids[2])
+    assert all(h["session"] != ids[2] for h in memory.search("running shoes Asics half marathon"))
+    store.close()
+
+
+def test_from_sessions_reads_a_plain_mapping():
+    sessions = {"Trip": [{"role": "user", "content": "We are visiting Kyoto and Osaka in April."}]}
+    memory = RetrievalMemory.from_sessions(sessions)
+    assert "Kyoto" in memory.recall("What should we see in Kyoto in April?", exclude="Other")
@@ -0,0 +1,18 @@
+import pytest
+
+from hexaloy_features import route_prompt
+from bench.intent_corpus import CASES
+
+
+@pytest.mark.parametrize("case", CASES, ids=lambda case: case["prompt"][:40])
+def test_intent(case):
+    assert route_prompt(case["prompt"], case.get("has_image", False))["intent"] == case["intent"]
+
+
+@pytest.mark.parametrize("case", [c for c in CASES if {"template", "persona", "warnings"} & c.keys()],
+                         ids=lambda case: case["prompt"][:40])
+def test_template_persona_and_warnings(case):
+    route = route_prompt(case["prompt"], case.get("has_image", False))
+    for field in ("template", "persona", "warnings"):
+        if field in case:
+            assert route[field] == case[field], field
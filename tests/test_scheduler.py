@@ -0,0 +1,81 @@
+import asyncio
+
+import groq
+import httpx
+
+import hexaloy_features
+from hexaloy_features import RequestScheduler, ScheduledRequest, count_tokens
+
+MODEL = "llama-3.3-70b-versatile"
+REPLY = " tok" * 20
+
+
+def _server_error():
+    response = httpx.Response(503, request=httpx.Request("POST", "http://stub/chat/completions"))
+    return groq.InternalServerError("unavailable", response=response, body=None)
+
+
+def test_retries_are_refunded(monkeypatch):
+    monkeypatch.setattr(hexaloy_features, "SCHEDULER_BACKOFF_BASE", 0.01)
+
+    async def scenario():
+        # 1 token/s refill and room for 1000: what's left afterwards is what the request kept
+        scheduler = RequestScheduler({MODEL: {"rpm": 60, "tpm": 60, "burst": 1000}}, scale=1)
+        request = ScheduledRequest("alice", MODEL, prompt_tokens=10, reply_tokens=100)
+        failures = [_server_error(), _server_error()]
+
+        async def open_stream():
+            if failures:
+                raise failures.pop()
+            yield REPLY
+
+        pieces = [piece async for piece in scheduler.run(request, open_stream)]
+        level = scheduler._lanes[MODEL].tokens.level
+        await scheduler.close()
+        return pieces, request, level
+
+    pieces, request, level = asyncio.run(scenario())
+    assert pieces == [REPLY] and request.attempts == 3
+    assert request.charged == 3 * request.cost
+    used = 10 + count_tokens(REPLY)
+    assert 1000 - used <= level <= 1000 - used + 5
+
+
+def test_close_stops_dispatchers():
+    async def scenario():
+        scheduler = RequestScheduler({MODEL: {"rpm": 60, "tpm": 6000}}, scale=1)
+
+        async def open_stream():
+            yield "ok"
+
+        async for _ in scheduler.run(ScheduledRequest("alice", MODEL, 10), open_stream):
+            pass
+        task = scheduler._lanes[MODEL].task
+        await scheduler.close()
+        return task
+
+    assert asyncio.run(scenario()).cancelled()
+
+
+def test_cancel_after_grant_refunds_the_reservation():
+    async def scenario():
+        scheduler = RequestScheduler({MODEL: {"rpm": 60, "tpm": 60, "burst": 1000}}, scale=1)
+        request = ScheduledRequest("alice", MODEL, prompt_tokens=10, reply_tokens=100)
+        waiter = asyncio.ensure_future(scheduler._acquire(request))
+        # Resumes before the waiter does: the dispatcher's grant only schedules its wakeup
+        while request.granted_at is None:
+            await asyncio.sleep(0)
+        assert not waiter.done()
+        waiter.cancel()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            pass
+        lane = scheduler._lanes[MODEL]
+        levels = lane.requests.level, lane.tokens.level
+        await scheduler.close()
+        return request, levels
+
+    request, (requests, tokens) = asyncio.run(scenario())
+    assert request.charged == 0
+    assert requests >= 1000 - 1 and tokens >= 1000 - 1
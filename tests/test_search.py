@@ -0,0 +1,79 @@
+import re
+
+import pytest
+
+from bench.corpus import make_sessions
+from hexaloy_features import (
+    ConversationIndex, OwnerIndexes, SessionStore, StoredSessions, search_conversations,
+)
+
+SESSIONS = make_sessions(600, per_session=50)
+
+
+@pytest.mark.parametrize("query", ["python", "stream", "quantum pizza", "datab"])
+def test_index_finds_what_a_linear_scan_finds(query):
+    index = ConversationIndex.from_sessions(SESSIONS)
+    hits = index.search(query, limit=10_000)
+    found = {(h["session"], h["msg_index"]) for h in hits}
+
+    terms = query.split()
+    expected = {
+        (session, i) for session, history in SESSIONS.items() for i, msg in enumerate(history)
+        if all(any(tok.startswith(t) for tok in re.findall(r"\w+", msg["content"].lower())) for t in terms)
+    }
+    assert found == expected and found
+    scores = [h["score"] for h in hits]
+    assert scores == sorted(scores, reverse=True)
+    if len(terms) == 1:
+        linear = search_conversations(SESSIONS, query, limit=10_000)
+        assert found <= {(h["session"], h["msg_index"]) for h in linear}
+
+
+def test_sync_after_deleting_a_session():
+    sessions = {"a": [{"role": "user", "content": "zebra crossing"}],
+                "b": [{"role": "user", "content": "zebra stripes okapi"}]}
+    index = ConversationIndex.from_sessions(sessions)
+    assert {h["session"] for h in index.search("zebra")} == {"a", "b"}
+
+    del sessions["b"]
+    index.sync(sessions)
+    assert [h["session"] for h in index.search("zebra")] == ["a"]
+    assert index.search("okapi") == [] and "okapi" not in index._postings
+    assert len(index) == 1
+
+    sessions["a"].append({"role": "assistant", "content": "zebra again"})
+    index.sync(sessions)
+    assert sorted(h["msg_index"] for h in index.search("zebra")) == [0, 1]
+
+
+def test_owner_index_is_shared_and_kept_current_by_hooks(tmp_path):
+    store = SessionStore(str(tmp_path / "sessions.db"))
+    sessions = StoredSessions(store, "alice")
+    ids = []
+    for name, history in list(SESSIONS.items())[:4]:
+        ids.append(sessions.create(name))
+        sessions[ids[-1]].extend(history)
+    sessions = StoredSessions(store, "alice")       # a fresh tab: nothing opened yet
+
+    indexes = OwnerIndexes(store)
+    index = indexes.search_index("alice")
+    assert indexes.search_index("alice") is index
+    fetched = []
+    fetch = index.fetch
+    index.fetch = lambda s, i: fetched.append((s, i)) or fetch(s, i)
+    hits = search_conversations(sessions, "python", index=index, limit=5)
+    assert len(hits) == 5 and len(fetched) == 5          # text read for the top-k only
+    assert sessions._open == {}                          # no histories opened by a search
+
+    sessions[ids[0]].append({"role": "user", "content": "xylophone lessons"})
+    indexes.add_message("alice", ids[0], len(sessions[ids[0]]) - 1, sessions[ids[0]][-1])
+    assert [h["session"] for h in index.search("xylophone")] == [ids[0]]
+
+    sessions.delete(ids[0])
+    indexes.remove_session("alice", ids[0])
+    assert index.search("xylophone") == []
+    assert all(h["session"] != ids[0] for h in index.search("python", limit=1000))
+
+    indexes.transfer_owner("alice", "alice-2")
+    assert indexes.search_index("alice-2") is index
+    store.close()
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+from hexaloy_features import (
+    SEMANTIC_THRESHOLD, RetrievalMemory, SemanticCache, chat_system_prompt, embed_prompt, prepare_chat,
+    route_prompt, semantic_scope,
+)
+
+NEAR_MISSES = [
+    ("Celsius to Fahrenheit", "Fahrenheit to Celsius"),
+    ("Is Python faster than Java", "Is Java faster than Python"),
+    ("World War I", "World War II"),
+    ("Summarize the causes of World War I", "Summarize the causes of World War II"),
+    ("What foods are rich in vitamin A?", "What foods are rich in vitamin D?"),
+    ("Does A imply B?", "Does B imply A?"),
+    ("Translate English to French", "Translate French to English"),
+]
+
+PARAPHRASES = [
+    ("explain blockchain simply", "Can you explain blockchain in simple terms?"),
+    ("What are the benefits of meditation?", "what are the benefits of meditating"),
+    ("How do I reverse a list in Python?", "how to reverse a list in python"),
+    ("What is machine learning?", "What's machine learning?"),
+]
+
+
+def _similarity(a, b):
+    return float(embed_prompt(a) @ embed_prompt(b))
+
+
+@pytest.mark.parametrize("cached, asked", NEAR_MISSES)
+def test_near_misses_score_below_threshold(cached, asked):
+    assert _similarity(cached, asked) < SEMANTIC_THRESHOLD
+
+
+@pytest.mark.parametrize("cached, asked", NEAR_MISSES)
+def test_near_misses_are_not_served(cached, asked):
+    cache = SemanticCache(path=None)
+    cache.put(cached, 1, "answer to " + cached)
+    assert cache.lookup(asked, 1) is None
+
+
+@pytest.mark.parametrize("cached, asked", PARAPHRASES)
+def test_paraphrases_are_served(cached, asked):
+    cache = SemanticCache(path=None)
+    cache.put(cached, 1, "the answer")
+    assert cache.lookup(asked, 1) == ("the answer", pytest.approx(_similarity(cached, asked)))
+
+
+def test_pronoun_and_article_are_filler():
+    assert _similarity("How do I reverse a list?", "how to reverse list") == pytest.approx(1.0)
+
+
+def test_scope_separates_owners():
+    context = [{"role": "system", "content": "You are HEXALOY."}]
+    model = "llama-3.1-8b-instant"
+    assert semantic_scope(model, context, "alice") != semantic_scope(model, context, "bob")
+    cache = SemanticCache(path=None)
+    cache.put("What is photosynthesis?", semantic_scope(model, context, "alice"), "alice's answer")
+    assert cache.lookup("what is photosynthesis", semantic_scope(model, context, "bob")) is None
+
+
+def test_paraphrase_hits_with_recalled_memory():
+    # The second prompt recalls more snippets than the first (a chat was added in between);
+    # they go into the user turn after the key, so the scope stays the same
+    sessions = {"Old A": [{"role": "user", "content": "benefits of meditation for my anxiety"}]}
+    memory = RetrievalMemory.from_sessions(sessions)
+    history = [{"role": "user", "content": "hello"}, {"role": "assistant", "content": "Hi! How can I help?"}]
+    cache = SemanticCache(path=None)
+
+    def ask(prompt):
+        route = route_prompt(prompt)
+        recalled = memory.recall(prompt, exclude="New chat")
+        request = prepare_chat(prompt, [*history, {"role": "user", "content": prompt}], route,
+                               chat_system_prompt(prompt, route), recalled=recalled)
+        assert recalled and request["messages"][-1]["content"] == f"{recalled}\n\n{prompt}"
+        assert recalled not in request["messages"][0]["content"]
+        return recalled, request, semantic_scope(request["models"][0], request["messages"][:-1], "alice")
+
+    first, request, scope = ask("What are the benefits of meditation?")
+    cache.put("What are the benefits of meditation?", scope, "the answer")
+    sessions["Old B"] = [{"role": "user", "content": "meditating benefits: I sleep better since I started"}]
+    memory.sync(sessions)
+
+    second, paraphrase, paraphrase_scope = ask("what are the benefits of meditating")
+    assert second != first
+    assert paraphrase_scope == scope
+    assert cache.lookup("what are the benefits of meditating", paraphrase_scope)[0] == "the answer"
+
+
+def test_files_from_an_older_embedding_are_ignored(tmp_path):
+    path = str(tmp_path / "semantic.npz")
+    np.savez(path, vectors=np.ones((1, 256), dtype=np.float32), scopes=np.zeros(1, dtype=np.int64),
+             used=np.ones(1, dtype=np.int64), texts=np.array('{"prompts": ["x"], "answers": ["y"]}'))
+    assert len(SemanticCache(path=path)) == 0
+    cache = SemanticCache(path=path)
+    cache.put("What is photosynthesis?", 1, "answer")
+    cache.save()
+    assert len(SemanticCache(path=path)) == 1
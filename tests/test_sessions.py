@@ -0,0 +1,102 @@
+import json
+import os
+
+from streamlit.testing.v1 import AppTest
+
+from bench import fake_groq
+
+from hexaloy_features import (
+    AnalyticsAccumulator, ConversationIndex, RetrievalMemory, SessionStore, StoredSessions,
+    iter_sessions_ndjson, session_title,
+)
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+def _store(tmp_path):
+    return SessionStore(str(tmp_path / "sessions.db"))
+
+
+def test_sessions_are_keyed_by_id_and_titles_are_display_only(tmp_path):
+    store = _store(tmp_path)
+    sessions = StoredSessions(store, "alice")
+    ids = [sessions.create(title) for title in ("One", "Two", "Two")]
+    assert [sessions.title(i) for i in ids] == ["One", "Two", "Two (2)"]
+    for i in ids:
+        sessions[i].append({"role": "user", "content": f"remember the {sessions.title(i).lower()} things"})
+    analytics = AnalyticsAccumulator.from_sessions(sessions)
+    index = ConversationIndex.from_sessions(sessions)
+    memory = RetrievalMemory.from_sessions(sessions)
+    opened = sessions[ids[1]]
+
+    assert sessions.rename(ids[1], "One") == "One (2)"
+    assert list(sessions) == ids and sessions[ids[1]] is opened
+    assert sessions.find("One (2)") == ids[1] and sessions.find("Two") is None
+    assert list(StoredSessions(store, "alice")) == ids
+    assert StoredSessions(store, "alice").title(ids[1]) == "One (2)"
+
+    analytics.pending = 0
+    analytics.sync(sessions)
+    assert analytics.pending == 0             # a retitle changes nothing the analytics are keyed by
+    assert index.search("things")[0]["session"] in ids
+    assert "“One (2)”" in memory.recall("remember the two things", exclude=ids[0])
+    store.close()
+
+
+def test_exports_use_titles(tmp_path):
+    store = _store(tmp_path)
+    sessions = StoredSessions(store, "alice")
+    chat_id = sessions.create("Trip ideas")
+    sessions[chat_id].append({"role": "user", "content": "hello"})
+    assert session_title(sessions, chat_id) == "Trip ideas"
+    assert session_title({"Plain": []}, "Plain") == "Plain"
+    lines = [json.loads(line) for line in iter_sessions_ndjson(sessions)]
+    assert lines == [{"session": "Trip ideas", "role": "user", "content": "hello"}]
+    store.close()
+
+
+def test_transfer_owner_moves_sessions_and_state(tmp_path):
+    store = _store(tmp_path)
+    sessions = StoredSessions(store, "old-token")
+    kept = sessions.create("Kept")
+    store.save_state("old-token", "analytics", "{}")
+    store.transfer_owner("old-token", "new-token")
+    assert list(StoredSessions(store, "new-token")) == [kept]
+    assert list(StoredSessions(store, "old-token")) == []
+    assert store.load_state("new-token", "analytics") == "{}"
+    store.close()
+
+
+def _param(at, name):
+    value = at.query_params[name]
+    return value if isinstance(value, str) else value[0]
+
+
+def test_rotating_the_link_token_moves_history():
+    at = AppTest.from_file(APP, default_timeout=30)
+    at.secrets["GROQ_API_KEY"] = "test"
+    at.run()
+    old = _param(at, "u")
+    assert len(old) >= 16 and at.session_state.owner_is_link
+    ids = list(at.session_state.sessions)
+
+    at.button(key="rotate_owner_token").click().run()
+    new = _param(at, "u")
+    assert new != old and at.session_state.owner == new
+    assert list(at.session_state.sessions) == ids
+    assert not at.exception
+
+
+def test_first_prompt_retitles_the_open_chat_in_place():
+    with fake_groq.installed(tokens=["Sure", ", here", " is a plan."]):
+        at = AppTest.from_file(APP, default_timeout=30)
+        at.secrets["GROQ_API_KEY"] = "fake-sessions"
+        at.run()
+        chat_id = at.session_state.current_chat
+        assert at.session_state.sessions.title(chat_id).startswith("New Session")
+
+        at.chat_input[0].set_value("plan a weekend trip").run()
+        assert not at.exception
+        assert at.session_state.current_chat == chat_id
+        assert at.session_state.sessions.title(chat_id) == "plan a weekend trip..."
+        assert len(at.session_state.sessions[chat_id]) == 2